@@ -0,0 +1,92 @@
+"""
+This file contains a benchmark to validate the performance of Locust itself.
+More precisely, the performance of serializing and unserializing the messages that
+workers send to the master, with each version of the message encoding (see
+`locust.rpc.protocol.PROTOCOL_VERSION`) and each available compression codec. This
+benchmark is to be used by people working on Locust's development.
+"""
+
+from locust.rpc.protocol import COMPRESSORS, LEGACY_PROTOCOL_VERSION, PROTOCOL_VERSION, Message
+
+import argparse
+import statistics
+import time
+
+from prettytable import PrettyTable
+
+
+def stats_message(entry_count: int, bucket_count: int, second_count: int) -> Message:
+    """A stats message like the ones workers send, with reports in the (non compact) dict format"""
+    entries = [
+        {
+            "name": f"/api/endpoint/{i}",
+            "method": "GET",
+            "last_request_timestamp": 1700000000.0 + second_count,
+            "start_time": 1700000000.0,
+            "num_requests": bucket_count * 10,
+            "num_none_requests": 0,
+            "num_failures": i % 3,
+            "total_response_time": bucket_count * 500,
+            "max_response_time": bucket_count * 10,
+            "min_response_time": 1,
+            "total_content_length": bucket_count * 1000,
+            "response_times": {bucket * 10: 10 for bucket in range(bucket_count)},
+            "num_reqs_per_sec": {1700000000 + second: 50 for second in range(second_count)},
+            "num_fail_per_sec": {1700000000 + second: 1 for second in range(0, second_count, 5)},
+        }
+        for i in range(entry_count)
+    ]
+    data = {
+        "stats": entries,
+        "stats_total": entries[0],
+        "errors": {},
+        "user_count": 100,
+        "user_classes_count": {"MyUser": 100},
+    }
+    return Message("stats", data, "worker_0")
+
+
+def measure(message: Message, protocol_version: int, compression: str | None, repeat: int) -> tuple[float, float, int]:
+    """The median time to serialize and to unserialize message, in ms, and its size in bytes"""
+    serialize_times = []
+    unserialize_times = []
+    for _ in range(repeat):
+        ts = time.perf_counter()
+        data = message.serialize(protocol_version, compression)
+        serialize_times.append(1000 * (time.perf_counter() - ts))
+        ts = time.perf_counter()
+        Message.unserialize(data, protocol_version)
+        unserialize_times.append(1000 * (time.perf_counter() - ts))
+    return statistics.median(serialize_times), statistics.median(unserialize_times), len(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-e", "--entries", default=[10, 100, 1000], type=int, nargs="+", help="stats entries")
+    parser.add_argument("-b", "--buckets", default=100, type=int, help="response time buckets per entry")
+    parser.add_argument("-s", "--seconds", default=20, type=int, help="seconds of per second counts per entry")
+    parser.add_argument("-r", "--repeat", default=20, type=int, help="number of runs of each test case")
+    args = parser.parse_args()
+
+    table = PrettyTable()
+    table.field_names = ["Entries", "Protocol", "Compression", "Size (bytes)", "Serialize (ms)", "Unserialize (ms)"]
+    table.align["Size (bytes)"] = "r"
+    table.align["Serialize (ms)"] = "r"
+    table.align["Unserialize (ms)"] = "r"
+    for entry_count in args.entries:
+        message = stats_message(entry_count, args.buckets, args.seconds)
+        encodings = [(LEGACY_PROTOCOL_VERSION, None), (PROTOCOL_VERSION, None)]
+        encodings += [(PROTOCOL_VERSION, compression) for compression in COMPRESSORS]
+        for protocol_version, compression in encodings:
+            serialize_time, unserialize_time, size = measure(message, protocol_version, compression, args.repeat)
+            table.add_row(
+                [
+                    entry_count,
+                    protocol_version,
+                    compression or "-",
+                    size,
+                    f"{serialize_time:.3f}",
+                    f"{unserialize_time:.3f}",
+                ]
+            )
+    print(table)
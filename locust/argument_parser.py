@@ -328,6 +328,11 @@ def parse_locustfile_option(args=None) -> tuple[argparse.Namespace, list[str]]:
         action="store_true",
         env_var="LOCUST_MODE_WORKER",
     )
+    parser.add_argument(
+        "--aggregator",
+        action="store_true",
+        env_var="LOCUST_MODE_AGGREGATOR",
+    )
     parser.add_argument(
         "--master",  # this is just here to prevent argparse from giving the dreaded "ambiguous option: --master could match --master-host, --master-port"
         action="store_true",
@@ -382,7 +387,7 @@ def parse_locustfiles_from_master(locustfile_sources) -> list[str]:
 
 
 def retrieve_locustfiles_from_master(options) -> list[str]:
-    if not options.worker:
+    if not options.worker and not options.aggregator:
         sys.stderr.write(
             "locustfile was set to '-' (meaning to download from master) but --worker was not specified.\n"
         )
@@ -672,6 +677,22 @@ def setup_parser_arguments(parser):
         dest="enable_rebalancing",
         help="Re-distribute users if new workers are added or removed during a test run. Experimental.",
     )
+    master_group.add_argument(
+        "--worker-ramp",
+        action="store_true",
+        default=False,
+        dest="worker_ramp",
+        help="Send each worker its final users and share of the spawn rate once, and let the workers ramp up/down by themselves, instead of sending them a message for every step of the ramp",
+        env_var="LOCUST_WORKER_RAMP",
+    )
+    master_group.add_argument(
+        "--rpc-compression",
+        action="store_true",
+        default=False,
+        dest="rpc_compression",
+        help="Compress large messages (like stats reports) between the master and workers that support it, with zstd or lz4 if they are installed, otherwise zlib. Useful when the bandwidth to the workers is limited",
+        env_var="LOCUST_RPC_COMPRESSION",
+    )
     master_group.add_argument(
         "--expect-slaves",
         action=raise_argument_type_error("The --expect-slaves parameter has been renamed --expect-workers"),
@@ -690,6 +711,12 @@ Typically ONLY these options (and --locustfile) need to be specified on workers,
         help="Set locust to run in distributed mode with this process as worker. Can be combined with setting --locustfile to '-' to download it from master.",
         env_var="LOCUST_MODE_WORKER",
     )
+    worker_group.add_argument(
+        "--aggregator",
+        action="store_true",
+        help="Set locust to run as an aggregator between the master (see --master-host and --master-port) and a group of workers, which connect to it on --master-bind-host and --master-bind-port. To the master it looks like a single worker. Experimental.",
+        env_var="LOCUST_MODE_AGGREGATOR",
+    )
     worker_group.add_argument(
         "--processes",
         type=int,
@@ -718,6 +745,14 @@ Typically ONLY these options (and --locustfile) need to be specified on workers,
         help="Port to connect to on master node. Defaults to 5557.",
         env_var="LOCUST_MASTER_NODE_PORT",
     )
+    worker_group.add_argument(
+        "--worker-capacity",
+        type=float,
+        metavar="<float>",
+        dest="worker_capacity",
+        help="How much load this worker can take compared to the other workers (e.g. its number of cores). Only used if the master dispatches users with CapacityWeightedUsersDispatcher. Defaults to 1",
+        env_var="LOCUST_WORKER_CAPACITY",
+    )
 
     web_ui_group.add_argument(
         "--web-base-path",
@@ -782,6 +817,70 @@ Typically ONLY these options (and --locustfile) need to be specified on workers,
         help="Reset statistics once spawning has been completed. Should be set on both master and workers when running in distributed mode",
         env_var="LOCUST_RESET_STATS",
     )
+    stats_group.add_argument(
+        "--percentile-sketch",
+        type=float,
+        metavar="<relative accuracy>",
+        dest="percentile_sketch",
+        default=None,
+        help="Store response times in a mergeable quantile sketch, so that all percentiles of response times of 1 µs or more are accurate to within the given relative accuracy (e.g. 0.01). Should be set on both master and workers when running in distributed mode",
+        env_var="LOCUST_PERCENTILE_SKETCH",
+    )
+    stats_group.add_argument(
+        "--high-resolution",
+        action="store_true",
+        dest="high_resolution",
+        help="Store and report response times with microsecond resolution, for services that respond in less than a few milliseconds. Should be set on both master and workers when running in distributed mode",
+        env_var="LOCUST_HIGH_RESOLUTION",
+    )
+    stats_group.add_argument(
+        "--stats-batch-size",
+        type=int,
+        metavar="<int>",
+        dest="stats_batch_size",
+        default=0,
+        help="Buffer requests and add them to the statistics in batches of this size (or every 100 ms), which uses less CPU at high request rates. 0 (the default) disables batching",
+        env_var="LOCUST_STATS_BATCH_SIZE",
+    )
+    stats_group.add_argument(
+        "--template-request-names",
+        action="store_true",
+        dest="template_request_names",
+        help="Replace numeric, UUID and hash segments of request names (URL paths) with [id], [uuid] and [hash], so that e.g. /user/42 and /user/43 are grouped as /user/[id]",
+        env_var="LOCUST_TEMPLATE_REQUEST_NAMES",
+    )
+    stats_group.add_argument(
+        "--max-request-entries",
+        type=int,
+        metavar="<int>",
+        dest="max_request_entries",
+        default=None,
+        help="Maximum number of request names to keep statistics for. Requests with new names are grouped as 'Other' once it has been reached",
+        env_var="LOCUST_MAX_REQUEST_ENTRIES",
+    )
+    stats_group.add_argument(
+        "--max-errors",
+        type=int,
+        metavar="<int>",
+        dest="max_errors",
+        default=None,
+        help="Maximum number of unique errors to keep. When it is exceeded, the least recently seen errors are discarded",
+        env_var="LOCUST_MAX_ERRORS",
+    )
+    stats_group.add_argument(
+        "--template-errors",
+        action="store_true",
+        dest="template_errors",
+        help="Ignore UUIDs, hashes and numbers with 5 or more digits (like request ids) in error messages when grouping errors",
+        env_var="LOCUST_TEMPLATE_ERRORS",
+    )
+    stats_group.add_argument(
+        "--compact-stats-reports",
+        action="store_true",
+        dest="compact_stats_reports",
+        help="Send stats from workers to the master in a compact binary format, which is faster to decode and uses less bandwidth. Only needs to be set on the workers",
+        env_var="LOCUST_COMPACT_STATS_REPORTS",
+    )
     stats_group.add_argument(
         "--html",
         metavar="<filename>",
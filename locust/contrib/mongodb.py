@@ -12,15 +12,15 @@ class MongoDBClient(MongoClient):
         self.db = self.client[db_name]
 
     def execute_query(self, collection_name, query):
-        start_time = time.time()
+        start_perf_counter = time.perf_counter()
         try:
             collection = self.db[collection_name]
             collection.find(query)
 
-            response_time = int((time.time() - start_time) * 1000)
+            response_time = (time.perf_counter() - start_perf_counter) * 1000
             events.request.fire(request_type="MONGODB", name="QUERY", response_time=response_time, response_length=0)
         except PyMongoError as e:
-            response_time = int((time.time() - start_time) * 1000)
+            response_time = (time.perf_counter() - start_perf_counter) * 1000
             events.request.fire(
                 request_type="MONGODB",
                 name="QUERY",
@@ -6,7 +6,7 @@ import math
 import time
 from collections import defaultdict
 from collections.abc import Iterator
-from heapq import heapify, heapreplace
+from heapq import heapify, heappop, heapreplace
 from math import log2
 from operator import attrgetter
 from typing import TYPE_CHECKING
@@ -17,19 +17,22 @@ if TYPE_CHECKING:
     from locust import User
     from locust.runners import WorkerNode
 
-    from collections.abc import Generator, Iterable
+    from collections.abc import Generator, Iterable, Mapping, Sequence
     from typing import TypeVar
 
     T = TypeVar("T")
 
 
-def _kl_generator(users: Iterable[tuple[T, float]]) -> Generator[T | None]:
+def _kl_generator(users: Iterable[tuple[T, float]], counts: Mapping[T, int] | None = None) -> Generator[T | None]:
     """Generator based on Kullback-Leibler divergence
 
     For example, given users A, B with weights 5 and 1 respectively,
     this algorithm will yield AAABAAAAABAA.
+
+    If counts are given, the generator continues as if it had already yielded each user that many times.
     """
-    heap = [(x * log2(x / (x + 1.0)), x + 1.0, x, name) for name, x in users if x > 0]
+    counts = counts or {}
+    heap = [_kl_entry(name, x, counts.get(name, 0)) for name, x in users if x > 0]
     if not heap:
         while True:
             yield None
@@ -44,6 +47,57 @@ def _kl_generator(users: Iterable[tuple[T, float]]) -> Generator[T | None]:
         heapreplace(heap, (kl_diff, x + 1.0, weight, name))
 
 
+def _kl_entry(name: T, weight: float, count: int) -> tuple[float, float, float, T]:
+    """The entry in the heap of _kl_generator for a user that has been yielded `count` times"""
+    x = weight + count
+    return (weight * log2(x / (x + 1.0)), x + 1.0, weight, name)
+
+
+def _kl_counts(users: Iterable[tuple[T, float]], total: int) -> dict[T, int]:
+    """
+    The number of times _kl_generator(users) yields each user in its first `total` iterations,
+    computed from the weights instead of by running the generator.
+
+    The n:th time a user with weight w is yielded, it is at a divergence of w * log2((w + n - 1) / (w + n)),
+    which increases with n. So the first iterations yield everything below some threshold, which is
+    found by bisection, and only the last few users (those at the threshold) are left to the generator.
+    """
+    users = [(name, weight) for name, weight in users if weight > 0]
+    counts = {name: 0 for name, _ in users}
+    if not users or total <= 0:
+        return counts
+
+    def count_below(weight: float, threshold: float) -> int:
+        # solve weight * log2((weight + n) / (weight + n + 1)) < threshold for n, then correct any rounding
+        bound = 1 / math.expm1(-threshold / weight * math.log(2)) - weight
+        n = max(0, math.ceil(bound)) if bound < total else total
+        while n > 0 and weight * log2((weight + n - 1) / (weight + n)) >= threshold:
+            n -= 1
+        while n < total and weight * log2((weight + n) / (weight + n + 1.0)) < threshold:
+            n += 1
+        return n
+
+    low = min(weight * log2(weight / (weight + 1.0)) for _, weight in users)  # nothing is below this
+    high = 0.0  # everything is below this
+    for _ in range(100):
+        middle = (low + high) / 2
+        if middle in (low, high):
+            break
+        if sum(count_below(weight, middle) for _, weight in users) <= total:
+            low = middle
+        else:
+            high = middle
+    for name, weight in users:
+        counts[name] = count_below(weight, low)
+
+    # the generator yields the users at the threshold in the order that they would have come in
+    users_at_threshold = _kl_generator(users, counts)
+    for user in itertools.islice(users_at_threshold, total - sum(counts.values())):
+        if user is not None:
+            counts[user] += 1
+    return counts
+
+
 class UsersDispatcher(Iterator):
     """
     Iterator that dispatches the users to the workers.
@@ -95,6 +149,9 @@ class UsersDispatcher(Iterator):
 
         self._users_on_workers = self._fast_users_on_workers_copy(self._initial_users_on_workers)
 
+        # The number of users on each worker, kept up to date while users are being removed
+        self._worker_user_counts: dict[str, int] = {}
+
         self._current_user_count = self.get_current_user_count()
 
         self._dispatcher_generator: Generator[dict[str, dict[str, int]]] = None  # type: ignore
@@ -102,13 +159,13 @@ class UsersDispatcher(Iterator):
 
         self._user_generator = self._user_gen()
 
-        self._worker_node_generator = itertools.cycle(self._worker_nodes)
+        # The index (in self._worker_nodes) of the worker that gets the next user. Users are
+        # added to the workers in turn, and removed in the opposite order.
+        self._worker_node_index = 0
 
         # To keep track of how long it takes for each dispatch iteration to compute
         self._dispatch_iteration_durations: list[float] = []
 
-        self._active_users: list[tuple[WorkerNode, str]] = []
-
         # TODO: Test that attribute is set when dispatching and unset when done dispatching
         self._dispatch_in_progress = False
 
@@ -241,29 +298,31 @@ class UsersDispatcher(Iterator):
             return
         self._prepare_rebalance()
 
+    def worker_overloaded(self, worker_node: WorkerNode) -> bool:
+        """
+        This method is called by the master when a worker has stayed above the CPU usage warning threshold
+        for a while. A dispatcher can then move some of the worker's users to other workers, by preparing a
+        rebalance like `add_worker` and `remove_worker` do. This one leaves the users where they are.
+
+        :param worker_node: The overloaded worker node.
+        :return: True if a rebalance has been prepared
+        """
+        return False
+
     def _prepare_rebalance(self) -> None:
         """
         When a rebalance is required because of added and/or removed workers, we compute the desired state as if
-        we started from 0 user. So, if we were currently running 500 users, then the `_distribute_users` will
-        perform a fake ramp-up without any waiting and return the final distribution.
+        we started from 0 user. So, if we were currently running 500 users, then `_distribute_users` works out
+        the distribution that a ramp-up to 500 users would end up with (without going through the users one by one).
         """
-        # Reset users before recalculating since the current users is used to calculate how many
-        # fixed users to add.
-        self._users_on_workers = {
-            worker_node.id: {user_class.__name__: 0 for user_class in self._original_user_classes}
-            for worker_node in self._worker_nodes
-        }
         self._try_dispatch_fixed = True
 
-        users_on_workers, user_gen, worker_gen, active_users = self._distribute_users(self._current_user_count)
-
-        self._users_on_workers = users_on_workers
-        self._active_users = active_users
+        self._users_on_workers = self._distribute_users(self._current_user_count)
 
-        # It's important to reset the generators by using the ones from `_distribute_users`
-        # so that the next iterations are smooth and continuous.
-        self._user_generator = user_gen
-        self._worker_node_generator = worker_gen
+        # It's important to continue from the distributed users, so that the next iterations are smooth and continuous.
+        user_classes_count = self._get_user_classes_count()
+        self._user_generator = self._user_gen(user_classes_count)
+        self._worker_node_index = self._current_user_count % len(self._worker_nodes)
 
         self._rebalance = True
 
@@ -301,15 +360,20 @@ class UsersDispatcher(Iterator):
             if not user:
                 self._no_user_to_spawn = True
                 break
-            worker_node = next(self._worker_node_generator)
+            worker_node = self._next_worker_node()
             self._users_on_workers[worker_node.id][user] += 1
             self._current_user_count += 1
-            self._active_users.append((worker_node, user))
             if self._current_user_count >= current_user_count_target:
                 break
 
         return self._users_on_workers
 
+    def _next_worker_node(self) -> WorkerNode:
+        """The worker that gets the next user"""
+        worker_node = self._worker_nodes[self._worker_node_index % len(self._worker_nodes)]
+        self._worker_node_index = (self._worker_node_index + 1) % len(self._worker_nodes)
+        return worker_node
+
     def _remove_users_from_workers(self) -> dict[str, dict[str, int]]:
         """Remove users from the workers until the target number of users is reached for the current dispatch iteration
 
@@ -318,16 +382,69 @@ class UsersDispatcher(Iterator):
         current_user_count_target = max(
             self._current_user_count - self._user_count_per_dispatch_iteration, self._target_user_count
         )
-        while True:
-            try:
-                worker_node, user = self._active_users.pop()
-            except IndexError:
-                return self._users_on_workers
+        user_classes_to_remove = self._user_classes_to_remove()
+        self._worker_user_counts = {
+            worker_node_id: sum(users_on_node.values())
+            for worker_node_id, users_on_node in self._users_on_workers.items()
+        }
+        while self._current_user_count > current_user_count_target:
+            user = next(user_classes_to_remove, None)
+            if user is None:
+                break
+            worker_node = self._worker_node_to_remove_from(user)
             self._users_on_workers[worker_node.id][user] -= 1
+            self._worker_user_counts[worker_node.id] -= 1
             self._current_user_count -= 1
             self._try_dispatch_fixed = True
-            if self._current_user_count == 0 or self._current_user_count <= current_user_count_target:
-                return self._users_on_workers
+        return self._users_on_workers
+
+    def _user_classes_to_remove(self) -> Iterator[str]:
+        """
+        Yield the user classes to remove users of, in the reverse order of how _user_gen() adds them. That is,
+        users of classes that are not being dispatched go first, followed by the weighted users (the one that
+        was added last first) and finally the users with a fixed count.
+        """
+        user_classes_count = self._get_user_classes_count()
+        weighted = {u.__name__: u.weight for u in self._user_classes if not u.fixed_count and u.weight > 0}
+        fixed = {u.__name__: u.fixed_count for u in self._user_classes if u.fixed_count}
+        for user_class_name, count in user_classes_count.items():
+            if user_class_name not in weighted and user_class_name not in fixed:
+                yield from itertools.repeat(user_class_name, count)
+        for weights in (weighted, fixed):
+            ranks = {user_class_name: rank for rank, user_class_name in enumerate(sorted(weights))}
+
+            def last_entry(user_class_name: str) -> tuple[float, float, float, int, str]:
+                # the heap entry of _kl_generator when it yielded the last user of the class, negated so
+                # that the largest one is popped first
+                divergence, x, weight, _ = _kl_entry(
+                    user_class_name, weights[user_class_name], user_classes_count[user_class_name] - 1
+                )
+                return -divergence, -x, -weight, -ranks[user_class_name], user_class_name
+
+            heap = [last_entry(user_class_name) for user_class_name in weights if user_classes_count[user_class_name]]
+            heapify(heap)
+            while heap:
+                user_class_name = heap[0][-1]
+                yield user_class_name
+                user_classes_count[user_class_name] -= 1
+                if user_classes_count[user_class_name] > 0:
+                    heapreplace(heap, last_entry(user_class_name))
+                else:
+                    heappop(heap)
+
+    def _worker_node_to_remove_from(self, user: str) -> WorkerNode:
+        """
+        The worker before the one that would get the next user or, if it has no user of the class, the busiest
+        worker that does
+        """
+        self._worker_node_index = (self._worker_node_index - 1) % len(self._worker_nodes)
+        worker_node = self._worker_nodes[self._worker_node_index]
+        if self._users_on_workers[worker_node.id][user] > 0:
+            return worker_node
+        return max(
+            (w for w in reversed(self._worker_nodes) if self._users_on_workers[w.id][user] > 0),
+            key=lambda w: self._worker_user_counts[w.id],
+        )
 
     def _get_user_current_count(self, user: str) -> int:
         count = 0
@@ -336,39 +453,59 @@ class UsersDispatcher(Iterator):
 
         return count
 
-    def _distribute_users(
-        self, target_user_count: int
-    ) -> tuple[dict[str, dict[str, int]], Iterator[str | None], itertools.cycle, list[tuple[WorkerNode, str]]]:
+    def _get_user_classes_count(self) -> dict[str, int]:
+        user_classes_count = {user_class.__name__: 0 for user_class in self._original_user_classes}
+        for users_on_node in self._users_on_workers.values():
+            for user_class_name, count in users_on_node.items():
+                user_classes_count[user_class_name] += count
+        return user_classes_count
+
+    def _distribute_users(self, target_user_count: int) -> dict[str, dict[str, int]]:
         """
-        This function might take some time to complete if the `target_user_count` is a big number. A big number
-        is typically > 50 000. However, this function is only called if a worker is added or removed while a test
-        is running. Such a situation should be quite rare.
+        Distribute `target_user_count` users between the workers, as a ramp-up from 0 would. The number of users
+        of each class is worked out from the fixed counts and weights (see _kl_counts), and the users of each class
+        are split evenly between the workers, with the remainders handed out in turn. So the time this takes
+        only depends on the number of workers and user classes, not on the number of users.
         """
-        user_gen = self._user_gen()
-
-        worker_gen = itertools.cycle(self._worker_nodes)
-
         users_on_workers = {
             worker_node.id: {user_class.__name__: 0 for user_class in self._original_user_classes}
             for worker_node in self._worker_nodes
         }
-
-        active_users = []
-
-        user_count = 0
-        while user_count < target_user_count:
-            user = next(user_gen)
-            if not user:
-                break
-            worker_node = next(worker_gen)
-            users_on_workers[worker_node.id][user] += 1
-            user_count += 1
-            active_users.append((worker_node, user))
-
-        return users_on_workers, user_gen, worker_gen, active_users
-
-    def _user_gen(self) -> Iterator[str | None]:
-        weighted_users_gen = _kl_generator((u.__name__, u.weight) for u in self._user_classes if not u.fixed_count)
+        worker_count = len(self._worker_nodes)
+        next_worker_index = 0
+        for user_class_name, count in self._distribute_user_classes(target_user_count).items():
+            users_per_worker, remainder = divmod(count, worker_count)
+            for worker_index, worker_node in enumerate(self._worker_nodes):
+                extra = (worker_index - next_worker_index) % worker_count < remainder
+                users_on_workers[worker_node.id][user_class_name] += users_per_worker + extra
+            next_worker_index = (next_worker_index + remainder) % worker_count
+
+        return users_on_workers
+
+    def _distribute_user_classes(self, target_user_count: int) -> dict[str, int]:
+        """The number of users of each class that a ramp-up to `target_user_count` users ends up with"""
+        fixed_user_classes = [(u.__name__, u.fixed_count) for u in self._user_classes if u.fixed_count]
+        fixed_user_count = sum(fixed_count for _, fixed_count in fixed_user_classes)
+        if target_user_count <= fixed_user_count:
+            user_classes_count = _kl_counts(fixed_user_classes, target_user_count)
+        else:
+            user_classes_count = dict(fixed_user_classes)
+            user_classes_count.update(
+                _kl_counts(
+                    [(u.__name__, u.weight) for u in self._user_classes if not u.fixed_count],
+                    target_user_count - fixed_user_count,
+                )
+            )
+        return user_classes_count
+
+    def _user_gen(self, user_classes_count: Mapping[str, int] | None = None) -> Iterator[str | None]:
+        """
+        :param user_classes_count: The number of users of each class that have already been dispatched, which the
+                                   weighted users continue from
+        """
+        weighted_users_gen = _kl_generator(
+            ((u.__name__, u.weight) for u in self._user_classes if not u.fixed_count), user_classes_count
+        )
 
         while True:
             if self._try_dispatch_fixed:  # Fixed_count users are spawned before weight users.
@@ -395,3 +532,202 @@ class UsersDispatcher(Iterator):
         and the one below is the most efficient.
         """
         return dict(zip(users_on_workers.keys(), map(dict.copy, users_on_workers.values())))
+
+
+class MinimalMovementUsersDispatcher(UsersDispatcher):
+    """
+    Users dispatcher that moves as few users as possible when workers are added or removed.
+
+    :class:`UsersDispatcher` rebalances by distributing all the users again as if ramping up from 0, so when
+    a worker joins, most of the other workers stop some of their users and start users of other classes.
+    This dispatcher only takes the surplus users from the workers that have more than their share (and the
+    users of workers that were removed) and gives them to the workers that have less. The classes of the moved
+    users are picked to keep each worker's mix of classes as close as possible to the overall one.
+
+    Use it by passing ``dispatcher_class=MinimalMovementUsersDispatcher`` to
+    :class:`Environment <locust.env.Environment>`.
+    """
+
+    def _prepare_rebalance(self) -> None:
+        self._try_dispatch_fixed = True
+
+        worker_count = len(self._worker_nodes)
+        user_classes_count = self._get_user_classes_count()
+        fair_share = {user_class_name: count / worker_count for user_class_name, count in user_classes_count.items()}
+
+        # users of workers that have been removed need a new home
+        worker_node_ids = {worker_node.id for worker_node in self._worker_nodes}
+        moving_users = dict.fromkeys(user_classes_count, 0)
+        for worker_node_id, users_on_node in self._users_on_workers.items():
+            if worker_node_id not in worker_node_ids:
+                for user_class_name, count in users_on_node.items():
+                    moving_users[user_class_name] += count
+        users_on_workers = {
+            worker_node.id: dict(self._users_on_workers[worker_node.id])
+            if worker_node.id in self._users_on_workers
+            else {user_class.__name__: 0 for user_class in self._original_user_classes}
+            for worker_node in self._worker_nodes
+        }
+
+        targets = self._target_user_counts(users_on_workers)
+
+        # take the surplus from the workers with too many users, of the classes they have the most of
+        for worker_node in self._worker_nodes:
+            users_on_node = users_on_workers[worker_node.id]
+            for _ in range(sum(users_on_node.values()) - targets[worker_node.id]):
+                user_class_name = max(
+                    (name for name, count in users_on_node.items() if count > 0),
+                    key=lambda name: users_on_node[name] - fair_share[name],
+                )
+                users_on_node[user_class_name] -= 1
+                moving_users[user_class_name] += 1
+
+        # and give them to the workers with too few users, of the classes they have the least of
+        for worker_node in self._worker_nodes:
+            users_on_node = users_on_workers[worker_node.id]
+            for _ in range(targets[worker_node.id] - sum(users_on_node.values())):
+                user_class_name = max(
+                    (name for name, count in moving_users.items() if count > 0),
+                    key=lambda name: fair_share[name] - users_on_node[name],
+                )
+                users_on_node[user_class_name] += 1
+                moving_users[user_class_name] -= 1
+
+        self._users_on_workers = users_on_workers
+        self._user_generator = self._user_gen(user_classes_count)
+        self._rebalance = True
+
+    def _target_user_counts(self, users_on_workers: dict[str, dict[str, int]]) -> dict[str, int]:
+        """
+        The number of users each worker should have after the rebalance. The workers that get one more user than
+        the others are a run of workers in dispatch order (so that ramping on afterwards keeps the workers balanced),
+        picked to include as many as possible of the workers that already have more than the others.
+        """
+        worker_count = len(self._worker_nodes)
+        users_per_worker, remainder = divmod(self._current_user_count, worker_count)
+        above = [
+            sum(users_on_workers[worker_node.id].values()) > users_per_worker for worker_node in self._worker_nodes
+        ]
+        # slide a window of `remainder` workers around the (circular) list of workers to find the best start
+        best_start = 0
+        best_overlap = overlap = sum(above[:remainder])
+        for start in range(1, worker_count):
+            overlap += above[(start + remainder - 1) % worker_count] - above[start - 1]
+            if overlap > best_overlap:
+                best_start, best_overlap = start, overlap
+        self._worker_node_index = (best_start + remainder) % worker_count
+        return {
+            worker_node.id: users_per_worker + ((index - best_start) % worker_count < remainder)
+            for index, worker_node in enumerate(self._worker_nodes)
+        }
+
+
+class CapacityWeightedUsersDispatcher(UsersDispatcher):
+    """
+    Users dispatcher that gives each worker a share of the users in proportion to its capacity.
+
+    :class:`UsersDispatcher` gives every worker the same number of users, so when the workers are of different
+    sizes, the small ones get overloaded while the big ones idle. Workers declare their capacity with
+    ``--worker-capacity`` (for example their number of cores, it defaults to 1). This dispatcher gives each new
+    user to the worker that has the fewest users per unit of capacity, and removes users from the one with the most.
+
+    When a worker stays above the CPU usage warning threshold, its capacity is multiplied by
+    `overloaded_capacity_factor` and the users are rebalanced, which moves some of its users to the other workers.
+
+    Use it by passing ``dispatcher_class=CapacityWeightedUsersDispatcher`` to
+    :class:`Environment <locust.env.Environment>`.
+    """
+
+    overloaded_capacity_factor: float | None = 0.8
+    """What the capacity of a worker is multiplied by when it is overloaded. Set to None to keep its users"""
+
+    def __init__(self, worker_nodes: list[WorkerNode], user_classes: list[type[User]]):
+        # reductions of the workers' capacities because they were overloaded, by worker id
+        self._capacity_factors: dict[str, float] = {}
+        # (users per capacity, index in _worker_nodes, user count) of the workers, with the user count they would
+        # have after getting the next user. Built when needed, and dropped whenever users are moved some other way.
+        self._worker_node_heap: list[tuple[float, int, int]] | None = None
+        super().__init__(worker_nodes, user_classes)
+
+    def new_dispatch(
+        self, target_user_count: int, spawn_rate: float, user_classes: list[type[User]] | None = None
+    ) -> None:
+        super().new_dispatch(target_user_count, spawn_rate, user_classes)
+        self._worker_node_heap = None
+
+    def add_worker(self, worker_node: WorkerNode) -> None:
+        self._capacity_factors.pop(worker_node.id, None)
+        super().add_worker(worker_node)
+
+    def worker_overloaded(self, worker_node: WorkerNode) -> bool:
+        if self.overloaded_capacity_factor is None or len(self._worker_nodes) < 2:
+            return False
+        if not any(self._users_on_workers.get(worker_node.id, {}).values()):
+            return False
+        self._capacity_factors[worker_node.id] = (
+            self._capacity_factors.get(worker_node.id, 1.0) * self.overloaded_capacity_factor
+        )
+        self._prepare_rebalance()
+        return True
+
+    def _capacity(self, worker_node: WorkerNode) -> float:
+        return worker_node.capacity * self._capacity_factors.get(worker_node.id, 1.0)
+
+    def _prepare_rebalance(self) -> None:
+        super()._prepare_rebalance()
+        self._worker_node_heap = None
+
+    def _next_worker_node(self) -> WorkerNode:
+        """
+        The worker with the fewest users per unit of capacity, counting half of the next user (so that the users
+        are apportioned like seats are with the Sainte-Laguë method)
+        """
+        if self._worker_node_heap is None:
+            self._worker_node_heap = []
+            for index, worker_node in enumerate(self._worker_nodes):
+                user_count = sum(self._users_on_workers[worker_node.id].values())
+                self._worker_node_heap.append(((user_count + 0.5) / self._capacity(worker_node), index, user_count))
+            heapify(self._worker_node_heap)
+        _, index, user_count = self._worker_node_heap[0]
+        worker_node = self._worker_nodes[index]
+        heapreplace(self._worker_node_heap, ((user_count + 1.5) / self._capacity(worker_node), index, user_count + 1))
+        return worker_node
+
+    def _worker_node_to_remove_from(self, user: str) -> WorkerNode:
+        """Of the workers with a user of the class, the one with the most users per unit of capacity"""
+        self._worker_node_heap = None
+        return max(
+            (w for w in reversed(self._worker_nodes) if self._users_on_workers[w.id][user] > 0),
+            key=lambda w: (self._worker_user_counts[w.id] - 0.5) / self._capacity(w),
+        )
+
+    def _distribute_users(self, target_user_count: int) -> dict[str, dict[str, int]]:
+        """
+        Split `target_user_count` users between the workers in proportion to their capacity, and then the users
+        of each class in proportion to the number of users each worker has left to fill. Both splits round to the
+        largest remainders.
+        """
+        remaining = _largest_remainders(target_user_count, [self._capacity(w) for w in self._worker_nodes])
+        users_on_workers = {
+            worker_node.id: {user_class.__name__: 0 for user_class in self._original_user_classes}
+            for worker_node in self._worker_nodes
+        }
+        for user_class_name, count in self._distribute_user_classes(target_user_count).items():
+            if count == 0:
+                continue
+            split = _largest_remainders(count, remaining)
+            for index, worker_node in enumerate(self._worker_nodes):
+                users_on_workers[worker_node.id][user_class_name] = split[index]
+                remaining[index] -= split[index]
+        return users_on_workers
+
+
+def _largest_remainders(total: int, weights: Sequence[float]) -> list[int]:
+    """Split `total` in proportion to `weights`, giving what the rounding down leaves to the largest remainders"""
+    weight_sum = sum(weights)
+    quotas = [total * weight / weight_sum for weight in weights]
+    split = [math.floor(quota) for quota in quotas]
+    by_remainder = sorted(range(len(weights)), key=lambda i: split[i] - quotas[i])
+    for i in by_remainder[: total - sum(split)]:
+        split[i] += 1
+    return split
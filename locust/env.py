@@ -9,7 +9,7 @@ from configargparse import Namespace
 from .dispatch import UsersDispatcher
 from .event import Events
 from .exception import RunnerAlreadyExistsError
-from .runners import LocalRunner, MasterRunner, Runner, WorkerRunner
+from .runners import AggregatorRunner, LocalRunner, MasterRunner, Runner, WorkerRunner
 from .shape import LoadTestShape
 from .stats import RequestStats, StatsCSV
 from .user import User
@@ -105,7 +105,7 @@ class Environment:
         self.available_user_tasks = available_user_tasks
         """List of the available Tasks per User Classes to pick from in the Task Picker"""
         self.dispatcher_class = dispatcher_class
-        """A user dispatcher class that decides how users are spawned, default :class:`UsersDispatcher <locust.dispatch.UsersDispatcher>`"""
+        """A user dispatcher class that decides how users are spawned, default :class:`UsersDispatcher <locust.dispatch.UsersDispatcher>`. Use :class:`MinimalMovementUsersDispatcher <locust.dispatch.MinimalMovementUsersDispatcher>` to move as few users as possible when workers join or leave, or :class:`CapacityWeightedUsersDispatcher <locust.dispatch.CapacityWeightedUsersDispatcher>` to give workers users in proportion to their ``--worker-capacity``"""
         self.worker_logs: dict[str, list[str]] = {}
         """Captured logs from all connected workers"""
 
@@ -135,26 +135,35 @@ class Environment:
         """
         return self._create_runner(LocalRunner)
 
-    def create_master_runner(self, master_bind_host="*", master_bind_port=5557) -> MasterRunner:
+    def create_master_runner(
+        self, master_bind_host="*", master_bind_port=5557, master_ipc_path: str | None = None
+    ) -> MasterRunner:
         """
         Create a :class:`MasterRunner <locust.runners.MasterRunner>` instance for this Environment
 
         :param master_bind_host: Interface/host that the master should use for incoming worker connections.
                                  Defaults to "*" which means all interfaces.
         :param master_bind_port: Port that the master should listen for incoming worker connections on
+        :param master_ipc_path: Path of a Unix domain socket that the master should also listen for incoming
+                                connections from workers on the same machine on
         """
         return self._create_runner(
             MasterRunner,
             master_bind_host=master_bind_host,
             master_bind_port=master_bind_port,
+            master_ipc_path=master_ipc_path,
         )
 
-    def create_worker_runner(self, master_host: str, master_port: int) -> WorkerRunner:
+    def create_worker_runner(
+        self, master_host: str, master_port: int, master_ipc_path: str | None = None
+    ) -> WorkerRunner:
         """
         Create a :class:`WorkerRunner <locust.runners.WorkerRunner>` instance for this Environment
 
         :param master_host: Host/IP of a running master node
         :param master_port: Port on master node to connect to
+        :param master_ipc_path: Path of the Unix domain socket of a master on the same machine, to connect to
+                                instead of master_host and master_port
         """
         # Create a new RequestStats with use_response_times_cache set to False to save some memory
         # and CPU cycles, since the response_times_cache is not needed for Worker nodes
@@ -163,6 +172,29 @@ class Environment:
             WorkerRunner,
             master_host=master_host,
             master_port=master_port,
+            master_ipc_path=master_ipc_path,
+        )
+
+    def create_aggregator_runner(
+        self, master_host: str, master_port: int, master_bind_host="*", master_bind_port=5557
+    ) -> AggregatorRunner:
+        """
+        Create an :class:`AggregatorRunner <locust.runners.AggregatorRunner>` instance for this Environment
+
+        :param master_host: Host/IP of a running master node
+        :param master_port: Port on master node to connect to
+        :param master_bind_host: Interface/host that the aggregator should use for incoming worker connections.
+                                 Defaults to "*" which means all interfaces.
+        :param master_bind_port: Port that the aggregator should listen for incoming worker connections on
+        """
+        # like on workers, the stats are reset every time they have been reported to the master
+        self.stats = RequestStats(use_response_times_cache=False)
+        return self._create_runner(
+            AggregatorRunner,
+            master_host=master_host,
+            master_port=master_port,
+            master_bind_host=master_bind_host,
+            master_bind_port=master_bind_port,
         )
 
     def create_web_ui(
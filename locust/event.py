@@ -108,7 +108,8 @@ class Events:
 
     :param request_type: Request type method used
     :param name: Path to the URL that was called (or override name if it was used in the call to the client)
-    :param response_time: Time in milliseconds until exception was thrown
+    :param response_time: Time in milliseconds until exception was thrown. Can be a float, to keep sub-millisecond
+        precision (see ``--high-resolution``)
     :param response_length: Content-length of the response
     :param response: Response object (e.g. a :py:class:`requests.Response`)
     :param context: :ref:`User/request context <request_context>`
@@ -0,0 +1,649 @@
+from __future__ import annotations
+
+import math
+from abc import abstractmethod
+from collections.abc import Mapping, MutableMapping
+from functools import cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+
+"""
+Layout of the log-linear buckets used by LogLinearHistogram.
+
+Response times below 100 ms get one bucket per millisecond. Every following decade
+(100-990, 1000-9900, 10_000-99_000, ...) is split into 90 linear buckets, which gives
+~2 significant digits of precision at every magnitude - the same rounding that
+locust.stats.bucket_response_time does for response times below 100 seconds. Above that,
+bucket_response_time keeps rounding to whole seconds, while the buckets here are 10 seconds
+(and then 100 seconds, ...) wide, which is still within 5% of the response time.
+"""
+LINEAR_BUCKETS = 100
+BUCKETS_PER_DECADE = 90
+MAX_DECADES = 7
+MAX_BUCKETS = LINEAR_BUCKETS + BUCKETS_PER_DECADE * MAX_DECADES
+
+BUCKET_KEYS: list[int] = list(range(LINEAR_BUCKETS)) + [
+    (10 + i % BUCKETS_PER_DECADE) * 10 ** (1 + i // BUCKETS_PER_DECADE) for i in range(BUCKETS_PER_DECADE * MAX_DECADES)
+]
+"""The (rounded) response time that each bucket index represents"""
+
+_KEY_TO_INDEX: dict[int, int] = {key: index for index, key in enumerate(BUCKET_KEYS)}
+
+"""
+Layout of the buckets used by HighResolutionHistogram. It is the same log-linear layout, but in
+microseconds, so response times below 100 µs get one bucket per microsecond and every following
+decade gets 90 buckets. The keys are in (fractional) milliseconds, like all other response times.
+"""
+HIGH_RESOLUTION_SCALE = 1000
+HIGH_RESOLUTION_MAX_BUCKETS = LINEAR_BUCKETS + BUCKETS_PER_DECADE * (MAX_DECADES + 3)
+
+HIGH_RESOLUTION_BUCKET_KEYS: list[float] = [
+    round(key / HIGH_RESOLUTION_SCALE, 3)
+    for key in list(range(LINEAR_BUCKETS))
+    + [
+        (10 + i % BUCKETS_PER_DECADE) * 10 ** (1 + i // BUCKETS_PER_DECADE)
+        for i in range(HIGH_RESOLUTION_MAX_BUCKETS - LINEAR_BUCKETS)
+    ]
+]
+"""The (rounded) response time in ms that each high resolution bucket index represents"""
+
+_HIGH_RESOLUTION_KEY_TO_INDEX: dict[float, int] = {key: index for index, key in enumerate(HIGH_RESOLUTION_BUCKET_KEYS)}
+
+
+def bucket_index(response_time: int | float, max_buckets: int = MAX_BUCKETS) -> int:
+    """
+    Return the index of the log-linear bucket that a response time belongs to. Values above
+    the largest bucket (max_buckets - 1) are clamped into it.
+    """
+    if response_time < 100:
+        return round(response_time) if response_time > 0 else 0
+    scale = 10
+    offset = LINEAR_BUCKETS - 10
+    while response_time >= 100 * scale:
+        scale *= 10
+        offset += BUCKETS_PER_DECADE
+    return min(offset + round(response_time / scale), max_buckets - 1)
+
+
+def _walk_percentiles(
+    descending: Iterable[tuple[int | float, int]], num_requests: int, percents: list[float]
+) -> list[int | float]:
+    """
+    Calculate several percentiles from one walk over (response_time, count) pairs ordered from the
+    slowest response time to the fastest. Uses the same definition as
+    locust.stats.calculate_response_time_percentile.
+    """
+    results: list[int | float] = [0] * len(percents)
+    # a percentile is found once the number of processed requests reaches its threshold, so the
+    # percentiles are resolved in order of increasing threshold (i.e. decreasing percent)
+    pending = sorted(range(len(percents)), key=lambda i: num_requests - int(num_requests * percents[i]))
+    if not pending:
+        return results
+    position = 0
+    processed_count = 0
+    for response_time, count in descending:
+        processed_count += count
+        while num_requests - processed_count <= int(num_requests * percents[pending[position]]):
+            results[pending[position]] = response_time
+            position += 1
+            if position == len(pending):
+                return results
+    # percentiles not reached (e.g. if all response times were None) are 0
+    return results
+
+
+class ResponseTimeHistogram(MutableMapping[int, int]):
+    """
+    Base class for the response time histograms that are stored in StatsEntry.response_times.
+
+    A histogram behaves like the ``{rounded_response_time: count}`` defaultdict that it replaces
+    (missing keys read as 0), but it also knows how to bucket raw response times, how to merge
+    with other histograms and how to answer percentile queries.
+    """
+
+    @abstractmethod
+    def add(self, response_time: int | float, count: int = 1) -> None:
+        """Bucket a raw response time and increase the count for its bucket"""
+        ...
+
+    total: int
+    """Running total of all counts in the histogram"""
+
+    @abstractmethod
+    def merge(self, other: Mapping[int, int]) -> None:
+        """Add the counts of another histogram (or {rounded_response_time: count} dict) to this one"""
+        ...
+
+    @abstractmethod
+    def subtract(self, other: ResponseTimeHistogram) -> None:
+        """Remove the counts of another histogram (that was previously merged into this one)"""
+        ...
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+    @abstractmethod
+    def percentile(self, num_requests: int, percent: float) -> int | float:
+        """
+        Get the response time that a certain number of percent of the requests finished within.
+
+        num_requests is passed in (rather than derived from the histogram) so that the result
+        matches calculate_response_time_percentile for the same arguments.
+        """
+        ...
+
+    @abstractmethod
+    def percentiles(self, num_requests: int, percents: list[float]) -> list[int | float]:
+        """
+        Get the response times for several percentiles at once, in the same order as percents,
+        with a single walk over the histogram.
+        """
+        ...
+
+    @abstractmethod
+    def median(self, num_requests: int) -> int | float: ...
+
+    @abstractmethod
+    def copy(self) -> ResponseTimeHistogram: ...
+
+    def to_dict(self) -> dict[int, int]:
+        """Return the histogram as a plain {rounded_response_time: count} dict"""
+        return dict(self.items())
+
+    def serialize(self) -> dict[int, int] | list[float | int]:
+        """Return the histogram in the form that is sent in worker reports (see unserialize_histogram)"""
+        return self.to_dict()
+
+    def __copy__(self) -> ResponseTimeHistogram:
+        return self.copy()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()!r})"
+
+
+class DictHistogram(ResponseTimeHistogram):
+    """
+    Histogram backed by a dict, keyed by whatever the bucket function returns. This is what is
+    used when locust.stats.bucket_response_time has been replaced with a custom function.
+    """
+
+    def __init__(self, bucket: Callable[[int | float], int]) -> None:
+        self.bucket = bucket
+        self._counts: dict[int, int] = {}
+        self.total = 0
+
+    def add(self, response_time: int | float, count: int = 1) -> None:
+        key = self.bucket(response_time)
+        self._counts[key] = self._counts.get(key, 0) + count
+        self.total += count
+
+    def merge(self, other: Mapping[int, int]) -> None:
+        counts = self._counts
+        for key, count in other.items():
+            counts[key] = counts.get(key, 0) + count
+            self.total += count
+
+    def subtract(self, other: ResponseTimeHistogram) -> None:
+        counts = self._counts
+        for key, count in other.items():
+            if remaining := counts.get(key, 0) - count:
+                counts[key] = remaining
+            else:
+                counts.pop(key, None)
+            self.total -= count
+
+    def clear(self) -> None:
+        self._counts = {}
+        self.total = 0
+
+    def percentile(self, num_requests: int, percent: float) -> int | float:
+        num_of_request = int(num_requests * percent)
+
+        processed_count = 0
+        for response_time in sorted(self._counts.keys(), reverse=True):
+            processed_count += self._counts[response_time]
+            if num_requests - processed_count <= num_of_request:
+                return response_time
+        # if all response times were None
+        return 0
+
+    def percentiles(self, num_requests: int, percents: list[float]) -> list[int | float]:
+        return _walk_percentiles(
+            ((key, self._counts[key]) for key in sorted(self._counts.keys(), reverse=True)), num_requests, percents
+        )
+
+    def median(self, num_requests: int) -> int | float:
+        pos = (num_requests - 1) / 2
+        k = 0
+        for k in sorted(self._counts.keys()):
+            if pos < self._counts[k]:
+                return k
+            pos -= self._counts[k]
+        return k
+
+    def copy(self) -> DictHistogram:
+        histogram = DictHistogram(self.bucket)
+        histogram._counts = self._counts.copy()
+        histogram.total = self.total
+        return histogram
+
+    def __getitem__(self, key: int) -> int:
+        return self._counts.get(key, 0)
+
+    def __setitem__(self, key: int, value: int) -> None:
+        self.total += value - self._counts.get(key, 0)
+        self._counts[key] = value
+
+    def __delitem__(self, key: int) -> None:
+        self.total -= self._counts.pop(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._counts
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._counts)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+class ArrayHistogram(ResponseTimeHistogram):
+    """
+    Base class for histograms that store their counts in a list indexed by bucket.
+
+    Logging a response time is an O(1) index calculation, percentiles are answered by walking
+    the buckets in order (no sorting) and merging histograms with the same bucket layout is
+    element-wise addition. The list only grows as far as the largest bucket seen, so entries
+    with fast responses stay small.
+
+    Subclasses define the bucket layout with _bucket_keys (the response time that each bucket
+    index represents), _key_to_index (the reverse of _bucket_keys) and _bucket_index(), and
+    identify it with layout (see histogram_for_layout).
+    """
+
+    __slots__ = ("_counts", "total")
+
+    _bucket_keys: list[int]
+    _key_to_index: dict[int, int]
+
+    def __init__(self) -> None:
+        self._counts: list[int] = []
+        self.total = 0
+
+    @abstractmethod
+    def _bucket_index(self, response_time: int | float) -> int: ...
+
+    @abstractmethod
+    def _empty(self) -> ArrayHistogram:
+        """Create an empty histogram with the same bucket layout"""
+        ...
+
+    @property
+    @abstractmethod
+    def layout(self) -> str | float: ...
+
+    def buckets(self) -> tuple[list[int], list[int]]:
+        """Return the indexes and the counts of the non-empty buckets"""
+        counts = self._counts
+        indexes = [index for index, count in enumerate(counts) if count]
+        return indexes, [counts[index] for index in indexes]
+
+    def add_buckets(self, indexes: Iterable[int], counts: Iterable[int]) -> None:
+        """Add counts to buckets by index (the reverse of buckets())"""
+        own_counts = self._counts
+        for index, count in zip(indexes, counts):
+            if index >= len(own_counts):
+                self._grow(index)
+            own_counts[index] += count
+            self.total += count
+
+    def _same_layout(self, other: object) -> bool:
+        return isinstance(other, ArrayHistogram) and other._bucket_keys is self._bucket_keys
+
+    def _grow(self, index: int) -> None:
+        self._counts.extend([0] * (index + 1 - len(self._counts)))
+
+    def add(self, response_time: int | float, count: int = 1) -> None:
+        index = self._bucket_index(response_time)
+        if index >= len(self._counts):
+            self._grow(index)
+        self._counts[index] += count
+        self.total += count
+
+    def merge(self, other: Mapping[int, int]) -> None:
+        if self._same_layout(other):
+            other_counts = other._counts  # type: ignore[attr-defined]
+            if len(other_counts) > len(self._counts):
+                self._grow(len(other_counts) - 1)
+            counts = self._counts
+            for index, count in enumerate(other_counts):
+                if count:
+                    counts[index] += count
+            self.total += other.total  # type: ignore[attr-defined]
+        else:
+            for key, count in other.items():
+                self._add_to_key(key, count)
+
+    def subtract(self, other: ResponseTimeHistogram) -> None:
+        if self._same_layout(other):
+            counts = self._counts
+            for index, count in enumerate(other._counts):  # type: ignore[attr-defined]
+                if count:
+                    counts[index] -= count
+            self.total -= other.total
+        else:
+            for key, count in other.items():
+                self._add_to_key(key, -count)
+
+    def clear(self) -> None:
+        self._counts = []
+        self.total = 0
+
+    def _add_to_key(self, key: int, count: int) -> None:
+        index = self._key_to_index.get(key)
+        if index is None:
+            index = self._bucket_index(key)
+        if index >= len(self._counts):
+            self._grow(index)
+        self._counts[index] += count
+        self.total += count
+
+    def percentile(self, num_requests: int, percent: float) -> int | float:
+        num_of_request = int(num_requests * percent)
+
+        processed_count = 0
+        counts = self._counts
+        for index in range(len(counts) - 1, -1, -1):
+            if count := counts[index]:
+                processed_count += count
+                if num_requests - processed_count <= num_of_request:
+                    return self._bucket_keys[index]
+        # if all response times were None
+        return 0
+
+    def percentiles(self, num_requests: int, percents: list[float]) -> list[int | float]:
+        counts = self._counts
+        keys = self._bucket_keys
+        return _walk_percentiles(
+            ((keys[index], counts[index]) for index in range(len(counts) - 1, -1, -1) if counts[index]),
+            num_requests,
+            percents,
+        )
+
+    def median(self, num_requests: int) -> int | float:
+        pos = (num_requests - 1) / 2
+        last = 0
+        for index, count in enumerate(self._counts):
+            if count:
+                if pos < count:
+                    return self._bucket_keys[index]
+                pos -= count
+                last = index
+        return self._bucket_keys[last]
+
+    def copy(self) -> ArrayHistogram:
+        histogram = self._empty()
+        histogram._counts = self._counts.copy()
+        histogram.total = self.total
+        return histogram
+
+    def __getitem__(self, key: int) -> int:
+        index = self._key_to_index.get(key)
+        if index is None or index >= len(self._counts):
+            return 0
+        return self._counts[index]
+
+    def __setitem__(self, key: int, value: int) -> None:
+        index = self._key_to_index.get(key)
+        if index is None:
+            index = self._bucket_index(key)
+        if index >= len(self._counts):
+            self._grow(index)
+        self.total += value - self._counts[index]
+        self._counts[index] = value
+
+    def __delitem__(self, key: int) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self[key] = 0
+
+    def __contains__(self, key: object) -> bool:
+        return bool(self[key]) if isinstance(key, int | float) else False  # type: ignore[index]
+
+    def __iter__(self) -> Iterator[int]:
+        keys = self._bucket_keys
+        return (keys[index] for index, count in enumerate(self._counts) if count)
+
+    def __len__(self) -> int:
+        return sum(1 for count in self._counts if count)
+
+    def __bool__(self) -> bool:
+        return self.total != 0
+
+
+class LogLinearHistogram(ArrayHistogram):
+    """
+    Histogram that stores counts in a list indexed by log-linear bucket (see BUCKET_KEYS). This is
+    the default histogram, and its keys match those of locust.stats.bucket_response_time.
+    """
+
+    __slots__ = ()
+
+    _bucket_keys = BUCKET_KEYS
+    _key_to_index = _KEY_TO_INDEX
+
+    def _bucket_index(self, response_time: int | float) -> int:
+        return bucket_index(response_time)
+
+    def _empty(self) -> LogLinearHistogram:
+        return LogLinearHistogram()
+
+    @property
+    def layout(self) -> str:
+        return "log-linear"
+
+
+class HighResolutionHistogram(ArrayHistogram):
+    """
+    Histogram with the same log-linear layout as LogLinearHistogram, but counted in microseconds
+    (see HIGH_RESOLUTION_BUCKET_KEYS). Response times below 100 ms keep ~2 significant digits
+    instead of being rounded to whole milliseconds, which matters for sub-millisecond services.
+    Keys are fractional milliseconds (e.g. 0.15 for 150 µs).
+    """
+
+    __slots__ = ()
+
+    _bucket_keys = HIGH_RESOLUTION_BUCKET_KEYS  # type: ignore[assignment]
+    _key_to_index = _HIGH_RESOLUTION_KEY_TO_INDEX  # type: ignore[assignment]
+
+    def _bucket_index(self, response_time: int | float) -> int:
+        return bucket_index(response_time * HIGH_RESOLUTION_SCALE, HIGH_RESOLUTION_MAX_BUCKETS)
+
+    def _empty(self) -> HighResolutionHistogram:
+        return HighResolutionHistogram()
+
+    @property
+    def layout(self) -> str:
+        return "high-resolution"
+
+
+SKETCH_MAX_RESPONSE_TIME = 10**10
+"""Response times (in ms) above this are counted in the last bucket of a SketchHistogram"""
+
+SKETCH_MIN_RESPONSE_TIME = 0.001
+"""Response times (in ms) below this are counted as 0 in a SketchHistogram"""
+
+
+class _SketchLayout:
+    """
+    Bucket layout of a SketchHistogram with a certain relative accuracy.
+
+    Bucket 0 holds the response times below SKETCH_MIN_RESPONSE_TIME (m), and is represented by 0.
+    Bucket k > 0 covers [m * gamma**(k - 1), m * gamma**k), where gamma = (1 + a) / (1 - a) for
+    relative accuracy a, and is represented by 2 * m * gamma**k / (gamma + 1), which is within a
+    (relative) of every value in the bucket. The index is purely logarithmic, so this holds for
+    sub-millisecond response times too.
+    """
+
+    def __init__(self, relative_accuracy: float) -> None:
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_index = 1 + int(math.log(SKETCH_MAX_RESPONSE_TIME / SKETCH_MIN_RESPONSE_TIME) / self.log_gamma)
+        factor = 2 * SKETCH_MIN_RESPONSE_TIME / (self.gamma + 1)
+        self.keys: list[float] = [0.0] + [factor * self.gamma**k for k in range(1, self.max_index + 1)]
+        self.key_to_index: dict[float, int] = {key: index for index, key in enumerate(self.keys)}
+
+    def index(self, response_time: int | float) -> int:
+        if response_time < SKETCH_MIN_RESPONSE_TIME:
+            return 0
+        return min(1 + int(math.log(response_time / SKETCH_MIN_RESPONSE_TIME) / self.log_gamma), self.max_index)
+
+
+@cache
+def _sketch_layout(relative_accuracy: float) -> _SketchLayout:
+    return _SketchLayout(relative_accuracy)
+
+
+class SketchHistogram(ArrayHistogram):
+    """
+    Mergeable quantile sketch (in the style of DDSketch) with a configurable relative accuracy.
+
+    Every percentile that is calculated from the sketch is within relative_accuracy (e.g. 0.01 for
+    1%) of an actual response time at that rank, regardless of the distribution. The buckets only
+    depend on the relative accuracy, so sketches from different workers are merged with element-wise
+    addition, and are sent to the master in a compact form (see serialize()).
+    """
+
+    __slots__ = ("relative_accuracy", "_layout", "_bucket_keys", "_key_to_index")
+
+    def __init__(self, relative_accuracy: float) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be between 0 and 1 (was {relative_accuracy})")
+        super().__init__()
+        self.relative_accuracy = relative_accuracy
+        self._layout = _sketch_layout(relative_accuracy)
+        self._bucket_keys = self._layout.keys  # type: ignore[assignment]
+        self._key_to_index = self._layout.key_to_index  # type: ignore[assignment]
+
+    def _bucket_index(self, response_time: int | float) -> int:
+        return self._layout.index(response_time)
+
+    def _empty(self) -> SketchHistogram:
+        return SketchHistogram(self.relative_accuracy)
+
+    @property
+    def layout(self) -> float:
+        return self.relative_accuracy
+
+    def serialize(self) -> list[float | int] | dict[int, int]:
+        """
+        Return the sketch as [relative_accuracy, first_index, count, count, ...] with the counts of
+        all buckets from first_index up to the last non-empty one. Bucket keys are implied by the
+        relative accuracy, so they don't need to be sent.
+        """
+        counts = self._counts
+        first_index = next((index for index, count in enumerate(counts) if count), len(counts))
+        return [self.relative_accuracy, first_index, *counts[first_index:]]
+
+    @classmethod
+    def unserialize(cls, data: list[float | int]) -> SketchHistogram:
+        relative_accuracy, first_index, *counts = data
+        histogram = cls(relative_accuracy)
+        histogram._counts = [0] * int(first_index) + [int(count) for count in counts]
+        histogram.total = sum(histogram._counts)
+        return histogram
+
+
+def unserialize_histogram(data: Mapping[int, int] | list[float | int]) -> Mapping[int, int]:
+    """
+    Convert the response_times of a worker report back into a mapping that can be merged into any
+    ResponseTimeHistogram
+    """
+    if isinstance(data, list):
+        return SketchHistogram.unserialize(data)
+    return data
+
+
+def histogram_for_layout(layout: str | float) -> ArrayHistogram:
+    """
+    Create an empty histogram from the layout of an ArrayHistogram: "log-linear", "high-resolution"
+    or the relative accuracy of a SketchHistogram
+    """
+    if layout == "log-linear":
+        return LogLinearHistogram()
+    if layout == "high-resolution":
+        return HighResolutionHistogram()
+    if isinstance(layout, float):
+        return SketchHistogram(layout)
+    raise ValueError(f"Unknown histogram layout {layout!r}")
+
+
+class WindowedHistogram:
+    """
+    The response time distribution of (approximately) the last `window` seconds.
+
+    Response times are added to a per-second delta histogram in a ring of `window` slots, and to a
+    running sum of all the slots. When a slot is reused for a new second (or expires when advance()
+    is called), its delta is subtracted from the running sum. Percentiles for the window are then
+    answered directly from the running sum, without copying or diffing full histograms.
+    """
+
+    def __init__(self, window: int, create_histogram: Callable[[], ResponseTimeHistogram]) -> None:
+        self.window = window
+        self.histogram = create_histogram()
+        """Running sum of the response times in the window"""
+        self.last_update: int | None = None
+        """The latest second that was recorded in (or used to start) the window"""
+        self._deltas = [create_histogram() for _ in range(window)]
+        self._seconds = [-1] * window
+
+    def _slot(self, second: int) -> ResponseTimeHistogram | None:
+        slot = second % self.window
+        slot_second = self._seconds[slot]
+        if slot_second != second:
+            if slot_second > second:
+                # too old to be part of the window any more
+                return None
+            self._expire(slot)
+            self._seconds[slot] = second
+        if self.last_update is None or second > self.last_update:
+            self.last_update = second
+        return self._deltas[slot]
+
+    def _expire(self, slot: int) -> None:
+        delta = self._deltas[slot]
+        if delta.total:
+            self.histogram.subtract(delta)
+            delta.clear()
+        self._seconds[slot] = -1
+
+    def add(self, second: int, response_time: int | float) -> None:
+        if (delta := self._slot(second)) is not None:
+            delta.add(response_time)
+            self.histogram.add(response_time)
+
+    def merge(self, second: int, other: Mapping[int, int]) -> None:
+        """Add the counts from another histogram, as if all its response times were logged during second"""
+        if (delta := self._slot(second)) is not None:
+            delta.merge(other)
+            self.histogram.merge(other)
+
+    def start(self, second: int) -> None:
+        """Mark the window as up to date at second, even if nothing has been recorded yet"""
+        if self.last_update is None or second > self.last_update:
+            self.last_update = second
+
+    def advance(self, second: int) -> None:
+        """Expire all the seconds that are older than the window ending at second"""
+        oldest = second - self.window
+        for slot, slot_second in enumerate(self._seconds):
+            if slot_second != -1 and slot_second <= oldest:
+                self._expire(slot)
+
+    def percentiles(self, second: int, percents: list[float]) -> list[int | float]:
+        """Get response time percentiles for the window ending at second"""
+        self.advance(second)
+        return self.histogram.percentiles(self.histogram.total, percents)
@@ -88,8 +88,11 @@ def get_html_report(
                     "name": stat.name,
                     "method": stat.method or "",
                     **{
-                        str(percentile): stat.get_response_time_percentile(percentile)
-                        for percentile in PERCENTILES_FOR_HTML_REPORT
+                        str(percentile): value
+                        for percentile, value in zip(
+                            PERCENTILES_FOR_HTML_REPORT,
+                            stat.get_response_time_percentiles(PERCENTILES_FOR_HTML_REPORT),
+                        )
                     },
                 }
                 for stat in requests_statistics
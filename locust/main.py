@@ -10,8 +10,10 @@ import inspect
 import itertools
 import logging
 import os
+import shutil
 import signal
 import sys
+import tempfile
 import time
 import traceback
 import webbrowser
@@ -19,7 +21,7 @@ from typing import TYPE_CHECKING
 
 import gevent
 
-from . import log, stats
+from . import log, stats, stats_shm
 from .argument_parser import (
     get_locustfiles_locally,
     get_parser,
@@ -167,8 +169,47 @@ def main():
     if options.stats_history_enabled and (options.csv_prefix is None):
         parser.error("'--csv-full-history' requires '--csv'.")
 
+    if options.percentile_sketch is not None:
+        if not 0 < options.percentile_sketch < 1:
+            parser.error("'--percentile-sketch' must be a relative accuracy between 0 and 1, e.g. 0.01")
+        stats.RESPONSE_TIME_SKETCH_RELATIVE_ACCURACY = options.percentile_sketch
+
+    if options.high_resolution:
+        if options.percentile_sketch is not None:
+            parser.error("'--high-resolution' can't be combined with '--percentile-sketch'")
+        stats.RESPONSE_TIME_HIGH_RESOLUTION = True
+
+    if options.stats_batch_size < 0:
+        parser.error("'--stats-batch-size' can't be negative")
+    stats.REQUEST_STATS_BATCH_SIZE = options.stats_batch_size
+
+    if options.template_request_names:
+        stats.TEMPLATE_REQUEST_NAMES = True
+
+    if options.max_request_entries is not None:
+        if options.max_request_entries < 1:
+            parser.error("'--max-request-entries' must be at least 1")
+        stats.MAX_REQUEST_ENTRIES = options.max_request_entries
+
+    if options.max_errors is not None:
+        if options.max_errors < 1:
+            parser.error("'--max-errors' must be at least 1")
+        stats.MAX_ERRORS = options.max_errors
+
+    if options.template_errors:
+        stats.TEMPLATE_ERRORS = True
+
+    if options.compact_stats_reports:
+        stats.COMPACT_STATS_REPORTS = True
+
     stats.validate_stats_configuration()
 
+    if options.aggregator:
+        if options.master or options.worker or options.processes:
+            parser.error("'--aggregator' can't be combined with --master, --worker or --processes")
+        # to the master, and to the rest of this function, an aggregator is a worker
+        options.worker = True
+
     if options.headful:
         options.headless = False
 
@@ -187,6 +228,8 @@ def main():
             start_message += ", OpenTelemetry enabled"
 
     children = []
+    # the forked workers connect to the master (this process, unless it is a --worker) on a Unix domain socket
+    master_ipc_path = None
     logger = logging.getLogger(__name__)
 
     logger.info(start_message)
@@ -212,13 +255,19 @@ def main():
         gc.collect()  # avoid freezing garbage
         if hasattr(gc, "freeze"):
             gc.freeze()  # move all objects to perm gen so ref counts dont get updated
-        for _ in range(options.processes):
+        if not options.worker:
+            # in a private directory, rather than at a predictable path in the shared temp directory
+            master_ipc_path = os.path.join(tempfile.mkdtemp(prefix="locust-"), "master.ipc")
+            # the forked workers write their stats reports to shared memory instead of sending them to the master
+            stats.SHARED_STATS = stats_shm.SharedStats(options.processes)
+        for worker_slot in range(options.processes):
             if child_pid := gevent.fork():
                 children.append(child_pid)
                 logging.debug(f"Started child worker with pid #{child_pid}")
             else:
                 # child is always a worker, even when it wasn't set on command line
                 options.worker = True
+                stats.SHARED_STATS_SLOT = worker_slot
                 # remove options that dont make sense on worker
                 options.run_time = None
                 options.autostart = None
@@ -291,6 +340,8 @@ def main():
                     # otherwise the terminal might look weird.
                     time.sleep(0.1)
 
+                # registered first, so that it runs after the workers are gone
+                atexit.register(shutil.rmtree, os.path.dirname(master_ipc_path), ignore_errors=True)
                 atexit.register(kill_workers, children)
 
     greenlet_exception_handler = greenlet_exception_logger(logger)
@@ -397,6 +448,10 @@ See https://github.com/locustio/locust/wiki/Installation#increasing-maximum-numb
         print_task_ratio_json(user_classes, options.num_users)
         sys.exit(0)
 
+    if options.worker_capacity is not None and options.worker_capacity <= 0:
+        logger.error(f"Invalid --worker-capacity argument ({options.worker_capacity}), must be a positive number")
+        sys.exit(-1)
+
     if options.master:
         if options.worker:
             logger.error("The --master argument cannot be combined with --worker")
@@ -407,10 +462,25 @@ See https://github.com/locustio/locust/wiki/Installation#increasing-maximum-numb
         runner = environment.create_master_runner(
             master_bind_host=options.master_bind_host,
             master_bind_port=options.master_bind_port,
+            master_ipc_path=master_ipc_path,
         )
+    elif options.aggregator:
+        try:
+            runner = environment.create_aggregator_runner(
+                options.master_host,
+                options.master_port,
+                master_bind_host=options.master_bind_host,
+                master_bind_port=options.master_bind_port,
+            )
+            logger.debug(
+                "Connected to locust master: %s:%s%s", options.master_host, options.master_port, options.web_base_path
+            )
+        except OSError as e:
+            logger.error("Failed to connect to the Locust master: %s", e)
+            sys.exit(-1)
     elif options.worker:
         try:
-            runner = environment.create_worker_runner(options.master_host, options.master_port)
+            runner = environment.create_worker_runner(options.master_host, options.master_port, master_ipc_path)
             logger.debug(
                 "Connected to locust master: %s:%s%s", options.master_host, options.master_port, options.web_base_path
             )
@@ -654,7 +724,7 @@ See https://github.com/locustio/locust/wiki/Installation#increasing-maximum-numb
             stats.print_stats_json(runner.stats)
         if options.json_file:
             stats.save_stats_json(runner.stats, options.json_file)
-        elif not isinstance(runner, locust.runners.WorkerRunner):
+        elif not isinstance(runner, (locust.runners.WorkerRunner, locust.runners.AggregatorRunner)):
             stats.print_stats(runner.stats, current=False)
             stats.print_percentile_stats(runner.stats)
             stats.print_error_report(runner.stats)
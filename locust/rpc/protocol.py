@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 import datetime
+import time
+import zlib
+from functools import partial
 
 import msgpack
 
@@ -13,6 +16,55 @@ except ImportError:
             raise Exception("You need to install pymongo or at least bson to be able to send/receive ObjectIds")
 
 
+try:
+    from compression import zstd  # type: ignore[import-not-found]
+
+    zstd_compress, zstd_decompress = zstd.compress, zstd.decompress
+except ImportError:
+    try:
+        import zstandard  # type: ignore[import-not-found]
+
+        zstd_compress, zstd_decompress = zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    except ImportError:
+        zstd_compress = zstd_decompress = None
+
+try:
+    import lz4.frame  # type: ignore[import-not-found]
+except ImportError:
+    lz4 = None
+
+
+PROTOCOL_VERSION = 2
+"""
+Version of the message encoding that is negotiated when a worker connects (offered by the master in the ack, and
+accepted in the worker's first heartbeat). In version 1, datetimes and ObjectIds are sent as maps with a marker key,
+so every map that is received has to be checked for them. In version 2 they are msgpack extension types, and maps
+are decoded without calling any Python code.
+"""
+LEGACY_PROTOCOL_VERSION = 1
+
+EXT_DATETIME = 1
+EXT_OBJECT_ID = 2
+EXT_ZSTD = 3
+EXT_LZ4 = 4
+EXT_ZLIB = 5
+
+COMPRESSION_THRESHOLD = 8192
+"""
+Messages that are at least this many bytes when serialized are compressed, if compression was negotiated with the
+peer. Smaller ones (like heartbeats) aren't worth the CPU time.
+"""
+
+# the extension type, compress and decompress function of each available codec, in order of preference
+COMPRESSORS = {}
+if zstd_compress is not None:
+    COMPRESSORS["zstd"] = (EXT_ZSTD, zstd_compress, zstd_decompress)
+if lz4 is not None:
+    COMPRESSORS["lz4"] = (EXT_LZ4, lz4.frame.compress, lz4.frame.decompress)
+COMPRESSORS["zlib"] = (EXT_ZLIB, partial(zlib.compress, level=1), zlib.decompress)
+DECOMPRESSORS = {code: decompress for code, _, decompress in COMPRESSORS.values()}
+
+
 def decode(obj):
     if "__datetime__" in obj:
         obj = datetime.datetime.strptime(obj["as_str"], "%Y%m%dT%H:%M:%S.%f")
@@ -29,6 +81,44 @@ def encode(obj):
     return obj
 
 
+def decode_ext(code, data):
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    elif code == EXT_OBJECT_ID:
+        return ObjectId(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def encode_ext(obj):
+    if isinstance(obj, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode())
+    elif isinstance(obj, ObjectId):
+        return msgpack.ExtType(EXT_OBJECT_ID, str(obj).encode())
+    return obj
+
+
+class CompressionStats:
+    """Counters of the messages that a socket compressed and decompressed, see Message.serialize"""
+
+    def __init__(self):
+        self.sent_messages = 0
+        self.sent_bytes_saved = 0
+        self.compress_time = 0.0
+        self.received_messages = 0
+        self.received_bytes_saved = 0
+        self.decompress_time = 0.0
+
+    def to_dict(self):
+        return {
+            "sent_messages": self.sent_messages,
+            "sent_bytes_saved": self.sent_bytes_saved,
+            "compress_time": self.compress_time,
+            "received_messages": self.received_messages,
+            "received_bytes_saved": self.received_bytes_saved,
+            "decompress_time": self.decompress_time,
+        }
+
+
 class Message:
     def __init__(self, message_type, data, node_id):
         self.type = message_type
@@ -38,10 +128,46 @@ class Message:
     def __repr__(self):
         return f"<Message {self.type}:{self.node_id}>"
 
-    def serialize(self):
-        return msgpack.dumps((self.type, self.data, self.node_id), default=encode)
+    def serialize(self, protocol_version=PROTOCOL_VERSION, compression=None, compression_stats=None):
+        """
+        If compression is the name of one of the COMPRESSORS and the message is at least COMPRESSION_THRESHOLD
+        bytes, it is compressed, and sent as an extension type of the codec. The compression is counted in
+        compression_stats, if given.
+        """
+        default = encode if protocol_version == LEGACY_PROTOCOL_VERSION else encode_ext
+        data = msgpack.dumps((self.type, self.data, self.node_id), default=default)
+        if compression is None or len(data) < COMPRESSION_THRESHOLD:
+            return data
+        code, compress, _ = COMPRESSORS[compression]
+        start = time.thread_time()
+        compressed = msgpack.dumps(msgpack.ExtType(code, compress(data)))
+        if compression_stats is not None:
+            compression_stats.compress_time += time.thread_time() - start
+        if len(compressed) >= len(data):
+            # incompressible data isn't sent bigger than it is
+            return data
+        if compression_stats is not None:
+            compression_stats.sent_messages += 1
+            compression_stats.sent_bytes_saved += len(data) - len(compressed)
+        return compressed
 
     @classmethod
-    def unserialize(cls, data):
-        msg = cls(*msgpack.loads(data, raw=False, strict_map_key=False, object_hook=decode))
+    def unserialize(cls, data, protocol_version=PROTOCOL_VERSION, compression_stats=None):
+        # extension types are always decoded, so messages from newer peers can be read before the version is known
+        if protocol_version == LEGACY_PROTOCOL_VERSION:
+            loads = partial(msgpack.loads, raw=False, strict_map_key=False, object_hook=decode, ext_hook=decode_ext)
+        else:
+            loads = partial(msgpack.loads, raw=False, strict_map_key=False, ext_hook=decode_ext)
+        unpacked = loads(data)
+        if isinstance(unpacked, msgpack.ExtType):
+            if unpacked.code not in DECOMPRESSORS:
+                raise ValueError(f"Message compressed with an unsupported codec (extension type {unpacked.code})")
+            start = time.thread_time()
+            decompressed = DECOMPRESSORS[unpacked.code](unpacked.data)
+            if compression_stats is not None:
+                compression_stats.received_messages += 1
+                compression_stats.received_bytes_saved += len(decompressed) - len(data)
+                compression_stats.decompress_time += time.thread_time() - start
+            unpacked = loads(decompressed)
+        msg = cls(*unpacked)
         return msg
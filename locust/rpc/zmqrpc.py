@@ -1,6 +1,7 @@
 from locust.exception import RPCError, RPCReceiveError, RPCSendError
 from locust.util.exception_handler import retry
 
+import os
 import socket as csocket
 from socket import gaierror, has_dualstack_ipv6
 
@@ -8,7 +9,7 @@ import msgpack.exceptions as msgerr
 import zmq.error as zmqerr
 import zmq.green as zmq
 
-from .protocol import Message
+from .protocol import LEGACY_PROTOCOL_VERSION, CompressionStats, Message
 
 
 class BaseSocket:
@@ -21,24 +22,39 @@ class BaseSocket:
         if has_dualstack_ipv6() and not ipv4_only:
             self.socket.setsockopt(zmq.IPV6, 1)
 
+        # the protocol version of the peer (of each peer, by node id, for a server), which is the legacy one
+        # until the runners have negotiated another (see locust.rpc.protocol.PROTOCOL_VERSION)
+        self.protocol_version = LEGACY_PROTOCOL_VERSION
+        self.protocol_versions: dict[str, int] = {}
+        # the version that a client decodes messages from the server with, which only changes when the server
+        # says it has switched (the legacy decoding can also read the messages of later versions)
+        self.receive_protocol_version = LEGACY_PROTOCOL_VERSION
+        # likewise the codec to compress large messages to the peer with, if any was negotiated
+        self.compression: str | None = None
+        self.compressions: dict[str, str | None] = {}
+        self.compression_stats = CompressionStats()
+
     @retry()
     def send(self, msg):
         try:
-            self.socket.send(msg.serialize(), zmq.NOBLOCK)
+            data = msg.serialize(self.protocol_version, self.compression, self.compression_stats)
+            self.socket.send(data, zmq.NOBLOCK)
         except zmqerr.ZMQError as e:
             raise RPCSendError("ZMQ sent failure") from e
 
     @retry()
     def send_to_client(self, msg):
         try:
-            self.socket.send_multipart([msg.node_id.encode(), msg.serialize()])
+            protocol_version = self.protocol_versions.get(msg.node_id, LEGACY_PROTOCOL_VERSION)
+            data = msg.serialize(protocol_version, self.compressions.get(msg.node_id), self.compression_stats)
+            self.socket.send_multipart([msg.node_id.encode(), data])
         except zmqerr.ZMQError as e:
             raise RPCSendError("ZMQ sent failure") from e
 
     def recv(self):
         try:
             data = self.socket.recv()
-            msg = Message.unserialize(data)
+            msg = Message.unserialize(data, self.receive_protocol_version, self.compression_stats)
         except msgerr.ExtraData as e:
             raise RPCReceiveError("ZMQ interrupted message") from e
         except zmqerr.ZMQError as e:
@@ -54,11 +70,19 @@ class BaseSocket:
         except zmqerr.ZMQError as e:
             raise RPCError("ZMQ network broken") from e
         try:
-            msg = Message.unserialize(data[1])
+            protocol_version = self.protocol_versions.get(addr, LEGACY_PROTOCOL_VERSION)
+            msg = Message.unserialize(data[1], protocol_version, self.compression_stats)
         except (UnicodeDecodeError, msgerr.ExtraData) as e:
             raise RPCReceiveError("ZMQ interrupted or corrupted message", addr=addr) from e
         return addr, msg
 
+    def poll(self, timeout=0) -> bool:
+        """Return True if there is a message waiting to be received (waiting at most timeout milliseconds for one)"""
+        try:
+            return bool(self.socket.poll(timeout, zmq.POLLIN))
+        except zmqerr.ZMQError:
+            return False  # let the next recv report the error
+
     def close(self, linger=None):
         self.socket.close(linger=linger)
 
@@ -75,7 +99,11 @@ class BaseSocket:
 
 
 class Server(BaseSocket):
-    def __init__(self, host, port):
+    def __init__(self, host, port, ipc_path=None):
+        """
+        If ipc_path is given, the server also binds a Unix domain socket (ZeroMQ ipc transport) at that path,
+        for clients on the same machine to connect to without going through TCP.
+        """
         BaseSocket.__init__(self, zmq.ROUTER, self.ipv4_only(host, port))
         if port == 0:
             self.port = self.socket.bind_to_random_port(f"tcp://{host}")
@@ -85,10 +113,33 @@ class Server(BaseSocket):
                 self.port = port
             except zmqerr.ZMQError as e:
                 raise RPCError(f"Socket bind failure: {e}")
+        self.ipc_path = ipc_path
+        if ipc_path is not None:
+            try:
+                self.socket.bind(f"ipc://{ipc_path}")
+            except zmqerr.ZMQError as e:
+                raise RPCError(f"Socket bind failure: {e}")
+
+    def close(self, linger=None):
+        BaseSocket.close(self, linger=linger)
+        if self.ipc_path is not None:
+            # don't leave the socket file behind
+            try:
+                os.unlink(self.ipc_path)
+            except FileNotFoundError:
+                pass
 
 
 class Client(BaseSocket):
-    def __init__(self, host, port, identity):
-        BaseSocket.__init__(self, zmq.DEALER, self.ipv4_only(host, port))
+    def __init__(self, host, port, identity, ipc_path=None):
+        """
+        If ipc_path is given, the client connects to the Unix domain socket that a Server on the same machine
+        bound there, instead of to host and port.
+        """
+        # no need to resolve the host (to check for IPv6 support) if it isn't connected to
+        BaseSocket.__init__(self, zmq.DEALER, ipc_path is not None or self.ipv4_only(host, port))
         self.socket.setsockopt(zmq.IDENTITY, identity.encode())
-        self.socket.connect("tcp://%s:%i" % (host, port))
+        if ipc_path is not None:
+            self.socket.connect(f"ipc://{ipc_path}")
+        else:
+            self.socket.connect("tcp://%s:%i" % (host, port))
@@ -15,6 +15,7 @@ import traceback
 from abc import abstractmethod
 from collections import defaultdict
 from collections.abc import Callable, Iterator, MutableMapping, ValuesView
+from itertools import islice
 from operator import itemgetter, methodcaller
 from types import TracebackType
 from typing import TYPE_CHECKING, Any, NoReturn, TypedDict, cast
@@ -26,11 +27,12 @@ import psutil
 from gevent.event import Event
 from gevent.pool import Group
 
-from . import argument_parser
+from . import argument_parser, stats
 from .dispatch import UsersDispatcher
 from .exception import RPCError, RPCReceiveError, RPCSendError, StopTest
 from .log import get_logs, greenlet_exception_logger
 from .rpc import Message, rpc
+from .rpc.protocol import COMPRESSORS, LEGACY_PROTOCOL_VERSION, PROTOCOL_VERSION
 from .stats import RequestStats, StatsError, setup_distributed_stats_event_listeners
 from .util.directory import get_abspaths_in
 from .util.url import is_url
@@ -54,6 +56,9 @@ WORKER_REPORT_INTERVAL = 3.0
 WORKER_LOG_REPORT_INTERVAL = 10
 CPU_MONITOR_INTERVAL = 10.0
 CPU_WARNING_THRESHOLD = 90
+# number of heartbeats in a row with a cpu usage above CPU_WARNING_THRESHOLD after which the master asks the users
+# dispatcher to move users away from a worker (workers measure their cpu usage every CPU_MONITOR_INTERVAL seconds)
+CPU_OVERLOADED_HEARTBEATS = 30
 HEARTBEAT_INTERVAL = 1
 HEARTBEAT_LIVENESS = 3
 HEARTBEAT_DEAD_INTERNAL = -60
@@ -61,6 +66,11 @@ MASTER_HEARTBEAT_TIMEOUT = 60
 FALLBACK_INTERVAL = 5
 CONNECT_TIMEOUT = 5
 CONNECT_RETRY_COUNT = 60
+# max number of waiting messages that the master handles together (see MasterRunner.client_listener)
+MASTER_RECEIVE_BATCH_SIZE = 100
+# longest interval that the master asks the workers to report at when it can't keep up with receiving their messages
+# (see MasterRunner.adapt_report_interval)
+MAX_WORKER_REPORT_INTERVAL = 10.0
 
 
 def locust_exception_handler(environment: Environment):
@@ -101,6 +111,8 @@ class Runner:
     def __init__(self, environment: Environment) -> None:
         self.environment = environment
         self.user_greenlets = Group()
+        # the running users of each user class (by name), in the order they were spawned
+        self._users_by_class: defaultdict[str, dict[User, None]] = defaultdict(dict)
         self.greenlet = Group()
         self.state = STATE_INIT
         self.spawning_greenlet: gevent.Greenlet | None = None
@@ -128,7 +140,14 @@ class Runner:
             if exception:
                 self.stats.log_error(request_type, name, exception)
 
-        self.environment.events.request.add_listener(on_request)
+        def on_request_buffered(request_type, name, response_time, response_length, exception=None, **_kwargs):
+            self.stats.buffer_request(request_type, name, response_time, response_length, exception)
+
+        if stats.REQUEST_STATS_BATCH_SIZE > 1:
+            self.environment.events.request.add_listener(on_request_buffered)
+            self.greenlet.spawn(self.flush_request_stats).link_exception(locust_exception_handler(self.environment))
+        else:
+            self.environment.events.request.add_listener(on_request)
 
         self.connection_broken = False
         self.final_user_classes_count: dict[str, int] = {}  # just for the ratio report, fills before runner stops
@@ -176,22 +195,9 @@ class Runner:
         :returns: Number of currently running users for each user class
         """
         user_classes_count = {user_class.__name__: 0 for user_class in self.user_classes}
-        for user_greenlet in self.user_greenlets:
-            try:
-                user = user_greenlet.args[0]
-            except IndexError:
-                # TODO: Find out why args is sometimes empty. In gevent code,
-                #       the supplied args are cleared in the gevent.greenlet.Greenlet.__free,
-                #       so it seems a good place to start investigating. My suspicion is that
-                #       the supplied args are emptied whenever the greenlet is dead, so we can
-                #       simply ignore the greenlets with empty args.
-                logger.debug(
-                    "ERROR: While calculating number of running users, we encountered a user that didn't have proper args %s (user_greenlet.dead=%s)",
-                    user_greenlet,
-                    user_greenlet.dead,
-                )
-                continue
-            user_classes_count[user.__class__.__name__] += 1
+        for user_class_name, users in self._users_by_class.items():
+            if users:
+                user_classes_count[user_class_name] = len(users)
         return user_classes_count
 
     def update_state(self, new_state: str) -> None:
@@ -227,7 +233,7 @@ class Runner:
                 assert hasattr(new_user, "environment"), (
                     f"Attribute 'environment' is missing on user {user_class}. Perhaps you defined your own __init__ and forgot to call the base constructor? (super().__init__(*args, **kwargs))"
                 )
-                new_user.start(self.user_greenlets)
+                self._register_user(new_user, new_user.start(self.user_greenlets))
                 new_users.append(new_user)
                 n += 1
                 if n % 10 == 0 or n == spawn_count:
@@ -244,28 +250,19 @@ class Runner:
             logger.info("All users stopped\n")
         return new_users
 
+    def _register_user(self, user: User, user_greenlet: gevent.Greenlet) -> None:
+        """Add a started user to the registry of its class, from which it is removed when its greenlet exits"""
+        users = self._users_by_class[user.__class__.__name__]
+        users[user] = None
+        user_greenlet.rawlink(lambda _: users.pop(user, None))
+
     def stop_users(self, user_classes_stop_count: dict[str, int]) -> None:
         async_calls_to_stop = Group()
         stop_group = Group()
 
         for user_class, stop_count in user_classes_stop_count.items():
-            if self.user_classes_count[user_class] == 0:
-                continue
-
-            to_stop: list[greenlet.greenlet] = []
-            for user_greenlet in self.user_greenlets:
-                if len(to_stop) == stop_count:
-                    break
-                try:
-                    user = user_greenlet.args[0]
-                except IndexError:
-                    logger.error(
-                        "While stopping users, we encountered a user that didn't have proper args %s", user_greenlet
-                    )
-                    continue
-                if type(user) is self.user_classes_by_name[user_class]:
-                    to_stop.append(user)
-
+            # stop the most recently spawned users first
+            to_stop: list[User] = list(islice(reversed(self._users_by_class.get(user_class, {})), stop_count))
             if not to_stop:
                 continue
 
@@ -313,6 +310,12 @@ class Runner:
                 environment=self.environment, cpu_usage=self.current_cpu_usage, memory_usage=self.current_memory_usage
             )
 
+    def flush_request_stats(self) -> NoReturn:
+        """Periodically log the requests that have been buffered (see REQUEST_STATS_BATCH_SIZE)"""
+        while True:
+            gevent.sleep(stats.REQUEST_STATS_FLUSH_INTERVAL)
+            self.stats.flush_requests()
+
     @abstractmethod
     def start(
         self, user_count: int, spawn_rate: float, wait: bool = False, user_classes: list[type[User]] | None = None
@@ -403,6 +406,7 @@ class Runner:
             self.shape_last_tick = None
 
         self.stop_users(self.user_classes_count)
+        self.stats.flush_requests()
 
         self._users_dispatcher = None
 
@@ -589,26 +593,109 @@ class DistributedRunner(Runner):
 
 class WorkerNode:
     def __init__(self, id: str, state=STATE_INIT, heartbeat_liveness=HEARTBEAT_LIVENESS) -> None:
+        self._nodes: WorkerNodes | None = None
         self.id: str = id
-        self.state = state
+        self._state = state
         self.heartbeat = heartbeat_liveness
         self.cpu_usage: int = 0
         self.cpu_warning_emitted = False
+        # number of heartbeats in a row with a cpu usage above CPU_WARNING_THRESHOLD
+        self.cpu_overloaded_heartbeats = 0
+        # how much load the worker can take compared to other workers (--worker-capacity)
+        self.capacity: float = 1.0
+        # whether the worker accepted the encoding offered in the ack, which workers of older versions don't
+        self.negotiated = False
         self.memory_usage: int = 0
-        # The reported users running on the worker
-        self.user_classes_count: dict[str, int] = {}
+        self._user_classes_count: dict[str, int] = {}
+        self._user_count = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, state: str) -> None:
+        if state == self._state:
+            return
+        if self._nodes is not None:
+            self._nodes._unindex(self)
+        self._state = state
+        if self._nodes is not None:
+            self._nodes._index(self)
+
+    @property
+    def user_classes_count(self) -> dict[str, int]:
+        """
+        The reported users running on the worker. Assign a new dict to update it (don't modify it in place),
+        so that the totals of the WorkerNodes it belongs to are kept up to date.
+        """
+        return self._user_classes_count
+
+    @user_classes_count.setter
+    def user_classes_count(self, user_classes_count: dict[str, int]) -> None:
+        if self._nodes is not None:
+            self._nodes._unindex(self)
+        self._user_classes_count = user_classes_count
+        self._user_count = sum(user_classes_count.values())
+        if self._nodes is not None:
+            self._nodes._index(self)
 
     @property
     def user_count(self) -> int:
-        return sum(self.user_classes_count.values())
+        return self._user_count
 
 
 class WorkerNodes(MutableMapping):
+    """
+    The worker nodes of a master, by id. The nodes are also indexed by state, and the number of users per
+    class is kept for each state, so that neither has to be recomputed from all the nodes on every access.
+    The indexes are updated when the state or user_classes_count of a node is set.
+    """
+
     def __init__(self) -> None:
         self._worker_nodes: dict[str, WorkerNode] = {}
+        self._by_state: defaultdict[str, dict[str, WorkerNode]] = defaultdict(dict)
+        self._user_classes_count_by_state: defaultdict[str, dict[str, int]] = defaultdict(dict)
+        # the number of nodes that report each user class (so that classes are only left out of
+        # user_classes_count_by_state when no node reports them, even if their count is 0)
+        self._user_classes_nodes_by_state: defaultdict[str, dict[str, int]] = defaultdict(dict)
+        self.user_count = 0
+        """ Total number of users on all nodes """
+
+    def _index(self, node: WorkerNode) -> None:
+        self._by_state[node.state][node.id] = node
+        counts = self._user_classes_count_by_state[node.state]
+        nodes = self._user_classes_nodes_by_state[node.state]
+        for name, count in node.user_classes_count.items():
+            counts[name] = counts.get(name, 0) + count
+            nodes[name] = nodes.get(name, 0) + 1
+        self.user_count += node.user_count
+
+    def _unindex(self, node: WorkerNode) -> None:
+        del self._by_state[node.state][node.id]
+        counts = self._user_classes_count_by_state[node.state]
+        nodes = self._user_classes_nodes_by_state[node.state]
+        for name, count in node.user_classes_count.items():
+            counts[name] -= count
+            nodes[name] -= 1
+            if not nodes[name]:
+                del counts[name], nodes[name]
+        self.user_count -= node.user_count
 
     def get_by_state(self, state) -> list[WorkerNode]:
-        return [c for c in self.values() if c.state == state]
+        return list(self._by_state[state].values())
+
+    def count_by_state(self, *states: str) -> int:
+        """Number of nodes in any of the states"""
+        return sum(len(self._by_state[state]) for state in states)
+
+    def user_classes_count_by_state(self, *states: str) -> dict[str, int]:
+        """Number of users per class on the nodes in any of the states"""
+        user_classes_count: dict[str, int] = defaultdict(int)
+        for state in states:
+            for name, count in self._user_classes_count_by_state[state].items():
+                user_classes_count[name] += count
+        return user_classes_count
 
     @property
     def all(self) -> ValuesView[WorkerNode]:
@@ -631,10 +718,16 @@ class WorkerNodes(MutableMapping):
         return self.get_by_state(STATE_MISSING)
 
     def __setitem__(self, k: str, v: WorkerNode) -> None:
+        if k in self._worker_nodes:
+            del self[k]
         self._worker_nodes[k] = v
+        v._nodes = self
+        self._index(v)
 
     def __delitem__(self, k: str) -> None:
-        del self._worker_nodes[k]
+        node = self._worker_nodes.pop(k)
+        self._unindex(node)
+        node._nodes = None
 
     def __getitem__(self, k: str) -> WorkerNode:
         return self._worker_nodes[k]
@@ -656,16 +749,18 @@ class MasterRunner(DistributedRunner):
     :class:`WorkerRunners <WorkerRunner>` will aggregated.
     """
 
-    def __init__(self, environment, master_bind_host, master_bind_port) -> None:
+    def __init__(self, environment, master_bind_host, master_bind_port, master_ipc_path=None) -> None:
         """
         :param environment: Environment instance
         :param master_bind_host: Host/interface to use for incoming worker connections
         :param master_bind_port: Port to use for incoming worker connections
+        :param master_ipc_path: Path of a Unix domain socket to also accept connections from local workers on
         """
         super().__init__(environment)
         self.worker_cpu_warning_emitted = False
         self.master_bind_host = master_bind_host
         self.master_bind_port = master_bind_port
+        self.master_ipc_path = master_ipc_path
         self.spawn_rate: float = 0.0
         self.spawning_completed = False
         self.worker_indexes: dict[str, int] = {}
@@ -673,7 +768,7 @@ class MasterRunner(DistributedRunner):
 
         self.clients = WorkerNodes()
         try:
-            self.server = rpc.Server(master_bind_host, master_bind_port)
+            self.server = rpc.Server(master_bind_host, master_bind_port, ipc_path=master_ipc_path)
         except RPCError as e:
             if e.args[0] == "Socket bind failure: Address already in use":
                 port_string = (
@@ -687,6 +782,14 @@ class MasterRunner(DistributedRunner):
                 raise
 
         self._users_dispatcher: UsersDispatcher | None = None
+        self.worker_options: dict[str, Any] | None = None
+        """ The host, stop_timeout and parsed_options last sent to the workers, see send_worker_options() """
+        self.worker_options_version = 0
+        self._sent_user_classes_count: dict[str, dict[str, int]] = {}
+        """ The users each worker was last told to run, spawn messages only carry the counts that changed """
+        self.report_interval = WORKER_REPORT_INTERVAL
+        """ The interval the workers are asked to send their stats at, see adapt_report_interval() """
+        self._largest_received_batch = 0
 
         self.greenlet.spawn(self.heartbeat_worker).link_exception(locust_exception_handler(self.environment))
         self.greenlet.spawn(self.client_listener).link_exception(locust_exception_handler(self.environment))
@@ -711,6 +814,16 @@ class MasterRunner(DistributedRunner):
             bool, self.environment.parsed_options.enable_rebalancing
         )
 
+    def worker_ramp_enabled(self) -> bool:
+        return self.environment.parsed_options is not None and cast(
+            bool, getattr(self.environment.parsed_options, "worker_ramp", False)
+        )
+
+    def rpc_compression_enabled(self) -> bool:
+        return self.environment.parsed_options is not None and cast(
+            bool, getattr(self.environment.parsed_options, "rpc_compression", False)
+        )
+
     def get_worker_index(self, client_id):
         """
         Get the worker index for the specified client ID;
@@ -726,7 +839,7 @@ class MasterRunner(DistributedRunner):
 
     @property
     def user_count(self) -> int:
-        return sum([c.user_count for c in self.clients.values()])
+        return self.clients.user_count
 
     def cpu_log_warning(self) -> bool:
         warning_emitted = Runner.cpu_log_warning(self)
@@ -735,6 +848,68 @@ class MasterRunner(DistributedRunner):
             warning_emitted = True
         return warning_emitted
 
+    def send_worker_options(self) -> None:
+        """
+        Send the host, stop_timeout and parsed_options to all workers, with a new version number, if they have
+        changed since they were last sent. Workers get the current options when they connect (in the "ack"
+        message), so the spawn messages don't need to repeat them.
+        """
+        options = {
+            "host": self.environment.host,
+            "stop_timeout": self.environment.stop_timeout,
+            "parsed_options": dict(vars(self.environment.parsed_options)) if self.environment.parsed_options else {},
+        }
+        if options == self.worker_options:
+            return
+        self.worker_options = options
+        self.worker_options_version += 1
+        for client in self.clients.all:
+            # workers of older versions get the options in every spawn message instead
+            if client.negotiated:
+                self.send_message("options", {**options, "version": self.worker_options_version}, client.id)
+
+    def _spawn_message_data(self, worker_id: str, user_classes_count: dict[str, int]) -> dict[str, Any]:
+        """Data for a spawn message with the user counts that changed since the last one sent to the worker"""
+        if worker_id in self.clients and not self.clients[worker_id].negotiated:
+            # workers of older versions (or that haven't accepted the encoding yet) need all of it every time
+            assert self.worker_options is not None
+            self._sent_user_classes_count[worker_id] = dict(user_classes_count)
+            return {"timestamp": time.time(), "user_classes_count": dict(user_classes_count), **self.worker_options}
+        sent_user_classes_count = self._sent_user_classes_count.setdefault(worker_id, {})
+        changed_user_classes_count = {
+            user_class_name: user_class_count
+            for user_class_name, user_class_count in user_classes_count.items()
+            if sent_user_classes_count.get(user_class_name, 0) != user_class_count
+        }
+        sent_user_classes_count.update(changed_user_classes_count)
+        return {
+            "timestamp": time.time(),
+            "user_classes_count": changed_user_classes_count,
+            "options_version": self.worker_options_version,
+        }
+
+    def send_worker_ramp(self, users_on_workers: dict[str, dict[str, int]], spawn_rate: float) -> float:
+        """
+        Send each worker its final users in a single spawn message, along with its share of the spawn rate,
+        and let the workers ramp up (or down) by themselves (see WorkerRunner.ramp_worker). The spawn rate
+        is split in proportion to the number of users each worker starts or stops, so they finish together.
+
+        :returns: The number of seconds it will take the workers to get there
+        """
+        user_changes = {
+            worker_id: sum(
+                abs(count - self._sent_user_classes_count.get(worker_id, {}).get(user_class_name, 0))
+                for user_class_name, count in user_classes_count.items()
+            )
+            for worker_id, user_classes_count in users_on_workers.items()
+        }
+        total_user_changes = sum(user_changes.values())
+        for worker_id, user_classes_count in users_on_workers.items():
+            data = self._spawn_message_data(worker_id, user_classes_count)
+            data["spawn_rate"] = spawn_rate * user_changes[worker_id] / total_user_changes if total_user_changes else 0
+            self.server.send_to_client(Message("spawn", data, worker_id))
+        return total_user_changes / spawn_rate if spawn_rate > 0 else 0.0
+
     def start(
         self, user_count: int, spawn_rate: float, wait=False, user_classes: list[type[User]] | None = None
     ) -> None:
@@ -742,7 +917,7 @@ class MasterRunner(DistributedRunner):
 
         self.target_user_count = user_count
 
-        num_workers = len(self.clients.ready) + len(self.clients.running) + len(self.clients.spawning)
+        num_workers = self.worker_count
         if not num_workers:
             logger.warning("You can't start a distributed test before at least one worker processes has connected")
             return
@@ -778,42 +953,50 @@ class MasterRunner(DistributedRunner):
                 self.environment.shape_class.reset_time()
 
         self.update_state(STATE_SPAWNING)
+        self.send_worker_options()
 
+        worker_ramp = self.worker_ramp_enabled()
+        if worker_ramp:
+            # the workers ramp by themselves, so the dispatcher only needs to work out where they end up
+            dispatch_rate = float(max(user_count, self._users_dispatcher.get_current_user_count(), 1))
+        else:
+            dispatch_rate = spawn_rate
         self._users_dispatcher.new_dispatch(
-            target_user_count=user_count, spawn_rate=spawn_rate, user_classes=user_classes
+            target_user_count=user_count, spawn_rate=dispatch_rate, user_classes=user_classes
         )
 
+        ramp_time = 0.0
         try:
-            for dispatched_users in self._users_dispatcher:
-                dispatch_greenlets = Group()
-                for worker_node_id, worker_user_classes_count in dispatched_users.items():
-                    data = {
-                        "timestamp": time.time(),
-                        "user_classes_count": worker_user_classes_count,
-                        "host": self.environment.host,
-                        "stop_timeout": self.environment.stop_timeout,
-                        "parsed_options": vars(self.environment.parsed_options)
-                        if self.environment.parsed_options
-                        else {},
-                    }
-                    dispatch_greenlets.add(
-                        gevent.spawn_later(
-                            0,
-                            self.server.send_to_client,
-                            Message("spawn", data, worker_node_id),
-                        )
-                    )
-                dispatched_user_count = sum(map(sum, map(methodcaller("values"), dispatched_users.values())))
+            if worker_ramp:
+                for dispatched_users in self._users_dispatcher:
+                    pass
+                ramp_time = self.send_worker_ramp(dispatched_users, spawn_rate)
                 logger.debug(
-                    "Sending spawn messages for %g total users to %i worker(s)",
-                    dispatched_user_count,
-                    len(dispatch_greenlets),
+                    "Sent the final users to %i worker(s), ramping for %.2fs", len(dispatched_users), ramp_time
                 )
-                dispatch_greenlets.join()
+            else:
+                for dispatched_users in self._users_dispatcher:
+                    dispatch_greenlets = Group()
+                    for worker_node_id, worker_user_classes_count in dispatched_users.items():
+                        data = self._spawn_message_data(worker_node_id, worker_user_classes_count)
+                        dispatch_greenlets.add(
+                            gevent.spawn_later(
+                                0,
+                                self.server.send_to_client,
+                                Message("spawn", data, worker_node_id),
+                            )
+                        )
+                    dispatched_user_count = sum(map(sum, map(methodcaller("values"), dispatched_users.values())))
+                    logger.debug(
+                        "Sending spawn messages for %g total users to %i worker(s)",
+                        dispatched_user_count,
+                        len(dispatch_greenlets),
+                    )
+                    dispatch_greenlets.join()
 
-                logger.debug(
-                    f"Currently spawned users: {_format_user_classes_count_for_log(self.reported_user_classes_count)}"
-                )
+                    logger.debug(
+                        f"Currently spawned users: {_format_user_classes_count_for_log(self.reported_user_classes_count)}"
+                    )
 
             self.target_user_classes_count = _aggregate_dispatched_users(dispatched_users)
 
@@ -823,10 +1006,10 @@ class MasterRunner(DistributedRunner):
             # a gevent.sleep inside the dispatch_users function, locust won't gracefully shutdown.
             self.quit()
 
-        # Wait a little for workers to report their users to the master
-        # so that we can give an accurate log message below and fire the `spawning_complete` event
+        # Wait a little (after the ramp, if the workers ramp by themselves) for workers to report their users to the
+        # master so that we can give an accurate log message below and fire the `spawning_complete` event
         # when the user count is really at the desired value.
-        timeout = gevent.Timeout(self._wait_for_workers_report_after_ramp_up())
+        timeout = gevent.Timeout(ramp_time + self._wait_for_workers_report_after_ramp_up())
         timeout.start()
         msg_prefix = "All users spawned"
         try:
@@ -847,19 +1030,25 @@ class MasterRunner(DistributedRunner):
 
         logger.info(f"{msg_prefix}: {_format_user_classes_count_for_log(self.reported_user_classes_count)}")
 
-    @functools.lru_cache
     def _wait_for_workers_report_after_ramp_up(self) -> float:
         """
         The amount of time to wait after a ramp-up in order for all the workers to report their state
         to the master. If not supplied by the user, it is 1000ms by default. If the supplied value is a number,
         it is taken as-is. If the supplied value is a pattern like "some_number * WORKER_REPORT_INTERVAL",
-        the value will be "some_number * WORKER_REPORT_INTERVAL". The most sensible value would be something
-        like "1.25 * WORKER_REPORT_INTERVAL". However, some users might find it too high, so it is left
-        to a relatively small value of 1000ms by default.
+        the value will be some_number times the interval that the workers are currently asked to report at
+        (which is WORKER_REPORT_INTERVAL unless the master is busy, see adapt_report_interval). The most sensible
+        value would be something like "1.25 * WORKER_REPORT_INTERVAL". However, some users might find it too high,
+        so it is left to a relatively small value of 1000ms by default.
         """
+        wait, in_report_intervals = self._wait_for_workers_report_after_ramp_up_setting()
+        return wait * self.report_interval if in_report_intervals else wait
+
+    @functools.lru_cache
+    def _wait_for_workers_report_after_ramp_up_setting(self) -> tuple[float, bool]:
+        """LOCUST_WAIT_FOR_WORKERS_REPORT_AFTER_RAMP_UP, as a number of seconds or (if True) of report intervals"""
         locust_wait_for_workers_report_after_ramp_up = os.getenv("LOCUST_WAIT_FOR_WORKERS_REPORT_AFTER_RAMP_UP")
         if locust_wait_for_workers_report_after_ramp_up is None:
-            return 1.0
+            return 1.0, False
 
         match = re.search(
             r"^(?P<coeff>(\d+)|(\d+\.\d+))[ ]*\*[ ]*WORKER_REPORT_INTERVAL$",
@@ -867,9 +1056,9 @@ class MasterRunner(DistributedRunner):
         )
         if match is None:
             assert float(locust_wait_for_workers_report_after_ramp_up) >= 0
-            return float(locust_wait_for_workers_report_after_ramp_up)
+            return float(locust_wait_for_workers_report_after_ramp_up), False
         else:
-            return float(match.group("coeff")) * WORKER_REPORT_INTERVAL
+            return float(match.group("coeff")), True
 
     def stop(self, send_stop_to_client: bool = True) -> None:
         if self.state not in [STATE_INIT, STATE_STOPPED, STATE_STOPPING]:
@@ -890,6 +1079,7 @@ class MasterRunner(DistributedRunner):
             self._users_dispatcher = None
 
             if send_stop_to_client:
+                self._sent_user_classes_count = {}
                 for client in self.clients.all:
                     logger.debug(f"Sending stop message to worker {client.id}")
                     self.server.send_to_client(Message("stop", None, client.id))
@@ -918,17 +1108,35 @@ class MasterRunner(DistributedRunner):
     def check_stopped(self) -> None:
         if (
             self.state == STATE_STOPPING
-            and all(x.state == STATE_INIT for x in self.clients.all)
-            or all(x.state not in (STATE_RUNNING, STATE_SPAWNING, STATE_INIT) for x in self.clients.all)
+            and self.clients.count_by_state(STATE_INIT) == len(self.clients)
+            or self.worker_count == 0
         ):
             self.update_state(STATE_STOPPED)
 
+    def adapt_report_interval(self) -> None:
+        """
+        Stretch the interval that the workers are asked to send their stats at (in the replies to their heartbeats)
+        if the master had a full batch of messages waiting since the last call, which means it can't keep up with
+        receiving them, and shrink it back towards WORKER_REPORT_INTERVAL once the master is mostly idle again.
+        """
+        largest_batch, self._largest_received_batch = self._largest_received_batch, 0
+        if largest_batch >= MASTER_RECEIVE_BATCH_SIZE:
+            report_interval = min(round(self.report_interval * 1.5, 1), MAX_WORKER_REPORT_INTERVAL)
+        elif largest_batch < MASTER_RECEIVE_BATCH_SIZE / 4:
+            report_interval = max(round(self.report_interval * 0.9, 1), WORKER_REPORT_INTERVAL)
+        else:
+            return
+        if report_interval != self.report_interval:
+            logger.debug(f"Asking workers to report every {report_interval}s (was {self.report_interval}s)")
+            self.report_interval = report_interval
+
     def heartbeat_worker(self) -> NoReturn:
         while True:
             gevent.sleep(HEARTBEAT_INTERVAL)
             if self.connection_broken:
                 self.reset_connection()
                 continue
+            self.adapt_report_interval()
 
             missing_clients_to_be_removed = []
             for client in self.clients.all:
@@ -956,6 +1164,7 @@ class MasterRunner(DistributedRunner):
                 for to_remove_client_id in missing_clients_to_be_removed:
                     if self.clients.get(to_remove_client_id) is not None:
                         del self.clients[to_remove_client_id]
+                        self._sent_user_classes_count.pop(to_remove_client_id, None)
                 if self.state == STATE_RUNNING or self.state == STATE_SPAWNING:
                     # _users_dispatcher is set to none so that during redistribution the dead clients are not picked, alternative is to call self.stop() before start
                     self._users_dispatcher = None
@@ -966,13 +1175,22 @@ class MasterRunner(DistributedRunner):
         logger.info("Resetting RPC server and all worker connections.")
         try:
             self.server.close(linger=0)
-            self.server = rpc.Server(self.master_bind_host, self.master_bind_port)
+            self.server = rpc.Server(self.master_bind_host, self.master_bind_port, ipc_path=self.master_ipc_path)
             self.connection_broken = False
         except RPCError as e:
             logger.error(f"Temporary failure when resetting connection: {e}, will retry later.")
 
     def client_listener(self) -> NoReturn:
+        """
+        Receive messages from the workers. Messages that are already waiting (up to MASTER_RECEIVE_BATCH_SIZE)
+        are received before any of them are handled, and then handled together (see handle_messages)
+        """
+        messages: list[tuple[str, Message]] = []
         while True:
+            if messages and (len(messages) >= MASTER_RECEIVE_BATCH_SIZE or not self.server.poll()):
+                self.handle_messages(messages)
+                messages = []
+                gevent.sleep(0)  # don't starve the other greenlets if messages keep coming
             try:
                 client_id, msg = self.server.recv_from_client()
             except RPCReceiveError as e:
@@ -997,7 +1215,7 @@ class MasterRunner(DistributedRunner):
                 gevent.sleep(FALLBACK_INTERVAL)
                 continue
             except RPCError as e:
-                if self.clients.ready or self.clients.spawning or self.clients.running:
+                if self.worker_count:
                     logger.error(f"RPCError: {e}. Will reset RPC server.")
                 else:
                     logger.debug(
@@ -1011,7 +1229,87 @@ class MasterRunner(DistributedRunner):
                     "Got KeyboardInterrupt in client_listener. Other greenlets should catch this and shut down."
                 )
                 continue
+            messages.append((client_id, msg))
+
+    def handle_messages(self, messages: list[tuple[str, Message]]) -> None:
+        """
+        Handle a batch of messages. Heartbeats that are followed by a newer heartbeat from the same worker
+        are skipped, unless they accept the encoding offered in the ack (which a worker only does once), and
+        the state is only checked once, at the end.
+        """
+        self._largest_received_batch = max(self._largest_received_batch, len(messages))
+        last_heartbeats = {msg.node_id: i for i, (_, msg) in enumerate(messages) if msg.type == "heartbeat"}
+        for i, (client_id, msg) in enumerate(messages):
+            if msg.type == "heartbeat" and last_heartbeats[msg.node_id] != i and "protocol" not in msg.data:
+                continue
             self.handle_message(client_id, msg)
+        self.check_stopped()
+
+    def handle_heartbeat(self, node_id: str, data: dict[str, Any], with_stats: bool = False) -> None:
+        """
+        Handle a heartbeat from a worker, sent on its own or along with its stats. Only the ones sent on their own
+        are answered (workers send every other heartbeat on its own, see _MasterClient._send_stats), unless it
+        accepts the encoding offered in the ack.
+        """
+        if node_id in self.clients:
+            c = self.clients[node_id]
+            c.heartbeat = HEARTBEAT_LIVENESS
+            client_state = data["state"]
+            if c.state == STATE_MISSING:
+                logger.info(f"Worker {str(c.id)} self-healed with heartbeat, setting state to {client_state}.")
+                if self._users_dispatcher is not None:
+                    self._users_dispatcher.add_worker(worker_node=c)
+                    if not self._users_dispatcher.dispatch_in_progress and self.state == STATE_RUNNING:
+                        # TODO: Test this situation
+                        self.start(self.target_user_count, self.spawn_rate)
+            c.state = client_state
+            reply: dict[str, Any] = {"report_interval": self.report_interval}
+            if "protocol" in data:
+                # the worker accepts the encoding offered in the ack, and uses it from its next message on
+                self.server.protocol_versions[node_id] = reply["protocol"] = min(data["protocol"], PROTOCOL_VERSION)
+                c.negotiated = True
+                if self.rpc_compression_enabled() and data.get("compression") in COMPRESSORS:
+                    self.server.compressions[node_id] = data["compression"]
+            if data.get("capacity") and float(data["capacity"]) != c.capacity:
+                c.capacity = float(data["capacity"])
+                if (
+                    self._users_dispatcher is not None
+                    and not self._users_dispatcher.dispatch_in_progress
+                    and self.state == STATE_RUNNING
+                ):
+                    self.start(self.target_user_count, self.spawn_rate)
+            c.cpu_usage = data["current_cpu_usage"]
+            if c.cpu_usage > CPU_WARNING_THRESHOLD:
+                c.cpu_overloaded_heartbeats += 1
+            else:
+                c.cpu_overloaded_heartbeats = 0
+            if (
+                c.cpu_overloaded_heartbeats >= CPU_OVERLOADED_HEARTBEATS
+                and self._users_dispatcher is not None
+                and self.state == STATE_RUNNING
+            ):
+                c.cpu_overloaded_heartbeats = 0
+                if self._users_dispatcher.worker_overloaded(c):
+                    logger.info(
+                        f"Worker {node_id} (index {self.get_worker_index(node_id)}) stays above the cpu threshold, moving some of its users to other workers"
+                    )
+                    if not self._users_dispatcher.dispatch_in_progress:
+                        self.start(self.target_user_count, self.spawn_rate)
+            if not c.cpu_warning_emitted and c.cpu_usage > CPU_WARNING_THRESHOLD:
+                self.worker_cpu_warning_emitted = True  # used to fail the test in the end
+                c.cpu_warning_emitted = True  # used to suppress logging for this node
+                logger.warning(
+                    f"Worker {node_id} (index {self.get_worker_index(node_id)}) exceeded cpu threshold (will only log this once per worker)"
+                )
+            if "current_memory_usage" in data:
+                c.memory_usage = data["current_memory_usage"]
+            if not with_stats or "protocol" in reply:
+                self.environment.events.heartbeat_sent.fire(client_id=node_id, timestamp=time.time())
+                # with the protocol in it, the reply tells the worker that the messages from here on use the
+                # accepted encoding
+                self.server.send_to_client(Message("heartbeat", reply, node_id))
+        else:
+            logging.debug(f"Got heartbeat message from unknown worker {node_id}")
 
     def handle_message(self, client_id: str, msg: Message) -> None:
         match msg.type:
@@ -1028,7 +1326,23 @@ class MasterRunner(DistributedRunner):
                         logger.warning(
                             f"A worker ({client_id}) running a different version ({msg.data}) connected, master version is {__version__}"
                         )
-                self.send_message("ack", client_id=client_id, data={"index": self.get_worker_index(client_id)})
+                # the legacy encoding is used until the worker accepts the one offered in the ack, see handle_heartbeat
+                self.server.protocol_versions[client_id] = LEGACY_PROTOCOL_VERSION
+                self.server.compressions[client_id] = None
+                self.send_worker_options()
+                assert self.worker_options is not None
+                data = {
+                    "index": self.get_worker_index(client_id),
+                    "options": {**self.worker_options, "version": self.worker_options_version},
+                    "protocol": PROTOCOL_VERSION,
+                    "report_interval": self.report_interval,
+                }
+                if self.rpc_compression_enabled():
+                    # in order of preference
+                    data["compression"] = list(COMPRESSORS)
+                self.send_message("ack", client_id=client_id, data=data)
+                # the worker starts over with no users
+                self._sent_user_classes_count.pop(client_id, None)
                 self.environment.events.worker_connect.fire(client_id=msg.node_id)
                 client_already_connected = client_id in self.clients
                 self.clients[client_id] = WorkerNode(client_id, heartbeat_liveness=HEARTBEAT_LIVENESS)
@@ -1039,11 +1353,11 @@ class MasterRunner(DistributedRunner):
                         self.start(self.target_user_count, self.spawn_rate)
                 if client_already_connected:
                     logger.debug(
-                        f"{client_id} (index {self.get_worker_index(client_id)}) reported as ready (duplicate message). {len(self.clients.ready + self.clients.running + self.clients.spawning)} workers connected."
+                        f"{client_id} (index {self.get_worker_index(client_id)}) reported as ready (duplicate message). {self.worker_count} workers connected."
                     )
                 else:
                     logger.info(
-                        f"{client_id} (index {self.get_worker_index(client_id)}) reported as ready. {len(self.clients.ready + self.clients.running + self.clients.spawning)} workers connected."
+                        f"{client_id} (index {self.get_worker_index(client_id)}) reported as ready. {self.worker_count} workers connected."
                     )
                 if self.rebalancing_enabled() and self.state == STATE_RUNNING and self.spawning_completed:
                     self.start(self.target_user_count, self.spawn_rate)
@@ -1100,6 +1414,7 @@ class MasterRunner(DistributedRunner):
                     return
                 client = self.clients[msg.node_id]
                 del self.clients[msg.node_id]
+                self._sent_user_classes_count.pop(msg.node_id, None)
                 if self._users_dispatcher is not None:
                     self._users_dispatcher.remove_worker(client)
                     if not self._users_dispatcher.dispatch_in_progress and self.state == STATE_RUNNING:
@@ -1107,32 +1422,20 @@ class MasterRunner(DistributedRunner):
                         self.start(self.target_user_count, self.spawn_rate)
                 logger.info(f"{msg.node_id} (index {self.get_worker_index(client_id)}) reported that it has stopped")
             case "heartbeat":
-                if msg.node_id in self.clients:
-                    c = self.clients[msg.node_id]
-                    c.heartbeat = HEARTBEAT_LIVENESS
-                    client_state = msg.data["state"]
-                    if c.state == STATE_MISSING:
-                        logger.info(f"Worker {str(c.id)} self-healed with heartbeat, setting state to {client_state}.")
-                        if self._users_dispatcher is not None:
-                            self._users_dispatcher.add_worker(worker_node=c)
-                            if not self._users_dispatcher.dispatch_in_progress and self.state == STATE_RUNNING:
-                                # TODO: Test this situation
-                                self.start(self.target_user_count, self.spawn_rate)
-                    c.state = client_state
-                    c.cpu_usage = msg.data["current_cpu_usage"]
-                    if not c.cpu_warning_emitted and c.cpu_usage > 90:
-                        self.worker_cpu_warning_emitted = True  # used to fail the test in the end
-                        c.cpu_warning_emitted = True  # used to suppress logging for this node
-                        logger.warning(
-                            f"Worker {msg.node_id} (index {self.get_worker_index(msg.node_id)}) exceeded cpu threshold (will only log this once per worker)"
-                        )
-                    if "current_memory_usage" in msg.data:
-                        c.memory_usage = msg.data["current_memory_usage"]
-                    self.environment.events.heartbeat_sent.fire(client_id=msg.node_id, timestamp=time.time())
-                    self.server.send_to_client(Message("heartbeat", None, msg.node_id))
-                else:
-                    logging.debug(f"Got heartbeat message from unknown worker {msg.node_id}")
+                self.handle_heartbeat(msg.node_id, msg.data)
+            case "spawn_discarded":
+                # the worker only applies the user counts that changed, so it needs all of them again
+                if msg.node_id in self._sent_user_classes_count:
+                    data = {
+                        "timestamp": max(time.time(), msg.data["timestamp"] + 0.001),
+                        "user_classes_count": dict(self._sent_user_classes_count[msg.node_id]),
+                        "options_version": self.worker_options_version,
+                    }
+                    self.server.send_to_client(Message("spawn", data, msg.node_id))
             case "stats":
+                # workers send their heartbeat with their stats, instead of separately, when they are due together
+                if heartbeat := msg.data.pop("heartbeat", None):
+                    self.handle_heartbeat(msg.node_id, heartbeat, with_stats=True)
                 self.environment.events.worker_report.fire(client_id=msg.node_id, data=msg.data)
             case "spawning":
                 try:
@@ -1150,15 +1453,16 @@ class MasterRunner(DistributedRunner):
                 if msg.node_id in self.clients:
                     client = self.clients[msg.node_id]
                     del self.clients[msg.node_id]
+                    self._sent_user_classes_count.pop(msg.node_id, None)
                     if self._users_dispatcher is not None:
                         self._users_dispatcher.remove_worker(client)
                         if not self._users_dispatcher.dispatch_in_progress and self.state == STATE_RUNNING:
                             # TODO: Test this situation
                             self.start(self.target_user_count, self.spawn_rate)
                     logger.info(
-                        f"Worker {msg.node_id!r} (index {self.get_worker_index(msg.node_id)}) quit. {len(self.clients.ready)} workers ready."
+                        f"Worker {msg.node_id!r} (index {self.get_worker_index(msg.node_id)}) quit. {self.clients.count_by_state(STATE_INIT)} workers ready."
                     )
-                    if self.worker_count - len(self.clients.missing) <= 0:
+                    if self.worker_count - self.clients.count_by_state(STATE_MISSING) <= 0:
                         logger.info("The last worker quit, stopping test.")
                         self.stop()
                         if self.environment.parsed_options and self.environment.parsed_options.headless:
@@ -1182,19 +1486,13 @@ class MasterRunner(DistributedRunner):
                     f"Unknown message type received from worker {msg.node_id} (index {self.get_worker_index(msg.node_id)}): {msg.type}"
                 )
 
-        self.check_stopped()
-
     @property
     def worker_count(self) -> int:
-        return len(self.clients.ready) + len(self.clients.spawning) + len(self.clients.running)
+        return self.clients.count_by_state(STATE_INIT, STATE_SPAWNING, STATE_RUNNING)
 
     @property
     def reported_user_classes_count(self) -> dict[str, int]:
-        reported_user_classes_count: dict[str, int] = defaultdict(int)
-        for client in self.clients.ready + self.clients.spawning + self.clients.running:
-            for name, count in client.user_classes_count.items():
-                reported_user_classes_count[name] += count
-        return reported_user_classes_count
+        return self.clients.user_classes_count_by_state(STATE_INIT, STATE_SPAWNING, STATE_RUNNING)
 
     def send_message(self, msg_type: str, data: dict[str, Any] | None = None, client_id: str | None = None):
         """
@@ -1214,43 +1512,331 @@ class MasterRunner(DistributedRunner):
                 self.server.send_to_client(Message(msg_type, data, client.id))
 
 
-class WorkerRunner(DistributedRunner):
+def _apply_master_options(environment: Environment, options: dict[str, Any]) -> int:
     """
-    Runner used to run distributed load tests across multiple processes and/or machines.
-
-    WorkerRunner connects to a :class:`MasterRunner` from which it'll receive
-    instructions to start and stop user greenlets. The WorkerRunner will periodically
-    take the stats generated by the running users and send back to the :class:`MasterRunner`.
+    Apply the host, stop_timeout and custom arguments sent by the master (see MasterRunner.send_worker_options)
+    to the environment of a worker, and return the version of the options (0 if the master didn't send one)
+    """
+    environment.host = options["host"]
+    environment.stop_timeout = options["stop_timeout"] or 0.0
+
+    # receive custom arguments
+    if environment.parsed_options is None:
+        default_parser = argument_parser.get_empty_argument_parser()
+        argument_parser.setup_parser_arguments(default_parser)
+        environment.parsed_options = default_parser.parse(args=[])
+    custom_args_from_master = {
+        k: v
+        for k, v in options["parsed_options"].items()
+        if k not in argument_parser.default_args_dict()
+        # these settings are sometimes needed on workers
+        or k in ["expect_workers", "tags", "exclude_tags"]
+    }
+    vars(environment.parsed_options).update(custom_args_from_master)
+    return options.get("version", 0)
+
+
+# message types that workers send to their master
+_WORKER_MESSAGE_TYPES = frozenset(
+    [
+        "client_ready",
+        "locustfile",
+        "client_stopped",
+        "heartbeat",
+        "stats",
+        "spawn_discarded",
+        "spawning",
+        "spawning_complete",
+        "logs",
+        "quit",
+        "exception",
+    ]
+)
+
+
+class _MasterClient(Runner):
+    """
+    The part of :class:`WorkerRunner` and :class:`AggregatorRunner` that talks to their master: connecting to it,
+    heartbeats in both directions, sending the stats and the master's messages that aren't about spawning users.
     """
 
     # the worker index is set on ACK, if master provided it (masters <= 2.10.2 do not provide it)
     worker_index = -1
 
-    def __init__(self, environment: Environment, master_host: str, master_port: int) -> None:
-        """
-        :param environment: Environment instance
-        :param master_host: Host/IP to use for connection to the master
-        :param master_port: Port to use for connecting to the master
-        """
-        super().__init__(environment)
+    def _init_master_client(
+        self, client_id: str, master_host: str, master_port: int, master_ipc_path: str | None = None
+    ) -> None:
         self.retry = 0
         self.connected = False
         self.last_heartbeat_timestamp: float | None = None
+        self.last_received_spawn_timestamp = 0
         self.connection_event = Event()
         self.worker_state = STATE_INIT
-        self.client_id = socket.gethostname() + "_" + uuid4().hex
+        self.client_id = client_id
         self.master_host = master_host
         self.master_port = master_port
-        self.web_base_path = environment.parsed_options.web_base_path if environment.parsed_options else ""
-        self.logs: list[str] = []
-        self.worker_cpu_warning_emitted = False
-        self._users_dispatcher: UsersDispatcher | None = None
-        self.client = rpc.Client(master_host, master_port, self.client_id)
-        self.greenlet.spawn(self.worker).link_exception(locust_exception_handler(self.environment))
+        self.master_ipc_path = master_ipc_path
+        self.web_base_path = self.environment.parsed_options.web_base_path if self.environment.parsed_options else ""
+        self.options_version = 0
+        self.master_report_interval = WORKER_REPORT_INTERVAL
+        """ The interval to send stats at, which the master may change in its heartbeats (see MasterRunner) """
+        self.heartbeats_in_stats = False
+        """ Whether the master takes heartbeats that are sent along with the stats, see _send_stats() """
+        self._last_heartbeat_sent = 0.0
+        self._last_heartbeat_with_stats = False
+        self._accepted_encoding: dict[str, Any] | None = None
+        """ The encoding that the next heartbeat tells the master, see handle_master_message() """
+        self.client = rpc.Client(master_host, master_port, self.client_id, ipc_path=master_ipc_path)
+
+    def _start_master_client(self) -> None:
+        """Connect to the master, and start sending it heartbeats and stats"""
+        self.greenlet.spawn(self.master_listener).link_exception(locust_exception_handler(self.environment))
         self.connect_to_master()
         self.greenlet.spawn(self.heartbeat).link_exception(locust_exception_handler(self.environment))
         self.greenlet.spawn(self.heartbeat_timeout_checker).link_exception(locust_exception_handler(self.environment))
         self.greenlet.spawn(self.stats_reporter).link_exception(locust_exception_handler(self.environment))
+
+        # register listener that sends quit message to master
+        def on_quitting(environment: Environment, **kw) -> None:
+            self.client.send(Message("quit", None, self.client_id))
+
+        self.environment.events.quitting.add_listener(on_quitting)
+
+    def connect_to_master(self) -> None:
+        while True:
+            self.retry += 1
+            self._send_client_ready()
+            try:
+                success = self.connection_event.wait(timeout=CONNECT_TIMEOUT)
+            except KeyboardInterrupt:
+                # dont complain about getting CTRL-C
+                sys.exit(1)
+            if success:
+                break
+            message = f"Failed to connect to master {self.master_host}:{self.master_port}{self.web_base_path}, retry {self.retry}/{CONNECT_RETRY_COUNT}."
+            if self.retry < 30 / CONNECT_TIMEOUT:  # lower log level during the first 30 seconds
+                logger.debug(message)
+            else:
+                logger.info(message)
+            if self.retry > CONNECT_RETRY_COUNT:
+                raise ConnectionError()
+        self.connected = True
+
+    def _send_client_ready(self) -> None:
+        # the master starts over with the legacy encoding
+        self.client.protocol_version = self.client.receive_protocol_version = LEGACY_PROTOCOL_VERSION
+        self.client.compression = None
+        self._accepted_encoding = None
+        self.client.send(Message("client_ready", __version__, self.client_id))
+
+    def reset_master_connection(self) -> None:
+        logger.info("Reset connection to master")
+        try:
+            self.client.close()
+            self.client = rpc.Client(self.master_host, self.master_port, self.client_id, ipc_path=self.master_ipc_path)
+        except RPCError as e:
+            logger.error(f"Temporary failure when resetting connection: {e}, will retry later.")
+
+    def master_listener(self) -> NoReturn:
+        while True:
+            try:
+                msg = self.client.recv()
+            except RPCError as e:
+                logger.error(f"RPCError found when receiving from master: {e}")
+            else:
+                self.handle_master_message(msg)
+
+    def handle_master_message(self, msg: Message) -> None:
+        match msg.type:
+            case "ack":
+                # backward-compatible support of masters that do not send a worker index
+                if msg.data is not None and "index" in msg.data:
+                    self.worker_index = msg.data["index"]
+                if msg.data is not None and "protocol" in msg.data:
+                    # the master offers an encoding (and codecs in order of preference), which is accepted in a
+                    # heartbeat, so masters that don't offer one never get anything they don't know
+                    offered = msg.data.get("compression", [])
+                    self._accepted_encoding = {
+                        "protocol": min(msg.data["protocol"], PROTOCOL_VERSION),
+                        "compression": next((name for name in offered if name in COMPRESSORS), None),
+                    }
+                # masters that ask for a report interval also take heartbeats along with the stats
+                self.master_report_interval = (msg.data or {}).get("report_interval", WORKER_REPORT_INTERVAL)
+                self.heartbeats_in_stats = "report_interval" in (msg.data or {})
+                if msg.data is not None and "options" in msg.data:
+                    self.apply_master_options(msg.data["options"])
+                if self._accepted_encoding is not None:
+                    self._send_heartbeat()
+                self.connection_event.set()
+            case "options":
+                self.apply_master_options(msg.data)
+            case "stop":
+                self.stop()
+                self.client.send(Message("client_stopped", None, self.client_id))
+                # +additional_wait is just a small buffer to account for the random network latencies and/or other
+                # random delays inherent to distributed systems.
+                additional_wait = int(os.getenv("LOCUST_WORKER_ADDITIONAL_WAIT_BEFORE_READY_AFTER_STOP", 0))
+                gevent.sleep(self.environment.stop_timeout + additional_wait)
+                self._send_client_ready()
+                self.worker_state = STATE_INIT
+            case "reconnect":
+                logger.warning("Received reconnect message from master. Resetting RPC connection.")
+                self.reset_master_connection()
+            case "heartbeat":
+                self.last_heartbeat_timestamp = time.time()
+                if msg.data is not None and "report_interval" in msg.data:
+                    self.master_report_interval = msg.data["report_interval"]
+                if msg.data is not None and "protocol" in msg.data:
+                    # the master has switched to the accepted encoding, so the messages after this one use it
+                    self.client.receive_protocol_version = msg.data["protocol"]
+                self.environment.events.heartbeat_received.fire(
+                    client_id=msg.node_id, timestamp=self.last_heartbeat_timestamp
+                )
+            case "update_user_class":
+                self.environment.update_user_class(msg.data)
+            case "spawning_complete":
+                # master says we have finished spawning (happens only once during a normal rampup)
+                self.environment.events.spawning_complete.fire(user_count=msg.data["user_count"])
+            case _ if lc := self.custom_messages.get(msg.type):
+                listener, concurrent = lc
+                logger.debug(f"Received {msg.type} message from master")
+                if not concurrent:
+                    listener(environment=self.environment, msg=msg)
+                else:
+                    gevent.spawn(listener, self.environment, msg)
+            case _:
+                self.handle_unknown_master_message(msg)
+
+    def handle_unknown_master_message(self, msg: Message) -> None:
+        logger.warning(f"Unknown message type received: {msg.type}")
+
+    def apply_master_options(self, options: dict[str, Any]) -> None:
+        """Apply the options sent by the master, see _apply_master_options()"""
+        self.options_version = _apply_master_options(self.environment, options)
+
+    def _accept_spawn(self, job: dict[str, Any]) -> bool:
+        """
+        Tell the master that a spawn message was received, and check that it is newer than the last one.
+        Returns False if it is to be discarded.
+        """
+        self.client.send(Message("spawning", None, self.client_id))
+        if job["timestamp"] <= self.last_received_spawn_timestamp:
+            logger.info("Discard spawn message with older or equal timestamp than timestamp of previous spawn message")
+            if "parsed_options" not in job:
+                # masters that only send the user counts that changed need to resend all of them
+                self.client.send(
+                    Message("spawn_discarded", {"timestamp": self.last_received_spawn_timestamp}, self.client_id)
+                )
+            return False
+        self.last_received_spawn_timestamp = job["timestamp"]
+        if "parsed_options" in job:
+            # masters that send the options with every spawn message
+            self.apply_master_options(job)
+        elif job.get("options_version", self.options_version) != self.options_version:
+            logger.warning(
+                f"Got a spawn message for options version {job['options_version']}, but have version {self.options_version}"
+            )
+        return True
+
+    def _heartbeat_data(self) -> dict[str, Any]:
+        return {
+            "state": self.worker_state,
+            "current_cpu_usage": self.current_cpu_usage,
+            "current_memory_usage": self.current_memory_usage,
+        }
+
+    def _send_heartbeat(self, msg_type: str = "heartbeat", data: dict[str, Any] | None = None) -> None:
+        """Send a heartbeat, on its own or along with the stats in data"""
+        heartbeat = self._heartbeat_data()
+        # in every heartbeat, so that masters get it whether or not they offer an encoding
+        if capacity := getattr(self.environment.parsed_options, "worker_capacity", None):
+            heartbeat["capacity"] = capacity
+        accepted_encoding = self._accepted_encoding
+        if accepted_encoding is not None:
+            heartbeat.update(accepted_encoding)
+        if data is None:
+            data = heartbeat
+        else:
+            data["heartbeat"] = heartbeat
+        self.client.send(Message(msg_type, data, self.client_id))
+        self._last_heartbeat_sent = time.monotonic()
+        self._last_heartbeat_with_stats = msg_type == "stats"
+        if accepted_encoding is not None:
+            # the message that accepts the encoding still uses the legacy one, the following ones don't
+            self.client.protocol_version = accepted_encoding["protocol"]
+            self.client.compression = accepted_encoding["compression"]
+            self._accepted_encoding = None
+
+    def heartbeat(self) -> NoReturn:
+        while True:
+            # the last heartbeat may have been sent along with the stats (see _send_stats)
+            wait = self._last_heartbeat_sent + HEARTBEAT_INTERVAL - time.monotonic()
+            if wait > 0:
+                gevent.sleep(wait)
+                continue
+            try:
+                self._send_heartbeat()
+            except RPCError as e:
+                logger.error(f"RPCError found when sending heartbeat: {e}")
+                self.reset_master_connection()
+                self._last_heartbeat_sent = time.monotonic()
+
+    def heartbeat_timeout_checker(self) -> NoReturn:
+        while True:
+            gevent.sleep(1)
+            if self.last_heartbeat_timestamp and self.last_heartbeat_timestamp < time.time() - MASTER_HEARTBEAT_TIMEOUT:
+                logger.error(f"Didn't get heartbeat from master in over {MASTER_HEARTBEAT_TIMEOUT}s")
+                self.quit()
+
+    def stats_reporter(self) -> NoReturn:
+        while True:
+            try:
+                self._send_stats()
+            except RPCError as e:
+                logger.error(f"Temporary connection lost to master server: {e}, will retry later.")
+            gevent.sleep(self.master_report_interval)
+
+    def _send_stats(self) -> None:
+        data: dict[str, Any] = {}
+        self.environment.events.report_to_master.fire(client_id=self.client_id, data=data)
+        # the heartbeat goes along if it is due before long, instead of in a message of its own. The master doesn't
+        # answer those, so the one before must have been sent on its own (and answered), or the master would seem gone
+        if (
+            self.heartbeats_in_stats
+            and not self._last_heartbeat_with_stats
+            and time.monotonic() - self._last_heartbeat_sent >= HEARTBEAT_INTERVAL / 2
+        ):
+            self._send_heartbeat("stats", data)
+        else:
+            self.client.send(Message("stats", data, self.client_id))
+
+
+class WorkerRunner(_MasterClient, DistributedRunner):
+    """
+    Runner used to run distributed load tests across multiple processes and/or machines.
+
+    WorkerRunner connects to a :class:`MasterRunner` from which it'll receive
+    instructions to start and stop user greenlets. The WorkerRunner will periodically
+    take the stats generated by the running users and send back to the :class:`MasterRunner`.
+    """
+
+    def __init__(
+        self, environment: Environment, master_host: str, master_port: int, master_ipc_path: str | None = None
+    ) -> None:
+        """
+        :param environment: Environment instance
+        :param master_host: Host/IP to use for connection to the master
+        :param master_port: Port to use for connecting to the master
+        :param master_ipc_path: Path of the Unix domain socket of a master on the same machine to connect to instead
+        """
+        super().__init__(environment)
+        self._init_master_client(socket.gethostname() + "_" + uuid4().hex, master_host, master_port, master_ipc_path)
+        self.logs: list[str] = []
+        self.worker_cpu_warning_emitted = False
+        self._users_dispatcher: UsersDispatcher | None = None
+        self.assigned_user_classes_count: dict[str, int] = {}
+        """ The users the master has told this worker to run, updated with the changed counts of each spawn message """
+        self._start_master_client()
         self.greenlet.spawn(self.logs_reporter).link_exception(locust_exception_handler(self.environment))
 
         # register listener that adds the current number of spawned users to the report that is sent to the master node
@@ -1260,12 +1846,6 @@ class WorkerRunner(DistributedRunner):
 
         self.environment.events.report_to_master.add_listener(on_report_to_master)
 
-        # register listener that sends quit message to master
-        def on_quitting(environment: Environment, **kw) -> None:
-            self.client.send(Message("quit", None, self.client_id))
-
-        self.environment.events.quitting.add_listener(on_quitting)
-
         # register listener that's sends user exceptions to master
         def on_user_error(user_instance: User, exception: Exception, tb: TracebackType) -> None:
             formatted_tb = "".join(traceback.format_tb(tb))
@@ -1319,81 +1899,65 @@ class WorkerRunner(DistributedRunner):
         self.update_state(STATE_RUNNING)
         self.worker_state = STATE_RUNNING
 
-    def heartbeat(self) -> NoReturn:
-        while True:
-            try:
-                self.client.send(
-                    Message(
-                        "heartbeat",
-                        {
-                            "state": self.worker_state,
-                            "current_cpu_usage": self.current_cpu_usage,
-                            "current_memory_usage": self.current_memory_usage,
-                        },
-                        self.client_id,
-                    )
-                )
-            except RPCError as e:
-                logger.error(f"RPCError found when sending heartbeat: {e}")
-                self.reset_connection()
-            gevent.sleep(HEARTBEAT_INTERVAL)
+    def ramp_worker(self, user_classes_count: dict[str, int], spawn_rate: float) -> None:
+        """
+        Start or stop users at spawn_rate until user_classes_count is running, for masters that leave
+        the ramping to the workers (--worker-ramp). The users of different classes are interleaved, and the
+        schedule is kept from the start of the ramp, so it catches up if e.g. stop_users was slow.
 
-    def heartbeat_timeout_checker(self) -> NoReturn:
-        while True:
-            gevent.sleep(1)
-            if self.last_heartbeat_timestamp and self.last_heartbeat_timestamp < time.time() - MASTER_HEARTBEAT_TIMEOUT:
-                logger.error(f"Didn't get heartbeat from master in over {MASTER_HEARTBEAT_TIMEOUT}s")
-                self.quit()
+        :param user_classes_count: Users to run at the end of the ramp
+        :param spawn_rate: Users to start or stop per second
+        """
+        self.target_user_classes_count = user_classes_count
+        self.target_user_count = sum(user_classes_count.values())
 
-    def reset_connection(self) -> None:
-        logger.info("Reset connection to master")
-        try:
-            self.client.close()
-            self.client = rpc.Client(self.master_host, self.master_port, self.client_id)
-        except RPCError as e:
-            logger.error(f"Temporary failure when resetting connection: {e}, will retry later.")
+        for user_class in self.user_classes:
+            if self.environment.host:
+                user_class.host = self.environment.host
 
-    def worker(self) -> NoReturn:
-        self.last_received_spawn_timestamp = 0
-        while True:
-            try:
-                msg = self.client.recv()
-            except RPCError as e:
-                logger.error(f"RPCError found when receiving from master: {e}")
+        current_user_classes_count = self.user_classes_count
+        steps = _ramp_steps(
+            {
+                user_class_name: user_class_count - current_user_classes_count[user_class_name]
+                for user_class_name, user_class_count in user_classes_count.items()
+            }
+        )
+        ramp_start = time.monotonic()
+        done = 0
+        while done < len(steps):
+            if spawn_rate > 0:
+                due = min(len(steps), int((time.monotonic() - ramp_start) * spawn_rate) + 1)
             else:
-                self.handle_message(msg)
+                due = len(steps)
+            user_classes_spawn_count: dict[str, int] = defaultdict(int)
+            user_classes_stop_count: dict[str, int] = defaultdict(int)
+            for user_class_name, change in steps[done:due]:
+                if change > 0:
+                    user_classes_spawn_count[user_class_name] += 1
+                else:
+                    user_classes_stop_count[user_class_name] += 1
+            self.spawn_users(user_classes_spawn_count)
+            self.stop_users(user_classes_stop_count)
+            done = due
+            if done < len(steps):
+                gevent.sleep(max(0.0, ramp_start + done / spawn_rate - time.monotonic()))
 
-    def handle_message(self, msg: Message) -> None:
+        self.spawning_complete(sum(self.user_classes_count.values()))
+        self.update_state(STATE_RUNNING)
+        self.worker_state = STATE_RUNNING
+
+    def handle_master_message(self, msg: Message) -> None:
         match msg.type:
             case "ack":
-                # backward-compatible support of masters that do not send a worker index
-                if msg.data is not None and "index" in msg.data:
-                    self.worker_index = msg.data["index"]
-                self.connection_event.set()
+                self.assigned_user_classes_count = {}
+                super().handle_master_message(msg)
             case "spawn":
-                self.client.send(Message("spawning", None, self.client_id))
                 job = msg.data
-                if job["timestamp"] <= self.last_received_spawn_timestamp:
-                    logger.info(
-                        "Discard spawn message with older or equal timestamp than timestamp of previous spawn message"
-                    )
+                if not self._accept_spawn(job):
                     return
-                self.environment.host = job["host"]
-                self.environment.stop_timeout = job["stop_timeout"] or 0.0
-
-                # receive custom arguments
-                if self.environment.parsed_options is None:
-                    default_parser = argument_parser.get_empty_argument_parser()
-                    argument_parser.setup_parser_arguments(default_parser)
-                    self.environment.parsed_options = default_parser.parse(args=[])
-                custom_args_from_master = {
-                    k: v
-                    for k, v in job["parsed_options"].items()
-                    if k not in argument_parser.default_args_dict()
-                    # these settings are sometimes needed on workers
-                    or k in ["expect_workers", "tags", "exclude_tags"]
-                }
-                vars(self.environment.parsed_options).update(custom_args_from_master)
+                self.assigned_user_classes_count.update(job["user_classes_count"])
+                # classes the master hasn't mentioned have no users
+                user_classes_count = {**dict.fromkeys(self.user_classes_count, 0), **self.assigned_user_classes_count}
 
                 if self.worker_state != STATE_RUNNING and self.worker_state != STATE_SPAWNING:
                     self.stats.clear_all()
@@ -1408,53 +1972,24 @@ class WorkerRunner(DistributedRunner):
                 if self.spawning_greenlet:
                     # kill existing spawning greenlet before we launch new one
                     self.spawning_greenlet.kill(block=True)
-                self.spawning_greenlet = self.greenlet.spawn(lambda: self.start_worker(job["user_classes_count"]))
+                if "spawn_rate" in job:
+                    # the master leaves the ramp to us
+                    self.spawning_greenlet = self.greenlet.spawn(
+                        lambda: self.ramp_worker(user_classes_count, job["spawn_rate"])
+                    )
+                else:
+                    self.spawning_greenlet = self.greenlet.spawn(lambda: self.start_worker(user_classes_count))
                 self.spawning_greenlet.link_exception(locust_exception_handler(self.environment))
-                self.last_received_spawn_timestamp = job["timestamp"]
             case "stop":
-                self.stop()
-                self.client.send(Message("client_stopped", None, self.client_id))
-                # +additional_wait is just a small buffer to account for the random network latencies and/or other
-                # random delays inherent to distributed systems.
-                additional_wait = int(os.getenv("LOCUST_WORKER_ADDITIONAL_WAIT_BEFORE_READY_AFTER_STOP", 0))
-                gevent.sleep(self.environment.stop_timeout + additional_wait)
-                self.client.send(Message("client_ready", __version__, self.client_id))
-                self.worker_state = STATE_INIT
+                self.assigned_user_classes_count = {}
+                super().handle_master_message(msg)
             case "quit":
                 logger.info("Got quit message from master, shutting down...")
                 self.stop()
                 self._send_stats()  # send a final report, in case there were any samples not yet reported
                 self.greenlet.kill(block=True)
-            case "reconnect":
-                logger.warning("Received reconnect message from master. Resetting RPC connection.")
-                self.reset_connection()
-            case "heartbeat":
-                self.last_heartbeat_timestamp = time.time()
-                self.environment.events.heartbeat_received.fire(
-                    client_id=msg.node_id, timestamp=self.last_heartbeat_timestamp
-                )
-            case "update_user_class":
-                self.environment.update_user_class(msg.data)
-            case "spawning_complete":
-                # master says we have finished spawning (happens only once during a normal rampup)
-                self.environment.events.spawning_complete.fire(user_count=msg.data["user_count"])
-            case _ if lc := self.custom_messages.get(msg.type):
-                listener, concurrent = lc
-                logger.debug(f"Received {msg.type} message from master")
-                if not concurrent:
-                    listener(environment=self.environment, msg=msg)
-                else:
-                    gevent.spawn(listener, self.environment, msg)
             case _:
-                logger.warning(f"Unknown message type received: {msg.type}")
-
-    def stats_reporter(self) -> NoReturn:
-        while True:
-            try:
-                self._send_stats()
-            except RPCError as e:
-                logger.error(f"Temporary connection lost to master server: {e}, will retry later.")
-            gevent.sleep(WORKER_REPORT_INTERVAL)
+                super().handle_master_message(msg)
 
     def logs_reporter(self) -> None:
         if WORKER_LOG_REPORT_INTERVAL < 0:
@@ -1486,35 +2021,155 @@ class WorkerRunner(DistributedRunner):
         logger.debug(f"Sending {msg_type} message to master")
         self.client.send(Message(msg_type, data, self.client_id))
 
-    def _send_stats(self) -> None:
-        data: dict[str, Any] = {}
-        self.environment.events.report_to_master.fire(client_id=self.client_id, data=data)
-        self.client.send(Message("stats", data, self.client_id))
-
     def _send_logs(self, current_logs) -> None:
         self.send_message("logs", {"worker_id": self.client_id, "logs": current_logs})
 
-    def connect_to_master(self):
-        self.retry += 1
-        self.client.send(Message("client_ready", __version__, self.client_id))
+
+class AggregatorRunner(_MasterClient, MasterRunner):
+    """
+    Runner for an intermediate node between a :class:`MasterRunner` and a group of
+    :class:`WorkerRunners <WorkerRunner>`, so that the master doesn't have to handle every worker itself.
+
+    To the master, an AggregatorRunner looks like a single worker. It splits the users that the master
+    assigns to it between its own workers, merges their stats into a single report and answers their
+    heartbeats itself. To its workers, it looks like a master.
+    """
+
+    def __init__(self, environment, master_host, master_port, master_bind_host, master_bind_port) -> None:
+        """
+        :param environment: Environment instance
+        :param master_host: Host/IP to use for connection to the master
+        :param master_port: Port to use for connecting to the master
+        :param master_bind_host: Host/interface to use for incoming worker connections
+        :param master_bind_port: Port to use for incoming worker connections
+        """
+        self.spawn_job: dict[str, Any] | None = None
+        """ The last spawn job from the master (with all user counts), split up by relay_spawn() """
+        self.pending_spawns: set[str] = set()
+        super().__init__(environment, master_bind_host, master_bind_port)
+        self._init_master_client(socket.gethostname() + "_aggregator_" + uuid4().hex, master_host, master_port)
+        self._start_master_client()
+
+        # register listener that adds the number of users running on the workers to the report for the master
+        def on_report_to_master(client_id: str, data: dict[str, Any]) -> None:
+            data["user_classes_count"] = dict(self.reported_user_classes_count)
+            data["user_count"] = self.user_count
+
+        self.environment.events.report_to_master.add_listener(on_report_to_master)
+
+    def start(
+        self, user_count: int, spawn_rate: float, wait=False, user_classes: list[type[User]] | None = None
+    ) -> None:
+        """
+        The users are assigned by the master, so this only redistributes them between the workers
+        (e.g. when a worker has gone missing)
+        """
+        self.relay_spawn()
+
+    def relay_spawn(self) -> None:
+        """Split the users of the last spawn message from the master between the connected workers"""
+        if self.spawn_job is None:
+            return
+        worker_ids = sorted(client.id for client in self.clients.ready + self.clients.spawning + self.clients.running)
+        if not worker_ids:
+            logger.warning("Got users to spawn from the master, but no workers have connected yet")
+            return
+        self.pending_spawns = set(worker_ids)
+        split = _split_user_classes_count(self.spawn_job["user_classes_count"], worker_ids)
+        if "spawn_rate" in self.spawn_job:
+            # the master leaves the ramp to us, which we leave to the workers
+            self.send_worker_ramp(split, self.spawn_job["spawn_rate"])
+            return
+        for worker_id, user_classes_count in split.items():
+            data = self._spawn_message_data(worker_id, user_classes_count)
+            self.server.send_to_client(Message("spawn", data, worker_id))
+
+    def stop(self, send_stop_to_client: bool = True) -> None:
+        self.spawn_job = None
+        self.pending_spawns = set()
+        super().stop(send_stop_to_client)
+
+    def quit(self) -> None:
+        self.stop(send_stop_to_client=False)
+        logger.debug("Quitting...")
+        for client in self.clients.all:
+            self.server.send_to_client(Message("quit", None, client.id))
+        gevent.sleep(0.5)  # wait for final stats report from all workers
         try:
-            success = self.connection_event.wait(timeout=CONNECT_TIMEOUT)
-        except KeyboardInterrupt:
-            # dont complain about getting CTRL-C
-            sys.exit(1)
-        if not success:
-            if self.retry < 30 / CONNECT_TIMEOUT:  # lower log level during the first 30 seconds
-                logger.debug(
-                    f"Failed to connect to master {self.master_host}:{self.master_port}{self.web_base_path}, retry {self.retry}/{CONNECT_RETRY_COUNT}."
-                )
-            else:
-                logger.info(
-                    f"Failed to connect to master {self.master_host}:{self.master_port}{self.web_base_path}, retry {self.retry}/{CONNECT_RETRY_COUNT}."
+            self._send_stats()  # pass them on to the master
+        except RPCError as e:
+            logger.error(f"Failed to send final stats to master: {e}")
+        self.greenlet.kill(block=True)
+
+    def handle_message(self, client_id: str, msg: Message) -> None:
+        if msg.type in ("exception", "logs") or (
+            msg.type not in _WORKER_MESSAGE_TYPES and msg.type not in self.custom_messages
+        ):
+            # pass on to the master (with the node_id of the worker)
+            self.client.send(msg)
+            if msg.type not in _WORKER_MESSAGE_TYPES:
+                return
+        super().handle_message(client_id, msg)
+        match msg.type:
+            case "spawning_complete":
+                self.pending_spawns.discard(msg.node_id)
+                if self.worker_state == STATE_SPAWNING and not self.pending_spawns:
+                    self.worker_state = STATE_RUNNING
+                    self.update_state(STATE_RUNNING)
+                    data = {"user_classes_count": dict(self.reported_user_classes_count), "user_count": self.user_count}
+                    self.client.send(Message("spawning_complete", data, self.client_id))
+            case "client_ready" | "client_stopped" | "quit":
+                # a worker joined or left, so the users need to be redistributed
+                self.relay_spawn()
+
+    def handle_master_message(self, msg: Message) -> None:
+        match msg.type:
+            case "ack":
+                self.spawn_job = None
+                super().handle_master_message(msg)
+            case "spawn":
+                job = msg.data
+                if not self._accept_spawn(job):
+                    return
+                # the master only sends the user counts that changed
+                user_classes_count = (
+                    self.spawn_job["user_classes_count"]
+                    if self.spawn_job is not None
+                    else dict.fromkeys(self.user_classes_count, 0)
                 )
-            if self.retry > CONNECT_RETRY_COUNT:
-                raise ConnectionError()
-            self.connect_to_master()
-        self.connected = True
+                job = {**job, "user_classes_count": {**user_classes_count, **job["user_classes_count"]}}
+                if self.worker_state != STATE_RUNNING and self.worker_state != STATE_SPAWNING:
+                    self.stats.clear_all()
+                    self.exceptions = {}
+                    self.environment.events.test_start.fire(environment=self.environment)
+                self.worker_state = STATE_SPAWNING
+                self.update_state(STATE_SPAWNING)
+                self.spawn_job = job
+                self.relay_spawn()
+            case "quit":
+                logger.info("Got quit message from master, shutting down...")
+                self.quit()
+            case "update_user_class" | "spawning_complete":
+                super().handle_master_message(msg)
+                self.send_message(msg.type, msg.data)
+            case _:
+                super().handle_master_message(msg)
+
+    def handle_unknown_master_message(self, msg: Message) -> None:
+        # pass on to the workers
+        self.send_message(msg.type, msg.data)
+
+    def apply_master_options(self, options: dict[str, Any]) -> None:
+        super().apply_master_options(options)
+        self.send_worker_options()
+
+    def _heartbeat_data(self) -> dict[str, Any]:
+        """A single heartbeat for all the workers (whose heartbeats are answered by the aggregator)"""
+        return {
+            "state": self.worker_state,
+            "current_cpu_usage": max([self.current_cpu_usage, *(client.cpu_usage for client in self.clients.all)]),
+            "current_memory_usage": self.current_memory_usage,
+        }
 
 
 def _format_user_classes_count_for_log(user_classes_count: dict[str, int]) -> str:
@@ -1528,3 +2183,32 @@ def _aggregate_dispatched_users(d: dict[str, dict[str, int]]) -> dict[str, int]:
     # TODO: Test it
     user_classes = list(next(iter(d.values())).keys())
     return {u: sum(d[u] for d in d.values()) for u in user_classes}
+
+
+def _ramp_steps(user_classes_change: dict[str, int]) -> list[tuple[str, int]]:
+    """
+    Order the users to start (a positive change) or stop (a negative change) of each class during a ramp,
+    with the classes spread out evenly. E.g. {"A": 2, "B": -1} gives [("A", 1), ("B", -1), ("A", 1)].
+    """
+    steps = sorted(
+        ((i + 0.5) / abs(change), user_class_name, 1 if change > 0 else -1)
+        for user_class_name, change in user_classes_change.items()
+        for i in range(abs(change))
+    )
+    return [(user_class_name, change) for _, user_class_name, change in steps]
+
+
+def _split_user_classes_count(user_classes_count: dict[str, int], worker_ids: list[str]) -> dict[str, dict[str, int]]:
+    """
+    Split the users of each class as evenly as possible between the workers. The remainders of the classes
+    are handed out starting where the previous one stopped, so that the total user counts stay balanced too.
+    """
+    split: dict[str, dict[str, int]] = {worker_id: {} for worker_id in worker_ids}
+    offset = 0
+    for user_class_name, count in user_classes_count.items():
+        users_per_worker, remainder = divmod(count, len(worker_ids))
+        for i, worker_id in enumerate(worker_ids):
+            extra = 1 if (i - offset) % len(worker_ids) < remainder else 0
+            split[worker_id][user_class_name] = users_per_worker + extra
+        offset = (offset + remainder) % len(worker_ids)
+    return split
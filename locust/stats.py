@@ -1,27 +1,39 @@
 from __future__ import annotations
 
 import csv
+import functools
 import hashlib
 import json
 import logging
 import os
+import re
 import signal
 import sys
 import time
 from abc import abstractmethod
-from collections import OrderedDict, defaultdict, namedtuple
-from copy import copy
 from itertools import chain
 from typing import TYPE_CHECKING, Protocol, TypedDict, TypeVar, cast
 
 import gevent
 
+from . import stats_report, stats_shm
 from .exception import CatchResponseError
+from .histogram import (
+    DictHistogram,
+    HighResolutionHistogram,
+    LogLinearHistogram,
+    ResponseTimeHistogram,
+    SketchHistogram,
+    WindowedHistogram,
+    unserialize_histogram,
+)
 from .util.date import format_utc_timestamp
+from .util.ringbuffer import PerSecondRingBuffer
 from .util.rounding import proper_round
+from .util.url import template_path
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Iterable
+    from collections.abc import Callable, Iterable, Mapping, Sequence
     from types import FrameType
     from typing import Any
 
@@ -57,11 +69,11 @@ class StatsEntryDict(StatsBaseDict):
     num_requests: int
     num_none_requests: int
     num_failures: int
-    total_response_time: int
-    max_response_time: int
-    min_response_time: int | None
+    total_response_time: int | float
+    max_response_time: int | float
+    min_response_time: int | float | None
     total_content_length: int
-    response_times: dict[int, int]
+    response_times: dict[int, int] | list[float | int]
     num_reqs_per_sec: dict[int, int]
     num_fail_per_sec: dict[int, int]
 
@@ -113,7 +125,73 @@ response time percentile
 """
 CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW = 10
 
-CachedResponseTimes = namedtuple("CachedResponseTimes", ["response_times", "num_requests", "num_none_requests"])
+"""
+Number of seconds of per second request/failure counts that each StatsEntry keeps. Older counts are
+discarded, so it needs to cover the window used for current RPS (the last 12 seconds) with some margin
+for late worker reports. Totals (e.g. for total RPS) are kept separately and are not affected.
+"""
+PER_SECOND_COUNTS_HORIZON = 60
+
+"""
+If set to more than 1, the runner buffers requests and logs them in bulk with RequestStats.log_requests,
+once this many requests have been buffered or every REQUEST_STATS_FLUSH_INTERVAL seconds, whichever
+comes first. 0 (the default) logs every request as soon as it is made. Set by --stats-batch-size.
+"""
+REQUEST_STATS_BATCH_SIZE = 0
+REQUEST_STATS_FLUSH_INTERVAL = 0.1
+
+"""
+If True, numeric, UUID and hash segments of request names are replaced with [id], [uuid] and [hash]
+(see locust.util.url.template_path) before requests are logged. Set by --template-request-names.
+"""
+TEMPLATE_REQUEST_NAMES = False
+
+"""
+Maximum number of request entries. Once it has been reached, requests with new names are logged under
+OTHER_REQUEST_NAME (one entry per method) instead. None (the default) means no limit. Set by
+--max-request-entries.
+"""
+MAX_REQUEST_ENTRIES: int | None = None
+OTHER_REQUEST_NAME = "Other"
+
+"""
+Maximum number of unique errors that are kept in RequestStats.errors. When it is exceeded, the least
+recently seen errors are evicted (and counted in RequestStats.evicted_errors). None (the default)
+means no limit. Set by --max-errors.
+"""
+MAX_ERRORS: int | None = None
+
+"""
+If True, UUIDs, hashes and numbers with 5 or more digits (like request ids) in error messages are ignored
+when grouping errors (see StatsError.template_error). Set by --template-errors.
+"""
+TEMPLATE_ERRORS = False
+
+"""
+If True, workers send their stats in the compact, column based format of locust.stats_report instead
+of one dict per entry. The master accepts both formats. Set by --compact-stats-reports.
+"""
+COMPACT_STATS_REPORTS = False
+
+"""
+Shared memory that the workers forked by --processes write their stats reports to, instead of sending them to the
+master (see locust.stats_shm). Set up by main() in the master before it forks, and SHARED_STATS_SLOT is set to
+the slot of each forked worker.
+"""
+SHARED_STATS: stats_shm.SharedStats | None = None
+SHARED_STATS_SLOT: int | None = None
+
+"""
+Relative accuracy (e.g. 0.01 for 1%) of the response time percentiles when the sketch-based histogram
+is used. None (the default) means that the log-linear histogram is used. Set by --percentile-sketch.
+"""
+RESPONSE_TIME_SKETCH_RELATIVE_ACCURACY: float | None = None
+
+"""
+If True, response times are stored with microsecond resolution (see HighResolutionHistogram) and
+reported with 3 decimals instead of in whole milliseconds. Set by --high-resolution.
+"""
+RESPONSE_TIME_HIGH_RESOLUTION = False
 
 PERCENTILES_TO_REPORT = [0.50, 0.66, 0.75, 0.80, 0.90, 0.95, 0.98, 0.99, 0.999, 0.9999, 1.0]
 
@@ -142,6 +220,43 @@ def bucket_response_time(response_time: int | float) -> int:
         return int(round(response_time, -3))
 
 
+_default_bucket_response_time = bucket_response_time
+
+
+def create_response_time_histogram() -> ResponseTimeHistogram:
+    """Create the histogram used for StatsEntry.response_times.
+
+    With the default bucketing, this is a LogLinearHistogram, which stores its counts in
+    an array so that logging, percentile calculation and merging don't need to sort or
+    hash anything. If bucket_response_time has been replaced, a dict-backed histogram that
+    uses the custom function is returned instead.
+
+    If RESPONSE_TIME_SKETCH_RELATIVE_ACCURACY is set, a SketchHistogram with that relative
+    accuracy is returned, regardless of the bucketing function. Otherwise, if
+    RESPONSE_TIME_HIGH_RESOLUTION is set, a HighResolutionHistogram is returned.
+
+    Like bucket_response_time, this function can be replaced at runtime to plug in a
+    different ResponseTimeHistogram implementation.
+    """
+    if RESPONSE_TIME_SKETCH_RELATIVE_ACCURACY is not None:
+        return SketchHistogram(RESPONSE_TIME_SKETCH_RELATIVE_ACCURACY)
+    if RESPONSE_TIME_HIGH_RESOLUTION:
+        return HighResolutionHistogram()
+    if bucket_response_time is _default_bucket_response_time:
+        return LogLinearHistogram()
+    return DictHistogram(bucket_response_time)
+
+
+def round_response_time(response_time: int | float) -> int | float:
+    """
+    Round a response time (in ms) for reporting: to whole milliseconds, or to microseconds
+    if RESPONSE_TIME_HIGH_RESOLUTION is set.
+    """
+    if RESPONSE_TIME_HIGH_RESOLUTION:
+        return proper_round(response_time, digits=3)
+    return proper_round(response_time)
+
+
 class RequestStatsAdditionError(Exception):
     pass
 
@@ -158,16 +273,21 @@ def get_readable_percentiles(percentile_list: list[float]) -> list[str]:
     ]
 
 
-def calculate_response_time_percentile(response_times: dict[int, int], num_requests: int, percent: float) -> int:
+def calculate_response_time_percentile(
+    response_times: Mapping[int, int], num_requests: int, percent: float
+) -> int | float:
     """
     Get the response time that a certain number of percent of the requests
     finished within. Arguments:
 
-    response_times: A StatsEntry.response_times dict
+    response_times: A StatsEntry.response_times histogram (or a {response_time: count} dict)
     num_requests: Number of request made (could be derived from response_times,
                   but we save some CPU cycles by using the value which we already store)
     percent: The percentile we want to calculate. Specified in range: 0.0 - 1.0
     """
+    if isinstance(response_times, ResponseTimeHistogram):
+        return response_times.percentile(num_requests, percent)
+
     num_of_request = int(num_requests * percent)
 
     processed_count = 0
@@ -179,13 +299,26 @@ def calculate_response_time_percentile(response_times: dict[int, int], num_reque
     return 0
 
 
-def diff_response_time_dicts(latest: dict[int, int], old: dict[int, int]) -> dict[int, int]:
+def calculate_response_time_percentiles(
+    response_times: Mapping[int, int], num_requests: int, percents: list[float]
+) -> list[int | float]:
+    """
+    Same as calculate_response_time_percentile, but calculates all the percentiles in percents
+    (returned in the same order) with a single ordered walk over response_times.
+    """
+    if not isinstance(response_times, ResponseTimeHistogram):
+        histogram = DictHistogram(bucket_response_time)
+        histogram.merge(response_times)
+        response_times = histogram
+    return response_times.percentiles(num_requests, percents)
+
+
+def diff_response_time_dicts(latest: Mapping[int, int], old: Mapping[int, int]) -> dict[int, int]:
     """
     Returns the delta between two {response_times:request_count} dicts.
 
-    Used together with the response_times cache to get the response times for the
-    last X seconds, which in turn is used to calculate the current response time
-    percentiles.
+    No longer used by Locust itself (the current response time percentiles are calculated from
+    StatsEntry.response_times_window), it is only kept for backward compatibility.
     """
     new = {}
     for t in latest:
@@ -213,15 +346,25 @@ class RequestStats:
     def __init__(self, use_response_times_cache=True) -> None:
         """
         :param use_response_times_cache: The value of use_response_times_cache will be set for each StatsEntry()
-                                         when they are created. Settings it to False saves some memory and CPU
-                                         cycles which we can do on Worker nodes where the response_times_cache
-                                         is not needed.
+                                         when they are created. If True, each StatsEntry keeps the response times
+                                         of the last few seconds in its response_times_window, which the current
+                                         response time percentiles are calculated from. Setting it to False saves
+                                         some memory and CPU cycles, which we can do on Worker nodes where the
+                                         response_times_window is not needed.
         """
         self.use_response_times_cache = use_response_times_cache
         self.entries: dict[tuple[str, str], StatsEntry] = EntriesDict(self)
         self.errors: dict[str, StatsError] = {}
         self.total = StatsEntry(self, "Aggregated", "", use_response_times_cache=self.use_response_times_cache)
         self.history: list[dict] = []
+        self._request_buffer: list[tuple[str, str, int | float | None, int, Exception | str | None]] = []
+        self.collapsed_names = 0
+        """
+        Number of requests that were logged under another name than they were made with, because of
+        TEMPLATE_REQUEST_NAMES or MAX_REQUEST_ENTRIES
+        """
+        self.evicted_errors = 0
+        """ Number of unique errors that have been evicted from errors because of MAX_ERRORS """
 
     @property
     def num_requests(self):
@@ -243,11 +386,97 @@ class RequestStats:
     def start_time(self):
         return self.total.start_time
 
-    def log_request(self, method: str, name: str, response_time: int, content_length: int) -> None:
+    def request_name(self, method: str, name: str, count: int = 0) -> str:
+        """
+        Get the name that a request should be logged under, taking TEMPLATE_REQUEST_NAMES and
+        MAX_REQUEST_ENTRIES into account. If the name is changed, collapsed_names is increased by count.
+        """
+        if (name, method) in self.entries:
+            return name
+        new_name = template_path(name) if TEMPLATE_REQUEST_NAMES else name
+        if (
+            MAX_REQUEST_ENTRIES is not None
+            and len(self.entries) >= MAX_REQUEST_ENTRIES
+            and (new_name, method) not in self.entries
+        ):
+            if (OTHER_REQUEST_NAME, method) not in self.entries:
+                logger.warning(
+                    f"There are more than {MAX_REQUEST_ENTRIES} request names, {method} requests with new names "
+                    f"will be logged as '{OTHER_REQUEST_NAME}'"
+                )
+            new_name = OTHER_REQUEST_NAME
+        if new_name != name:
+            self.collapsed_names += count
+        return new_name
+
+    def log_request(self, method: str, name: str, response_time: int | float, content_length: int) -> None:
+        if TEMPLATE_REQUEST_NAMES or MAX_REQUEST_ENTRIES is not None:
+            name = self.request_name(method, name, 1)
         self.total.log(response_time, content_length)
         self.entries[(name, method)].log(response_time, content_length)
 
+    def log_requests(
+        self, requests: Iterable[tuple[str, str, int | float | None, int, Exception | str | None]]
+    ) -> None:
+        """
+        Log several requests at once. Each request is a (method, name, response_time, content_length, exception)
+        tuple, and they are all counted as made now.
+
+        The requests are grouped by (name, method) first, so each StatsEntry (and the total) is only
+        updated once per call, instead of once per request like log_request does.
+        """
+        current_time = time.time()
+        grouped: dict[tuple[str, str], tuple[list[int | float | None], list[int]]] = {}
+        failed = []
+        for method, name, response_time, content_length, exception in requests:
+            if (group := grouped.get((name, method))) is None:
+                group = grouped[(name, method)] = ([], [])
+            group[0].append(response_time)
+            group[1].append(content_length)
+            if exception:
+                failed.append((method, name, exception))
+
+        rename = TEMPLATE_REQUEST_NAMES or MAX_REQUEST_ENTRIES is not None
+        all_response_times: list[int | float | None] = []
+        total_content_length = 0
+        for (name, method), (response_times, content_lengths) in grouped.items():
+            if rename:
+                name = self.request_name(method, name, len(response_times))
+            content_length = sum(content_lengths)
+            self.entries[(name, method)].log_many(response_times, content_length, current_time)
+            all_response_times.extend(response_times)
+            total_content_length += content_length
+        if all_response_times:
+            self.total.log_many(all_response_times, total_content_length, current_time)
+
+        for method, name, exception in failed:
+            self.log_error(method, name, exception)
+
+    def buffer_request(
+        self,
+        method: str,
+        name: str,
+        response_time: int | float | None,
+        content_length: int,
+        exception: Exception | str | None = None,
+    ) -> None:
+        """
+        Add a request to the buffer that flush_requests() logs with log_requests. The buffer is flushed
+        automatically once it holds REQUEST_STATS_BATCH_SIZE requests.
+        """
+        self._request_buffer.append((method, name, response_time, content_length, exception))
+        if len(self._request_buffer) >= REQUEST_STATS_BATCH_SIZE:
+            self.flush_requests()
+
+    def flush_requests(self) -> None:
+        """Log all the buffered requests"""
+        if self._request_buffer:
+            requests, self._request_buffer = self._request_buffer, []
+            self.log_requests(requests)
+
     def log_error(self, method: str, name: str, error: Exception | str | None) -> None:
+        if TEMPLATE_REQUEST_NAMES or MAX_REQUEST_ENTRIES is not None:
+            name = self.request_name(method, name)
         self.total.log_error(error)
         self.entries[(name, method)].log_error(error)
 
@@ -258,6 +487,25 @@ class RequestStats:
             entry = StatsError(method, name, error)
             self.errors[key] = entry
         entry.occurred()
+        if MAX_ERRORS is not None and len(self.errors) > MAX_ERRORS:
+            self.evict_errors()
+
+    def evict_errors(self) -> None:
+        """
+        Evict the least recently seen errors, so that errors holds at most 90% of MAX_ERRORS. Evicting
+        more than strictly needed means that this only happens every MAX_ERRORS / 10 new errors.
+        """
+        if MAX_ERRORS is None:
+            return
+        keep = MAX_ERRORS - MAX_ERRORS // 10
+        if len(self.errors) <= keep:
+            return
+        errors = self.errors
+        by_last_seen = sorted(errors, key=lambda key: errors[key].last_seen or 0)
+        evicted = by_last_seen[: len(errors) - keep]
+        for key in evicted:
+            del errors[key]
+        self.evicted_errors += len(evicted)
 
     def get(self, name: str, method: str) -> StatsEntry:
         """
@@ -274,6 +522,9 @@ class RequestStats:
         for r in self.entries.values():
             r.reset()
         self.history = []
+        self._request_buffer = []
+        self.collapsed_names = 0
+        self.evicted_errors = 0
 
     def clear_all(self) -> None:
         """
@@ -283,6 +534,9 @@ class RequestStats:
         self.entries = EntriesDict(self)
         self.errors = {}
         self.history = []
+        self._request_buffer = []
+        self.collapsed_names = 0
+        self.evicted_errors = 0
 
     def serialize_stats(self) -> list[StatsEntryDict]:
         return [
@@ -306,10 +560,9 @@ class StatsEntry:
         """ Method (GET, POST, PUT, etc.) """
         self.use_response_times_cache = use_response_times_cache
         """
-        If set to True, the copy of the response_time dict will be stored in response_times_cache
-        every second, and kept for 20 seconds (by default, will be CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW + 10).
-        We can use this dict to calculate the *current*  median response time, as well as other response
-        time percentiles.
+        If set to True, the response times of the last CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW seconds
+        are kept in response_times_window. We use it to calculate the *current* median response time,
+        as well as other response time percentiles.
         """
         self.num_requests: int = 0
         """ The number of requests made """
@@ -317,30 +570,19 @@ class StatsEntry:
         """ The number of requests made with a None response time (typically async requests) """
         self.num_failures: int = 0
         """ Number of failed request """
-        self.total_response_time: int = 0
+        self.total_response_time: int | float = 0
         """ Total sum of the response times """
-        self.min_response_time: int | None = None
+        self.min_response_time: int | float | None = None
         """ Minimum response time """
-        self.max_response_time: int = 0
+        self.max_response_time: int | float = 0
         """ Maximum response time """
-        self.num_reqs_per_sec: dict[int, int] = defaultdict(int)
-        """ A {second => request_count} dict that holds the number of requests made per second """
-        self.num_fail_per_sec: dict[int, int] = defaultdict(int)
-        """ A (second => failure_count) dict that hold the number of failures per second """
-        self.response_times: dict[int, int] = defaultdict(int)
+        self._num_reqs_per_sec = PerSecondRingBuffer(PER_SECOND_COUNTS_HORIZON)
+        self._num_fail_per_sec = PerSecondRingBuffer(PER_SECOND_COUNTS_HORIZON)
+        self._response_times: ResponseTimeHistogram = create_response_time_histogram()
+        self.response_times_window: WindowedHistogram | None = None
         """
-        A {response_time => count} dict that holds the response time distribution of all
-        the requests.
-
-        The keys (the response time in ms) are rounded to store 1, 2, ... 98, 99, 100, 110, 120, ... 980, 990, 1000,
-        1100, 1200, ... 9800, 9900, 10_000, 11_000, 12_000 ... in order to save memory.
-
-        This dict is used to calculate the median and percentile response times.
-        """
-        self.response_times_cache: OrderedDict[int, CachedResponseTimes] | None = None
-        """
-        If use_response_times_cache is set to True, this will be a {timestamp => CachedResponseTimes()}
-        OrderedDict that holds a copy of the response_times dict for each of the last 20 seconds.
+        If use_response_times_cache is set to True, this will be a WindowedHistogram that holds
+        the response times of (approximately) the last CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW seconds.
         """
         self.total_content_length: int = 0
         """ The sum of the content length of all the responses for this entry """
@@ -356,25 +598,73 @@ class StatsEntry:
         self.num_none_requests = 0
         self.num_failures = 0
         self.total_response_time = 0
-        self.response_times = defaultdict(int)
+        self._response_times = create_response_time_histogram()
         self.min_response_time = None
         self.max_response_time = 0
         self.last_request_timestamp = None
-        self.num_reqs_per_sec = defaultdict(int)
-        self.num_fail_per_sec = defaultdict(int)
+        self._num_reqs_per_sec = PerSecondRingBuffer(PER_SECOND_COUNTS_HORIZON)
+        self._num_fail_per_sec = PerSecondRingBuffer(PER_SECOND_COUNTS_HORIZON)
         self.total_content_length = 0
         if self.use_response_times_cache:
-            self.response_times_cache = OrderedDict()
-            self._cache_response_times(int(time.time()))
+            self.response_times_window = WindowedHistogram(
+                CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW, create_response_time_histogram
+            )
+            self.response_times_window.start(int(time.time()))
+
+    @property
+    def response_times(self) -> ResponseTimeHistogram:
+        """
+        A {response_time => count} histogram that holds the response time distribution of all
+        the requests.
 
-    def log(self, response_time: int, content_length: int) -> None:
+        The keys (the response time in ms) are rounded to store 1, 2, ... 98, 99, 100, 110, 120, ... 980, 990, 1000,
+        1100, 1200, ... 9800, 9900, 10_000, 11_000, 12_000 ... in order to save memory.
+
+        This histogram is used to calculate the median and percentile response times. Assigning a plain
+        dict (or a serialized sketch, e.g. when unserializing a worker report) to it converts it into a
+        histogram.
+        """
+        return self._response_times
+
+    @response_times.setter
+    def response_times(self, value: Mapping[int, int] | list[float | int]) -> None:
+        if not isinstance(value, ResponseTimeHistogram):
+            histogram = create_response_time_histogram()
+            histogram.merge(unserialize_histogram(value))
+            value = histogram
+        self._response_times = value
+
+    @property
+    def num_reqs_per_sec(self) -> PerSecondRingBuffer:
+        """
+        A {second => request_count} ring buffer that holds the number of requests made per second,
+        for the last PER_SECOND_COUNTS_HORIZON seconds
+        """
+        return self._num_reqs_per_sec
+
+    @num_reqs_per_sec.setter
+    def num_reqs_per_sec(self, value: Mapping[int, int]) -> None:
+        self._num_reqs_per_sec = _to_per_second_ring_buffer(value)
+
+    @property
+    def num_fail_per_sec(self) -> PerSecondRingBuffer:
+        """
+        A {second => failure_count} ring buffer that holds the number of failures per second,
+        for the last PER_SECOND_COUNTS_HORIZON seconds
+        """
+        return self._num_fail_per_sec
+
+    @num_fail_per_sec.setter
+    def num_fail_per_sec(self, value: Mapping[int, int]) -> None:
+        self._num_fail_per_sec = _to_per_second_ring_buffer(value)
+
+    def log(self, response_time: int | float, content_length: int) -> None:
         # get the time
         current_time = time.time()
         t = int(current_time)
 
-        if self.use_response_times_cache and self.last_request_timestamp and t > int(self.last_request_timestamp):
-            # see if we shall make a copy of the response_times dict and store in the cache
-            self._cache_response_times(t - 1)
+        if self.response_times_window is not None and response_time is not None:
+            self.response_times_window.add(t, response_time)
 
         self.num_requests += 1
         self._log_time_of_request(current_time)
@@ -383,12 +673,41 @@ class StatsEntry:
         # increase total content-length
         self.total_content_length += content_length
 
+    def log_many(self, response_times: list[int | float | None], content_length: int, current_time: float) -> None:
+        """
+        Log several requests that were made at current_time at once (see RequestStats.log_requests).
+        content_length is the sum for all the requests.
+        """
+        t = int(current_time)
+        num_requests = len(response_times)
+        self.num_requests += num_requests
+        self._num_reqs_per_sec.increment(t, num_requests)
+        self.last_request_timestamp = current_time
+
+        timed = [response_time for response_time in response_times if response_time is not None]
+        self.num_none_requests += num_requests - len(timed)
+        if timed:
+            self.total_response_time += sum(timed)
+            fastest = min(timed)
+            if self.min_response_time is None or fastest < self.min_response_time:
+                self.min_response_time = fastest
+            self.max_response_time = max(self.max_response_time, max(timed))
+
+            histogram = self._response_times
+            window = self.response_times_window
+            for response_time in timed:
+                histogram.add(response_time)
+                if window is not None:
+                    window.add(t, response_time)
+
+        self.total_content_length += content_length
+
     def _log_time_of_request(self, current_time: float) -> None:
         t = int(current_time)
-        self.num_reqs_per_sec[t] += 1
+        self._num_reqs_per_sec.increment(t)
         self.last_request_timestamp = current_time
 
-    def _log_response_time(self, response_time: int) -> None:
+    def _log_response_time(self, response_time: int | float | None) -> None:
         if response_time is None:
             self.num_none_requests += 1
             return
@@ -402,17 +721,14 @@ class StatsEntry:
         self.max_response_time = max(self.max_response_time, response_time)
 
         # to avoid to much data that has to be transferred to the master node when
-        # running in distributed mode, we save the response time rounded in a dict
+        # running in distributed mode, the histogram stores the response time rounded
         # so that 147 becomes 150, 3432 becomes 3400 and 58760 becomes 59000
-        rounded_response_time = bucket_response_time(response_time)
-
-        # increase request count for the rounded key in response time dict
-        self.response_times[rounded_response_time] += 1
+        self._response_times.add(response_time)
 
     def log_error(self, error: Exception | str | None) -> None:
         self.num_failures += 1
         t = int(time.time())
-        self.num_fail_per_sec[t] += 1
+        self._num_fail_per_sec.increment(t)
 
     @property
     def fail_ratio(self) -> float:
@@ -432,7 +748,7 @@ class StatsEntry:
             return 0.0
 
     @property
-    def median_response_time(self) -> int:
+    def median_response_time(self) -> int | float:
         if not self.response_times:
             return 0
         median = median_from_dict(self.num_requests - self.num_none_requests, self.response_times) or 0
@@ -453,22 +769,22 @@ class StatsEntry:
         if self.stats.last_request_timestamp is None:
             return 0
         slice_start_time = max(int(self.stats.last_request_timestamp) - 12, int(self.stats.start_time or 0))
+        slice_end_time = int(self.stats.last_request_timestamp) - 2
 
-        reqs: list[int | float] = [
-            self.num_reqs_per_sec.get(t, 0) for t in range(slice_start_time, int(self.stats.last_request_timestamp) - 2)
-        ]
-        return avg(reqs)
+        return self._num_reqs_per_sec.window_sum(slice_start_time, slice_end_time) / max(
+            slice_end_time - slice_start_time, 1
+        )
 
     @property
     def current_fail_per_sec(self):
         if self.stats.last_request_timestamp is None:
             return 0
         slice_start_time = max(int(self.stats.last_request_timestamp) - 12, int(self.stats.start_time or 0))
+        slice_end_time = int(self.stats.last_request_timestamp) - 2
 
-        reqs = [
-            self.num_fail_per_sec.get(t, 0) for t in range(slice_start_time, int(self.stats.last_request_timestamp) - 2)
-        ]
-        return avg(reqs)
+        return self._num_fail_per_sec.window_sum(slice_start_time, slice_end_time) / max(
+            slice_end_time - slice_start_time, 1
+        )
 
     @property
     def total_rps(self):
@@ -500,10 +816,6 @@ class StatsEntry:
         Extend the data from the current StatsEntry with the stats from another
         StatsEntry instance.
         """
-        # save the old last_request_timestamp, to see if we should store a new copy
-        # of the response times in the response times cache
-        old_last_request_timestamp = self.last_request_timestamp
-
         if self.last_request_timestamp is not None and other.last_request_timestamp is not None:
             self.last_request_timestamp = max(self.last_request_timestamp, other.last_request_timestamp)
         elif other.last_request_timestamp is not None:
@@ -521,26 +833,23 @@ class StatsEntry:
             self.min_response_time = other.min_response_time
         self.total_content_length += other.total_content_length
 
-        for key in other.response_times:
-            self.response_times[key] = self.response_times.get(key, 0) + other.response_times[key]
-        for key in other.num_reqs_per_sec:
-            self.num_reqs_per_sec[key] = self.num_reqs_per_sec.get(key, 0) + other.num_reqs_per_sec[key]
-        for key in other.num_fail_per_sec:
-            self.num_fail_per_sec[key] = self.num_fail_per_sec.get(key, 0) + other.num_fail_per_sec[key]
+        self._response_times.merge(other.response_times)
+        self._num_reqs_per_sec.merge(other.num_reqs_per_sec)
+        self._num_fail_per_sec.merge(other.num_fail_per_sec)
 
-        if self.use_response_times_cache:
-            # If we've entered a new second, we'll cache the response times. Note that there
-            # might still be reports from other worker nodes - that contains requests for the same
-            # time periods - that hasn't been received/accounted for yet. This will cause the cache to
-            # lag behind a second or two, but since StatsEntry.current_response_time_percentile()
-            # (which is what the response times cache is used for) uses an approximation of the
-            # last 10 seconds anyway, it should be fine to ignore this.
-            last_time = int(self.last_request_timestamp) if self.last_request_timestamp else None
-            if last_time and last_time > (old_last_request_timestamp and int(old_last_request_timestamp) or 0):
-                self._cache_response_times(last_time)
+        if self.response_times_window is not None:
+            # Reports from worker nodes contain the requests of the last few seconds, but we'll count
+            # them all as being made in the current second. This can make the window lag behind a
+            # second or two, but since StatsEntry.get_current_response_time_percentile() only uses an
+            # approximation of the last 10 seconds anyway, it should be fine to ignore this.
+            self.response_times_window.merge(int(time.time()), other.response_times)
 
     def serialize(self) -> StatsEntryDict:
-        return cast(StatsEntryDict, {key: getattr(self, key, None) for key in StatsEntryDict.__annotations__.keys()})
+        report = {key: getattr(self, key, None) for key in StatsEntryDict.__annotations__.keys()}
+        report["response_times"] = self._response_times.serialize()
+        report["num_reqs_per_sec"] = self._num_reqs_per_sec.to_dict()
+        report["num_fail_per_sec"] = self._num_fail_per_sec.to_dict()
+        return cast(StatsEntryDict, report)
 
     @classmethod
     def unserialize(cls, data: StatsEntryDict, stats: RequestStats) -> StatsEntry:
@@ -575,12 +884,13 @@ class StatsEntry:
         else:
             rps = self.total_rps
             fail_per_sec = self.total_fail_per_sec
+        rt = "%7.3f" if RESPONSE_TIME_HIGH_RESOLUTION else "%7d"
         return (
             "%-"
             + str(STATS_TYPE_WIDTH)
             + "s %-"
             + str((STATS_NAME_WIDTH - STATS_TYPE_WIDTH) + 4)
-            + "s %7d %12s |%7d %7d %7d%7d | %7.2f %11.2f"
+            + f"s %7d %12s |{rt} {rt} {rt}{rt} | %7.2f %11.2f"
         ) % (
             (self.method and self.method + " " or ""),
             self.name,
@@ -597,7 +907,7 @@ class StatsEntry:
     def __str__(self) -> str:
         return self.to_string(current=True)
 
-    def get_response_time_percentile(self, percent: float) -> int:
+    def get_response_time_percentile(self, percent: float) -> int | float:
         """
         Get the response time that a certain number of percent of the requests
         finished within.
@@ -610,87 +920,65 @@ class StatsEntry:
             self.response_times, self.num_requests - self.num_none_requests, percent
         )
 
-    def get_current_response_time_percentile(self, percent: float) -> int | None:
+    def get_response_time_percentiles(self, percents: list[float]) -> list[int | float]:
+        """
+        Get the response times for several percentiles at once (in the same order as percents).
+        This only walks the response times histogram once, so it should be preferred over calling
+        get_response_time_percentile for each percentile.
+        """
+        return self._response_times.percentiles(self.num_requests - self.num_none_requests, percents)
+
+    def get_current_response_time_percentile(self, percent: float) -> int | float | None:
         """
         Calculate the *current* response time for a certain percentile. We use a sliding
         window of (approximately) the last 10 seconds (specified by CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW)
         when calculating this.
         """
+        return self.get_current_response_time_percentiles([percent])[0]
+
+    def get_current_response_time_percentiles(self, percents: list[float]) -> list[int | float | None]:
+        """
+        Same as get_current_response_time_percentile, but for several percentiles at once (in the same
+        order as percents). The response times for the window are only calculated once.
+        """
         if not self.use_response_times_cache:
             raise ValueError(
                 "StatsEntry.use_response_times_cache must be set to True to calculate the _current_ response time percentile"
             )
-        # First, we want to determine which of the cached response_times dicts we should
-        # use to get response_times for approximately 10 seconds ago.
         t = int(time.time())
-        # Since we can't be sure that the cache contains an entry for every second.
-        # We'll construct a list of timestamps which we consider acceptable keys to be used
-        # when trying to fetch the cached response_times. We construct this list in such a way
-        # that it's ordered by preference by starting to add t-10, then t-11, t-9, t-12, t-8,
-        # and so on
-        acceptable_timestamps: list[int] = []
-        acceptable_timestamps.append(t - CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW)
-        for i in range(1, 9):
-            acceptable_timestamps.append(t - CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW - i)
-            acceptable_timestamps.append(t - CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW + i)
-
-        cached: CachedResponseTimes | None = None
-        if self.response_times_cache is not None:
-            for ts in acceptable_timestamps:
-                if ts in self.response_times_cache:
-                    cached = self.response_times_cache[ts]
-                    break
-
-        if cached:
-            # If we found an acceptable cached response times, we'll calculate a new response
-            # times dict of the last 10 seconds (approximately) by diffing it with the current
-            # total response times. Then we'll use that to calculate a response time percentile
-            # for that timeframe
-            return calculate_response_time_percentile(
-                diff_response_time_dicts(self.response_times, cached.response_times),
-                (self.num_requests - self.num_none_requests) - (cached.num_requests - cached.num_none_requests),
-                percent,
-            )
-        # if time was not in response times cache window
-        return None
+        window = self.response_times_window
+        # If nothing has been recorded for a while, there is no *current* response time
+        if (
+            window is None
+            or window.last_update is None
+            or window.last_update < t - CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW - 8
+        ):
+            return [None] * len(percents)
+        return list(window.percentiles(t, percents))
 
     def percentile(self) -> str:
         if not self.num_requests:
             raise ValueError("Can't calculate percentile on url with no successful requests")
 
-        tpl = f"%-{str(STATS_TYPE_WIDTH)}s %-{str(STATS_NAME_WIDTH)}s %8d {' '.join(['%6d'] * len(PERCENTILES_TO_REPORT))}"
+        # the first column is 8 characters wide and the last one is "# reqs", like in the header
+        if RESPONSE_TIME_HIGH_RESOLUTION:
+            columns = ["%8.3f"] + ["%6.3f"] * (len(PERCENTILES_TO_REPORT) - 1) + ["%6d"]
+        else:
+            columns = ["%8d"] + ["%6d"] * len(PERCENTILES_TO_REPORT)
+        tpl = f"%-{str(STATS_TYPE_WIDTH)}s %-{str(STATS_NAME_WIDTH)}s {' '.join(columns)}"
 
         return tpl % (
             (self.method or "", self.name)
-            + tuple(self.get_response_time_percentile(p) for p in PERCENTILES_TO_REPORT)
+            + tuple(self.get_response_time_percentiles(PERCENTILES_TO_REPORT))
             + (self.num_requests,)
         )
 
-    def _cache_response_times(self, t: int) -> None:
-        if self.response_times_cache is None:
-            self.response_times_cache = OrderedDict()
-
-        self.response_times_cache[t] = CachedResponseTimes(
-            response_times=copy(self.response_times),
-            num_requests=self.num_requests,
-            num_none_requests=self.num_none_requests,
-        )
-
-        # We'll use a cache size of CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW + 10 since - in the extreme case -
-        # we might still use response times (from the cache) for t-CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW-10
-        # to calculate the current response time percentile, if we're missing cached values for the subsequent
-        # 20 seconds
-        cache_size = CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW + 10
-
-        if len(self.response_times_cache) > cache_size:
-            # only keep the latest 20 response_times dicts
-            for _ in range(len(self.response_times_cache) - cache_size):
-                self.response_times_cache.popitem(last=False)
-
     def to_dict(self, escape_string_values=False) -> dict[str, int | float | str]:
         response_time_percentiles = {
-            f"response_time_percentile_{percentile}": self.get_response_time_percentile(percentile)
-            for percentile in PERCENTILES_TO_STATISTICS
+            f"response_time_percentile_{percentile}": value
+            for percentile, value in zip(
+                PERCENTILES_TO_STATISTICS, self.get_response_time_percentiles(PERCENTILES_TO_STATISTICS)
+            )
         }
 
         return {
@@ -698,8 +986,8 @@ class StatsEntry:
             "name": self.name,
             "num_requests": self.num_requests,
             "num_failures": self.num_failures,
-            "min_response_time": 0 if self.min_response_time is None else proper_round(self.min_response_time),
-            "max_response_time": proper_round(self.max_response_time),
+            "min_response_time": 0 if self.min_response_time is None else round_response_time(self.min_response_time),
+            "max_response_time": round_response_time(self.max_response_time),
             "current_rps": self.current_rps,
             "current_fail_per_sec": self.current_fail_per_sec,
             "avg_response_time": self.avg_response_time,
@@ -745,10 +1033,30 @@ class StatsError:
         hex_address = string_error[start:end]
         return string_error.replace(hex_address, "0x....")
 
+    @classmethod
+    def template_error(cls, string_error: str) -> str:
+        """
+        Replace the parts of an error message that typically differ between otherwise identical errors
+        (UUIDs, hashes and long numbers, like request ids) with placeholders
+        """
+        return _ERROR_ID_PATTERN.sub("#", string_error)
+
     @classmethod
     def create_key(cls, method: str, name: str, error: Exception | str | None) -> str:
-        key = f"{method}.{name}.{StatsError.parse_error(error)!r}"
-        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+        """
+        Get the key of an error in RequestStats.errors. Errors with the same method, name and message
+        (templated if TEMPLATE_ERRORS is set) get the same key. Keys are cached, and for exceptions with
+        the default repr and string arguments the cache is looked up by type and arguments, so that
+        repeated errors don't need to be formatted again.
+        """
+        if (
+            isinstance(error, BaseException)
+            and type(error).__repr__ is BaseException.__repr__
+            # other arguments can be equal without having the same repr (like 1 and True)
+            and all(type(arg) is str for arg in error.args)
+        ):
+            return _exception_key(method, name, type(error).__name__, error.args, TEMPLATE_ERRORS)
+        return _error_key(method, name, error if isinstance(error, str) else repr(error), TEMPLATE_ERRORS)
 
     def occurred(self) -> None:
         self.occurrences += 1
@@ -808,15 +1116,47 @@ class StatsError:
         }
 
 
+_ERROR_ID_PATTERN = re.compile(
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\b[0-9a-fA-F]{16,}\b|\d{5,}"
+)
+
+
+@functools.lru_cache(maxsize=10000)
+def _error_key(method: str, name: str, string_error: str, template: bool) -> str:
+    string_error = StatsError.parse_error(string_error)
+    if template:
+        string_error = StatsError.template_error(string_error)
+    key = f"{method}.{name}.{string_error!r}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=10000)
+def _exception_key(method: str, name: str, type_name: str, args: tuple[str, ...], template: bool) -> str:
+    # the same as repr(error) for exceptions that don't override __repr__
+    string_error = f"{type_name}({args[0]!r})" if len(args) == 1 else f"{type_name}{args!r}"
+    return _error_key(method, name, string_error, template)
+
+
+def _to_per_second_ring_buffer(value: Mapping[int, int]) -> PerSecondRingBuffer:
+    if isinstance(value, PerSecondRingBuffer):
+        return value
+    ring_buffer = PerSecondRingBuffer(PER_SECOND_COUNTS_HORIZON)
+    ring_buffer.merge(value)
+    return ring_buffer
+
+
 def avg(values: list[float | int]) -> float:
     return sum(values, 0.0) / max(len(values), 1)
 
 
-def median_from_dict(total: int, count: dict[int, int]) -> int:
+def median_from_dict(total: int, count: Mapping[int, int]) -> int | float:
     """
     total is the number of requests made
-    count is a dict {response_time: count}
+    count is a ResponseTimeHistogram or a dict {response_time: count}
     """
+    if isinstance(count, ResponseTimeHistogram):
+        return count.median(total)
+
     pos = (total - 1) / 2
     for k in sorted(count.keys()):
         if pos < count[k]:
@@ -828,40 +1168,87 @@ def median_from_dict(total: int, count: dict[int, int]) -> int:
 
 def setup_distributed_stats_event_listeners(events: Events, stats: RequestStats) -> None:
     def on_report_to_master(client_id: str, data: dict[str, Any]) -> None:
-        data["stats"] = stats.serialize_stats()
-        data["stats_total"] = stats.total.get_stripped_report()
+        stats.flush_requests()
+        entries = [e for e in stats.entries.values() if not (e.num_requests == 0 and e.num_failures == 0)]
+        buffer = None
+        if SHARED_STATS is not None and SHARED_STATS_SLOT is not None:
+            buffer = SHARED_STATS.write_report(SHARED_STATS_SLOT, entries, stats.total)
+        if buffer is not None or COMPACT_STATS_REPORTS:
+            if buffer is not None:
+                data["shared_stats"] = [SHARED_STATS_SLOT, buffer]
+            else:
+                data["stats_report"] = stats_report.encode_report(entries, stats.total)
+            for entry in entries:
+                entry.reset()
+            stats.total.reset()
+        else:
+            data["stats"] = stats.serialize_stats()
+            data["stats_total"] = stats.total.get_stripped_report()
         data["errors"] = stats.serialize_errors()
+        data["collapsed_names"] = stats.collapsed_names
+        data["evicted_errors"] = stats.evicted_errors
         stats.errors = {}
+        stats.collapsed_names = 0
+        stats.evicted_errors = 0
 
     def on_worker_report(client_id: str, data: dict[str, Any]) -> None:
-        for stats_data in data["stats"]:
-            entry = StatsEntry.unserialize(stats_data, stats)
-            request_key = (entry.name, entry.method)
-            if request_key not in stats.entries:
-                stats.entries[request_key] = StatsEntry(stats, entry.name, entry.method, use_response_times_cache=True)
-            stats.entries[request_key].extend(entry)
-
-        for error_key, error in data["errors"].items():
-            if error_key not in stats.errors:
-                stats.errors[error_key] = StatsError.unserialize(error)
-            else:
-                existing = stats.errors[error_key]
-                existing.occurrences += error["occurrences"]
-                if incoming_first := error.get("first_seen"):
-                    existing.first_seen = (
-                        incoming_first if existing.first_seen is None else min(existing.first_seen, incoming_first)
-                    )
-                if incoming_last := error.get("last_seen"):
-                    existing.last_seen = (
-                        incoming_last if existing.last_seen is None else max(existing.last_seen, incoming_last)
-                    )
-
-        stats.total.extend(StatsEntry.unserialize(data["stats_total"], stats))
+        if "shared_stats" in data and SHARED_STATS is not None:
+            # read it now, before the worker writes another report to the same buffer
+            slot, buffer = data.pop("shared_stats")
+            data["stats"], data["stats_total"] = SHARED_STATS.read_report(slot, buffer, create_response_time_histogram)
+        merge_worker_report(stats, data)
 
     events.report_to_master.add_listener(on_report_to_master)
     events.worker_report.add_listener(on_worker_report)
 
 
+def _merge_entry(stats: RequestStats, entry: StatsEntry) -> None:
+    name = entry.name
+    if TEMPLATE_REQUEST_NAMES or MAX_REQUEST_ENTRIES is not None:
+        name = stats.request_name(entry.method, name, entry.num_requests)
+    request_key = (name, entry.method)
+    if request_key not in stats.entries:
+        stats.entries[request_key] = StatsEntry(
+            stats, name, entry.method, use_response_times_cache=stats.use_response_times_cache
+        )
+    stats.entries[request_key].extend(entry)
+
+
+def _merge_error(stats: RequestStats, error_key: str, error: StatsErrorDict) -> None:
+    if error_key not in stats.errors:
+        stats.errors[error_key] = StatsError.unserialize(error)
+    else:
+        existing = stats.errors[error_key]
+        existing.occurrences += error["occurrences"]
+        if incoming_first := error.get("first_seen"):
+            existing.first_seen = (
+                incoming_first if existing.first_seen is None else min(existing.first_seen, incoming_first)
+            )
+        if incoming_last := error.get("last_seen"):
+            existing.last_seen = incoming_last if existing.last_seen is None else max(existing.last_seen, incoming_last)
+
+
+def merge_worker_report(stats: RequestStats, data: dict[str, Any]) -> None:
+    """Merge the stats of a worker report (see setup_distributed_stats_event_listeners) into stats"""
+    if "stats_report" in data:
+        entries_data, total_data = stats_report.decode_report(data["stats_report"], create_response_time_histogram)
+    else:
+        entries_data, total_data = data["stats"], data["stats_total"]
+
+    for stats_data in entries_data:
+        _merge_entry(stats, StatsEntry.unserialize(stats_data, stats))
+
+    for error_key, error in data["errors"].items():
+        _merge_error(stats, error_key, error)
+
+    if MAX_ERRORS is not None and len(stats.errors) > MAX_ERRORS:
+        stats.evict_errors()
+
+    stats.total.extend(StatsEntry.unserialize(total_data, stats))
+    stats.collapsed_names += data.get("collapsed_names", 0)
+    stats.evicted_errors += data.get("evicted_errors", 0)
+
+
 def print_stats(stats: RequestStats, current=True) -> None:
     for line in get_stats_summary(stats, current):
         console_logger.info(line)
@@ -965,11 +1352,10 @@ def update_stats_history(runner: Runner, timestamp: str | None = None) -> None:
     stats = runner.stats
     timestamp = timestamp or format_utc_timestamp(time.time())
     current_response_time_percentiles = {
-        f"response_time_percentile_{percentile}": [
-            timestamp,
-            stats.total.get_current_response_time_percentile(percentile) or 0,
-        ]
-        for percentile in PERCENTILES_TO_CHART
+        f"response_time_percentile_{percentile}": [timestamp, value or 0]
+        for percentile, value in zip(
+            PERCENTILES_TO_CHART, stats.total.get_current_response_time_percentiles(PERCENTILES_TO_CHART)
+        )
     }
 
     r = {
@@ -1037,13 +1423,17 @@ class StatsCSV:
             "Nodes",
         ]
 
-    def _percentile_fields(self, stats_entry: StatsEntry, use_current: bool = False) -> list[str] | list[int]:
+    def _percentile_fields(self, stats_entry: StatsEntry, use_current: bool = False) -> Sequence[str | int | float]:
         if not stats_entry.num_requests:
             return self.percentiles_na
-        elif use_current:
-            return [int(stats_entry.get_current_response_time_percentile(x) or 0) for x in self.percentiles_to_report]
+        percentiles: Sequence[int | float | None]
+        if use_current:
+            percentiles = stats_entry.get_current_response_time_percentiles(self.percentiles_to_report)
         else:
-            return [int(stats_entry.get_response_time_percentile(x) or 0) for x in self.percentiles_to_report]
+            percentiles = stats_entry.get_response_time_percentiles(self.percentiles_to_report)
+        if RESPONSE_TIME_HIGH_RESOLUTION:
+            return [round(x or 0, 3) for x in percentiles]
+        return [int(x or 0) for x in percentiles]
 
     def requests_csv(self, csv_writer: CSVWriter) -> None:
         """Write requests csv with header and data rows."""
@@ -0,0 +1,139 @@
+"""
+Compact, column based encoding of the stats reports that workers send to the master.
+
+Instead of one dict (with string keys) per StatsEntry, a report holds one list per field, with a
+row for each entry and the total as the last row. Names and methods are replaced by indexes into a
+table of unique strings, histograms of the built-in layouts are sent as packed arrays of bucket
+indexes and counts, and per second counts as packed arrays of seconds (relative to the first one)
+and counts. The master decodes the arrays straight into histograms, without building any dicts.
+"""
+
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import TYPE_CHECKING, Any
+
+from .histogram import ArrayHistogram, ResponseTimeHistogram, histogram_for_layout
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+
+    from .stats import StatsEntry, StatsEntryDict
+
+
+VERSION = 1
+"""Version of the report format. Reports with another version are rejected by decode_report"""
+
+_FIELDS = [
+    "num_requests",
+    "num_none_requests",
+    "num_failures",
+    "total_response_time",
+    "max_response_time",
+    "min_response_time",
+    "total_content_length",
+    "start_time",
+    "last_request_timestamp",
+]
+
+
+def _pack(typecode: str, values: list[int] | list[float]) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    unpacked = array(typecode)
+    unpacked.frombytes(data)
+    if sys.byteorder == "big":
+        unpacked.byteswap()
+    return unpacked
+
+
+def encode_histogram(histogram: ResponseTimeHistogram) -> list[Any]:
+    """Encode a histogram as [layout, packed bucket indexes, packed counts] (layout None for custom bucketing)"""
+    if isinstance(histogram, ArrayHistogram):
+        indexes, counts = histogram.buckets()
+        return [histogram.layout, _pack("I", indexes), _pack("I", counts)]
+    # custom bucketing, send the keys themselves
+    keys = list(histogram.keys())
+    return [None, _pack("d", keys), _pack("I", [histogram[key] for key in keys])]
+
+
+def decode_histogram(data: list[Any], create_histogram: Callable[[], ResponseTimeHistogram]) -> ResponseTimeHistogram:
+    """Decode what encode_histogram returns (create_histogram is used for custom bucketing)"""
+    layout, keys, counts = data
+    if layout is None:
+        histogram = create_histogram()
+        for key, count in zip(_unpack("d", keys), _unpack("I", counts)):
+            histogram[int(key) if key.is_integer() else key] += count
+        return histogram
+    histogram = histogram_for_layout(layout)
+    histogram.add_buckets(_unpack("I", keys), _unpack("I", counts))
+    return histogram
+
+
+def encode_per_second(counts: Mapping[int, int]) -> list[Any]:
+    """Encode per second counts as [first second, packed seconds relative to it, packed counts]"""
+    seconds = sorted(second for second, count in counts.items() if count)
+    if not seconds:
+        return [0, b"", b""]
+    first = seconds[0]
+    return [
+        first,
+        _pack("I", [second - first for second in seconds]),
+        _pack("I", [counts[second] for second in seconds]),
+    ]
+
+
+def decode_per_second(data: list[Any]) -> dict[int, int]:
+    """Decode what encode_per_second returns"""
+    first, seconds, counts = data
+    return {first + delta: count for delta, count in zip(_unpack("I", seconds), _unpack("I", counts))}
+
+
+def encode_report(entries: list[StatsEntry], total: StatsEntry) -> dict[str, Any]:
+    """Encode entries and the total (which is the last row)"""
+    rows = [*entries, total]
+    strings: dict[str, int] = {}
+    report: dict[str, Any] = {
+        "version": VERSION,
+        "name": [strings.setdefault(entry.name, len(strings)) for entry in rows],
+        "method": [strings.setdefault(entry.method, len(strings)) for entry in rows],
+    }
+    report["strings"] = list(strings)
+    for field in _FIELDS:
+        report[field] = [getattr(entry, field) for entry in rows]
+    report["response_times"] = [encode_histogram(entry.response_times) for entry in rows]
+    report["num_reqs_per_sec"] = [encode_per_second(entry.num_reqs_per_sec) for entry in rows]
+    report["num_fail_per_sec"] = [encode_per_second(entry.num_fail_per_sec) for entry in rows]
+    return report
+
+
+def decode_report(
+    report: dict[str, Any], create_histogram: Callable[[], ResponseTimeHistogram]
+) -> tuple[list[StatsEntryDict], StatsEntryDict]:
+    """
+    Decode a report from encode_report into StatsEntry.unserialize compatible dicts for the entries
+    and the total. Histograms with a custom layout are added to histograms from create_histogram.
+    """
+    if report.get("version") != VERSION:
+        raise ValueError(f"Unsupported stats report version {report.get('version')!r} (expected {VERSION})")
+    strings = report["strings"]
+    rows: list[dict[str, Any]] = [
+        {"name": strings[name], "method": strings[method]} for name, method in zip(report["name"], report["method"])
+    ]
+    for field in _FIELDS:
+        for row, value in zip(rows, report[field]):
+            row[field] = value
+    for row, histogram in zip(rows, report["response_times"]):
+        row["response_times"] = decode_histogram(histogram, create_histogram)
+    for row, per_second in zip(rows, report["num_reqs_per_sec"]):
+        row["num_reqs_per_sec"] = decode_per_second(per_second)
+    for row, per_second in zip(rows, report["num_fail_per_sec"]):
+        row["num_fail_per_sec"] = decode_per_second(per_second)
+    *entries, total = rows
+    return entries, total  # type: ignore[return-value]
@@ -0,0 +1,189 @@
+"""
+Shared memory that the worker processes forked by --processes write their stats reports to, so that they don't need
+to be serialized and sent to the master (the parent process) in stats messages.
+
+The memory (an anonymous mmap, inherited by the forked processes) has a slot per worker, and each slot has a few
+buffers. A worker writes a report into a free buffer of its slot, and then sends a stats message that only says which
+buffer it is in. The master reads the report from the buffer when it gets the message, and marks the buffer as free.
+If no buffer is free (or the report doesn't fit), the worker sends the report in the message as usual.
+
+A buffer starts with a header (state, number of rows and length of the data that follows the rows). Each row is a
+StatsEntry (with the total as the last row) in a fixed layout: the counters, followed by the lengths of the name,
+method, histogram layout, histogram and per second counts, which are stored one after another (in the encoding of
+locust.stats_report) after the rows.
+"""
+
+from __future__ import annotations
+
+import math
+import mmap
+import struct
+from typing import TYPE_CHECKING, Any
+
+from .stats_report import decode_histogram, decode_per_second, encode_histogram, encode_per_second
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from .histogram import ResponseTimeHistogram
+    from .stats import StatsEntry, StatsEntryDict
+
+
+BUFFERS_PER_SLOT = 2
+BUFFER_SIZE = 2 * 1024 * 1024
+
+FREE = 0
+READY = 1
+
+_HEADER = struct.Struct("=qqq")
+# num_requests, num_none_requests, num_failures, total_response_time, max_response_time, min_response_time,
+# total_content_length, start_time, last_request_timestamp, histogram layout (if it is a number), first second of
+# num_reqs_per_sec and num_fail_per_sec, and the lengths of the 9 blobs (see _blobs) that are stored after the rows
+_ROW = struct.Struct("=qqqdddqdddqq9q")
+
+
+def _blobs(entry: StatsEntry) -> tuple[list[bytes], float, int, int]:
+    """
+    The name, method, histogram layout (if it is a name), histogram and per second counts of entry, and the
+    histogram layout (if it is a number) and first seconds
+    """
+    layout, keys, counts = encode_histogram(entry.response_times)
+    reqs_first, reqs_seconds, reqs_counts = encode_per_second(entry.num_reqs_per_sec)
+    fails_first, fails_seconds, fails_counts = encode_per_second(entry.num_fail_per_sec)
+    blobs = [
+        entry.name.encode(),
+        entry.method.encode(),
+        layout.encode() if isinstance(layout, str) else b"",
+        keys,
+        counts,
+        reqs_seconds,
+        reqs_counts,
+        fails_seconds,
+        fails_counts,
+    ]
+    return blobs, layout if isinstance(layout, float) else math.nan, reqs_first, fails_first
+
+
+def _number(value: float) -> int | float:
+    # response times are ints unless they are measured with a higher resolution
+    return int(value) if value.is_integer() else value
+
+
+class SharedStats:
+    """The slots of buffers for the stats reports of the forked workers, see the module docstring"""
+
+    def __init__(self, slot_count: int, buffer_size: int = BUFFER_SIZE) -> None:
+        """
+        :param slot_count: Number of workers that will write reports
+        :param buffer_size: Size in bytes of each of the BUFFERS_PER_SLOT buffers of a slot
+        """
+        self.slot_count = slot_count
+        self.buffer_size = buffer_size
+        self.memory = mmap.mmap(-1, slot_count * BUFFERS_PER_SLOT * buffer_size)
+
+    def _offset(self, slot: int, buffer: int) -> int:
+        if not (0 <= slot < self.slot_count and 0 <= buffer < BUFFERS_PER_SLOT):
+            raise ValueError(f"No shared stats buffer {buffer} in slot {slot}")
+        return (slot * BUFFERS_PER_SLOT + buffer) * self.buffer_size
+
+    def write_report(self, slot: int, entries: list[StatsEntry], total: StatsEntry) -> int | None:
+        """
+        Write entries and the total to a free buffer of the slot. Return the index of the buffer, or None if no
+        buffer is free or the report doesn't fit in one.
+        """
+        memory = self.memory
+        for buffer in range(BUFFERS_PER_SLOT):
+            offset = self._offset(slot, buffer)
+            if _HEADER.unpack_from(memory, offset)[0] == FREE:
+                break
+        else:
+            return None
+
+        rows = [*entries, total]
+        row_offset = offset + _HEADER.size
+        data_offset = data_start = row_offset + len(rows) * _ROW.size
+        end = offset + self.buffer_size
+        if data_start > end:
+            return None
+        for entry in rows:
+            blobs, layout, reqs_first, fails_first = _blobs(entry)
+            lengths = [len(blob) for blob in blobs]
+            if data_offset + sum(lengths) > end:
+                return None
+            _ROW.pack_into(
+                memory,
+                row_offset,
+                entry.num_requests,
+                entry.num_none_requests,
+                entry.num_failures,
+                entry.total_response_time,
+                entry.max_response_time,
+                math.nan if entry.min_response_time is None else entry.min_response_time,
+                entry.total_content_length,
+                entry.start_time,
+                math.nan if entry.last_request_timestamp is None else entry.last_request_timestamp,
+                layout,
+                reqs_first,
+                fails_first,
+                *lengths,
+            )
+            row_offset += _ROW.size
+            for blob in blobs:
+                memory[data_offset : data_offset + len(blob)] = blob
+                data_offset += len(blob)
+
+        # the state is written last, so that the buffer isn't read before it is complete
+        _HEADER.pack_into(memory, offset, READY, len(rows), data_offset - data_start)
+        return buffer
+
+    def read_report(
+        self, slot: int, buffer: int, create_histogram: Callable[[], ResponseTimeHistogram]
+    ) -> tuple[list[StatsEntryDict], StatsEntryDict]:
+        """
+        Read the report in a buffer (written by write_report) as StatsEntry.unserialize compatible dicts for the
+        entries and the total, like locust.stats_report.decode_report, and mark the buffer as free.
+        """
+        memory = self.memory
+        offset = self._offset(slot, buffer)
+        state, row_count, _ = _HEADER.unpack_from(memory, offset)
+        if state != READY:
+            raise ValueError(f"No stats report in shared stats buffer {buffer} of slot {slot}")
+
+        rows: list[dict[str, Any]] = []
+        row_offset = offset + _HEADER.size
+        data_offset = row_offset + row_count * _ROW.size
+        for _ in range(row_count):
+            values = _ROW.unpack_from(memory, row_offset)
+            row_offset += _ROW.size
+            blobs = []
+            for length in values[12:]:
+                blobs.append(memory[data_offset : data_offset + length])
+                data_offset += length
+            name, method, layout_name, keys, counts, reqs_seconds, reqs_counts, fails_seconds, fails_counts = blobs
+            min_response_time, last_request_timestamp, layout_number = values[5], values[8], values[9]
+            if layout_name:
+                layout: str | float | None = layout_name.decode()
+            else:
+                layout = None if math.isnan(layout_number) else layout_number
+            rows.append(
+                {
+                    "name": name.decode(),
+                    "method": method.decode(),
+                    "num_requests": values[0],
+                    "num_none_requests": values[1],
+                    "num_failures": values[2],
+                    "total_response_time": _number(values[3]),
+                    "max_response_time": _number(values[4]),
+                    "min_response_time": None if math.isnan(min_response_time) else _number(min_response_time),
+                    "total_content_length": values[6],
+                    "start_time": values[7],
+                    "last_request_timestamp": None if math.isnan(last_request_timestamp) else last_request_timestamp,
+                    "response_times": decode_histogram([layout, keys, counts], create_histogram),
+                    "num_reqs_per_sec": decode_per_second([values[10], reqs_seconds, reqs_counts]),
+                    "num_fail_per_sec": decode_per_second([values[11], fails_seconds, fails_counts]),
+                }
+            )
+
+        _HEADER.pack_into(memory, offset, FREE, 0, 0)
+        *entries, total = rows
+        return entries, total  # type: ignore[return-value]
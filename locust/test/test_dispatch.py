@@ -1,10 +1,17 @@
 from __future__ import annotations
 
 from locust import User
-from locust.dispatch import UsersDispatcher
+from locust.dispatch import (
+    CapacityWeightedUsersDispatcher,
+    MinimalMovementUsersDispatcher,
+    UsersDispatcher,
+    _kl_counts,
+    _kl_generator,
+)
 from locust.runners import WorkerNode
 from locust.test.util import clear_all_functools_lru_cache
 
+import itertools
 import math
 import time
 import unittest
@@ -2110,6 +2117,27 @@ class TestDistributionIsRespectedDuringDispatch(unittest.TestCase):
         self.assertRaises(StopIteration, lambda: next(users_dispatcher))
 
 
+class TestKLCounts(unittest.TestCase):
+    def test_same_counts_as_the_generator(self):
+        for users in [
+            [("A", 5), ("B", 1)],
+            [("A", 1), ("B", 1), ("C", 1)],
+            [("A", 0.1), ("B", 0.25), ("C", 3)],
+            [("A", 97), ("B", 2), ("C", 41), ("D", 0)],
+        ]:
+            for total in [0, 1, 2, 7, 100, 1234]:
+                expected = dict.fromkeys([name for name, _ in users if _ > 0], 0)
+                for name in itertools.islice(_kl_generator(users), total):
+                    expected[name] += 1
+                self.assertDictEqual(expected, _kl_counts(users, total), f"{users} {total}")
+
+    def test_generator_continues_from_counts(self):
+        users = [("A", 5), ("B", 1), ("C", 2)]
+        sequence = list(itertools.islice(_kl_generator(users), 30))
+        counts = _kl_counts(users, 10)
+        self.assertEqual(sequence[10:], list(itertools.islice(_kl_generator(users, counts), 20)))
+
+
 class TestLargeScale(unittest.TestCase):
     # fmt: off
     weights = [
@@ -2133,9 +2161,7 @@ class TestLargeScale(unittest.TestCase):
             users_dispatcher = UsersDispatcher(worker_nodes=workers, user_classes=user_classes)
 
             ts = time.perf_counter()
-            users_on_workers, user_gen, worker_gen, active_users = users_dispatcher._distribute_users(
-                target_user_count=target_user_count
-            )
+            users_on_workers = users_dispatcher._distribute_users(target_user_count=target_user_count)
             delta = time.perf_counter() - ts
 
             # Because tests are run with coverage, the code will be slower.
@@ -2145,6 +2171,23 @@ class TestLargeScale(unittest.TestCase):
 
             self.assertEqual(_user_count(users_on_workers), target_user_count)
 
+    def test_distribute_users_time_does_not_depend_on_user_count(self):
+        for user_classes in [self.weighted_user_classes, self.mixed_users]:
+            workers = [WorkerNode(str(i)) for i in range(1000)]
+            users_dispatcher = UsersDispatcher(worker_nodes=workers, user_classes=user_classes)
+
+            for target_user_count in [1_000, 100_000_000]:
+                ts = time.perf_counter()
+                users_on_workers = users_dispatcher._distribute_users(target_user_count=target_user_count)
+                delta = time.perf_counter() - ts
+                self.assertLessEqual(1000 * delta, 1000)
+
+                self.assertEqual(_user_count(users_on_workers), target_user_count)
+                user_count_on_workers = [
+                    sum(user_classes_count.values()) for user_classes_count in users_on_workers.values()
+                ]
+                self.assertLessEqual(max(user_count_on_workers) - min(user_count_on_workers), 1)
+
     def test_ramp_up_from_0_to_100_000_users_with_50_user_classes_and_1000_workers_and_5000_spawn_rate(self):
         for user_classes in [
             self.weighted_user_classes,
@@ -3928,23 +3971,22 @@ class TestRampUpDifferentUsers(unittest.TestCase):
         self.assertDictEqual(
             dispatched_users,
             {
-                "1": {"User1": 0, "User2": 6, "User3": 1},  # 7
-                "2": {"User1": 0, "User2": 0, "User3": 7},  # 7
-                "3": {"User1": 6, "User2": 0, "User3": 1},  # 7
+                "1": {"User1": 6, "User2": 0, "User3": 1},  # 7
+                "2": {"User1": 0, "User2": 6, "User3": 1},  # 7
+                "3": {"User1": 0, "User2": 0, "User3": 7},  # 7
             },
         )
 
         user_dispatcher.new_dispatch(target_user_count=9, spawn_rate=20, user_classes=[User1, User2, User3])
         dispatched_users = next(user_dispatcher)
 
-        # this is disrespecting the weighting
-
+        # users are removed from the classes that have the most, so the weighting is respected again
         self.assertDictEqual(
             dispatched_users,
             {
-                "1": {"User1": 0, "User2": 2, "User3": 1},
-                "2": {"User1": 0, "User2": 0, "User3": 3},
-                "3": {"User1": 2, "User2": 0, "User3": 1},
+                "1": {"User1": 3, "User2": 0, "User3": 0},
+                "2": {"User1": 0, "User2": 3, "User3": 0},
+                "3": {"User1": 0, "User2": 0, "User3": 3},
             },
         )
 
@@ -4157,6 +4199,182 @@ class TestFloatWeithts(unittest.TestCase):
                     self.assertDictEqual(x, next(users_dispatcher))
 
 
+class TestMinimalMovementUsersDispatcher(unittest.TestCase):
+    class User1(User):
+        weight = 1
+
+    class User2(User):
+        weight = 2
+
+    class User3(User):
+        fixed_count = 3
+
+    user_classes = [User1, User2, User3]
+
+    def _ramp_up(self, dispatcher_class, worker_nodes, target_user_count):
+        users_dispatcher = dispatcher_class(worker_nodes=worker_nodes, user_classes=self.user_classes)
+        users_dispatcher.new_dispatch(target_user_count=target_user_count, spawn_rate=target_user_count)
+        users_dispatcher._wait_between_dispatch = 0
+        return users_dispatcher, list(users_dispatcher)[-1]
+
+    def _assert_balanced(self, dispatched_users, user_count):
+        self.assertEqual(user_count, _user_count(dispatched_users))
+        user_count_on_workers = [sum(user_classes_count.values()) for user_classes_count in dispatched_users.values()]
+        self.assertLessEqual(max(user_count_on_workers) - min(user_count_on_workers), 1)
+
+    def test_add_worker_moves_only_the_surplus(self):
+        moved = {}
+        for dispatcher_class in [UsersDispatcher, MinimalMovementUsersDispatcher]:
+            worker_nodes = [WorkerNode(str(i + 1)) for i in range(3)]
+            users_dispatcher, before = self._ramp_up(dispatcher_class, worker_nodes, 300)
+
+            users_dispatcher.add_worker(WorkerNode("4"))
+            users_dispatcher.new_dispatch(target_user_count=300, spawn_rate=300)
+            after = next(users_dispatcher)
+            self._assert_balanced(after, 300)
+            self.assertDictEqual(_aggregate_dispatched_users(before), _aggregate_dispatched_users(after))
+            moved[dispatcher_class] = _moved_user_count(before, after)
+
+        # the new worker gets 75 users, and that is all that moves
+        self.assertEqual(75, moved[MinimalMovementUsersDispatcher])
+        self.assertLess(moved[MinimalMovementUsersDispatcher], moved[UsersDispatcher])
+
+    def test_remove_worker_moves_only_its_users(self):
+        worker_nodes = [WorkerNode(str(i + 1)) for i in range(4)]
+        users_dispatcher, before = self._ramp_up(MinimalMovementUsersDispatcher, worker_nodes, 103)
+
+        users_dispatcher.remove_worker(worker_nodes[1])
+        users_dispatcher.new_dispatch(target_user_count=103, spawn_rate=103)
+        after = next(users_dispatcher)
+        self._assert_balanced(after, 103)
+        self.assertDictEqual(_aggregate_dispatched_users(before), _aggregate_dispatched_users(after))
+        self.assertEqual(_user_count_on_worker(before, "2"), _moved_user_count(before, after))
+        for worker_node_id in ["1", "3", "4"]:
+            for user_class_name, count in before[worker_node_id].items():
+                self.assertGreaterEqual(after[worker_node_id][user_class_name], count)
+
+    def test_ramp_continues_balanced_after_rebalance(self):
+        worker_nodes = [WorkerNode(str(i + 1)) for i in range(3)]
+        users_dispatcher, _ = self._ramp_up(MinimalMovementUsersDispatcher, worker_nodes, 31)
+        users_dispatcher.add_worker(WorkerNode("4"))
+        users_dispatcher.new_dispatch(target_user_count=61, spawn_rate=1)
+        users_dispatcher._wait_between_dispatch = 0
+        self._assert_balanced(next(users_dispatcher), 31)
+
+        for user_count, dispatched_users in enumerate(users_dispatcher, start=32):
+            self._assert_balanced(dispatched_users, user_count)
+        self.assertEqual(3, _aggregate_dispatched_users(dispatched_users)["User3"])
+
+        users_dispatcher.new_dispatch(target_user_count=20, spawn_rate=7)
+        users_dispatcher._wait_between_dispatch = 0
+        for dispatched_users in users_dispatcher:
+            self._assert_balanced(dispatched_users, _user_count(dispatched_users))
+        self.assertEqual(20, _user_count(dispatched_users))
+
+
+class TestCapacityWeightedUsersDispatcher(unittest.TestCase):
+    class User1(User):
+        weight = 1
+
+    class User2(User):
+        weight = 2
+
+    class User3(User):
+        fixed_count = 3
+
+    user_classes = [User1, User2, User3]
+
+    def _worker_nodes(self, *capacities):
+        worker_nodes = []
+        for i, capacity in enumerate(capacities):
+            worker_node = WorkerNode(str(i + 1))
+            worker_node.capacity = capacity
+            worker_nodes.append(worker_node)
+        return worker_nodes
+
+    def _assert_proportional(self, users_dispatcher, dispatched_users, user_count):
+        self.assertEqual(user_count, _user_count(dispatched_users))
+        capacities = {w.id: users_dispatcher._capacity(w) for w in users_dispatcher._worker_nodes}
+        for worker_node_id, capacity in capacities.items():
+            share = user_count * capacity / sum(capacities.values())
+            self.assertLess(abs(_user_count_on_worker(dispatched_users, worker_node_id) - share), 1)
+
+    def test_ramp_up_and_down_in_proportion_to_capacity(self):
+        users_dispatcher = CapacityWeightedUsersDispatcher(
+            worker_nodes=self._worker_nodes(2, 16, 4), user_classes=self.user_classes
+        )
+        users_dispatcher.new_dispatch(target_user_count=110, spawn_rate=1)
+        users_dispatcher._wait_between_dispatch = 0
+        for user_count, dispatched_users in enumerate(users_dispatcher, start=1):
+            self._assert_proportional(users_dispatcher, dispatched_users, user_count)
+        self.assertDictEqual({"1": 10, "2": 80, "3": 20}, {k: sum(v.values()) for k, v in dispatched_users.items()})
+        self.assertDictEqual({"User1": 36, "User2": 71, "User3": 3}, _aggregate_dispatched_users(dispatched_users))
+
+        users_dispatcher.new_dispatch(target_user_count=0, spawn_rate=1)
+        users_dispatcher._wait_between_dispatch = 0
+        for user_count, dispatched_users in enumerate(users_dispatcher):
+            self._assert_proportional(users_dispatcher, dispatched_users, 109 - user_count)
+
+    def test_equal_capacities_dispatch_like_users_dispatcher(self):
+        dispatched = []
+        for dispatcher_class in [UsersDispatcher, CapacityWeightedUsersDispatcher]:
+            users_dispatcher = dispatcher_class(
+                worker_nodes=self._worker_nodes(1, 1, 1), user_classes=self.user_classes
+            )
+            users_dispatcher.new_dispatch(target_user_count=50, spawn_rate=7)
+            users_dispatcher._wait_between_dispatch = 0
+            dispatched.append([{k: sum(v.values()) for k, v in d.items()} for d in users_dispatcher])
+        self.assertListEqual(dispatched[0], dispatched[1])
+
+    def test_rebalance_when_a_worker_is_added(self):
+        users_dispatcher = CapacityWeightedUsersDispatcher(
+            worker_nodes=self._worker_nodes(1, 3), user_classes=self.user_classes
+        )
+        users_dispatcher.new_dispatch(target_user_count=100, spawn_rate=100)
+        users_dispatcher._wait_between_dispatch = 0
+        before = list(users_dispatcher)[-1]
+
+        worker_node = WorkerNode("3")
+        worker_node.capacity = 4
+        users_dispatcher.add_worker(worker_node)
+        users_dispatcher.new_dispatch(target_user_count=100, spawn_rate=100)
+        after = next(users_dispatcher)
+        self.assertDictEqual({"1": 13, "2": 37, "3": 50}, {k: sum(v.values()) for k, v in after.items()})
+        self.assertDictEqual(_aggregate_dispatched_users(before), _aggregate_dispatched_users(after))
+
+        # the ramp continues in proportion
+        users_dispatcher.new_dispatch(target_user_count=120, spawn_rate=1)
+        users_dispatcher._wait_between_dispatch = 0
+        for user_count, dispatched_users in enumerate(users_dispatcher, start=101):
+            self._assert_proportional(users_dispatcher, dispatched_users, user_count)
+
+    def test_worker_overloaded_moves_users_away(self):
+        worker_nodes = self._worker_nodes(1, 1)
+        users_dispatcher = CapacityWeightedUsersDispatcher(worker_nodes=worker_nodes, user_classes=self.user_classes)
+        users_dispatcher.new_dispatch(target_user_count=100, spawn_rate=100)
+        users_dispatcher._wait_between_dispatch = 0
+        list(users_dispatcher)
+
+        self.assertTrue(users_dispatcher.worker_overloaded(worker_nodes[0]))
+        users_dispatcher.new_dispatch(target_user_count=100, spawn_rate=100)
+        after = next(users_dispatcher)
+        # 0.8 / 1.8 of the users
+        self.assertDictEqual({"1": 44, "2": 56}, {k: sum(v.values()) for k, v in after.items()})
+
+        users_dispatcher.overloaded_capacity_factor = None
+        self.assertFalse(users_dispatcher.worker_overloaded(worker_nodes[0]))
+        self.assertFalse(UsersDispatcher(worker_nodes, self.user_classes).worker_overloaded(worker_nodes[0]))
+
+
+def _moved_user_count(before: dict[str, dict[str, int]], after: dict[str, dict[str, int]]) -> int:
+    """The number of users that were stopped on a worker (to be started on another)"""
+    return sum(
+        max(0, count - after.get(worker_node_id, {}).get(user_class_name, 0))
+        for worker_node_id, user_classes_count in before.items()
+        for user_class_name, count in user_classes_count.items()
+    )
+
+
 def _aggregate_dispatched_users(d: dict[str, dict[str, int]]) -> dict[str, int]:
     user_classes = list(next(iter(d.values())).keys())
     return {u: sum(d[u] for d in d.values()) for u in user_classes}
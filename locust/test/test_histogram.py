@@ -0,0 +1,250 @@
+from locust.histogram import (
+    BUCKET_KEYS,
+    HIGH_RESOLUTION_BUCKET_KEYS,
+    DictHistogram,
+    HighResolutionHistogram,
+    LogLinearHistogram,
+    SketchHistogram,
+    WindowedHistogram,
+    bucket_index,
+    histogram_for_layout,
+    unserialize_histogram,
+)
+from locust.stats import bucket_response_time, calculate_response_time_percentile, median_from_dict
+
+import random
+import unittest
+from copy import copy
+
+
+class TestLogLinearHistogram(unittest.TestCase):
+    def test_bucket_index_matches_default_bucketing(self):
+        for response_time in [0, 1, 1.4, 1.5, 45, 99, 99.9, 100, 147, 995, 999, 1000, 3432, 9999, 10000, 58760]:
+            self.assertEqual(
+                bucket_response_time(response_time),
+                BUCKET_KEYS[bucket_index(response_time)],
+                f"response_time={response_time}",
+            )
+
+    def test_bucket_index_above_100_seconds(self):
+        # the buckets are 10 s wide instead of the 1 s that bucket_response_time rounds to
+        self.assertEqual(120_000, BUCKET_KEYS[bucket_index(123_456)])
+        self.assertEqual(123_000, bucket_response_time(123_456))
+        for response_time in [99_499, 99_500, 100_000, 123_456, 604_999, 999_999, 3_600_000, 86_400_000]:
+            key = BUCKET_KEYS[bucket_index(response_time)]
+            self.assertLessEqual(
+                abs(key - bucket_response_time(response_time)), 0.05 * response_time, f"response_time={response_time}"
+            )
+
+    def test_bucket_index_clamps(self):
+        self.assertEqual(0, bucket_index(-5))
+        self.assertEqual(len(BUCKET_KEYS) - 1, bucket_index(10**12))
+
+    def test_behaves_like_a_dict(self):
+        h = LogLinearHistogram()
+        h.add(147)
+        h.add(150)
+        h.add(3432)
+        self.assertEqual({150: 2, 3400: 1}, h)
+        self.assertEqual({150: 2, 3400: 1}, h.to_dict())
+        self.assertIn(150, h)
+        self.assertNotIn(147, h)
+        self.assertEqual(0, h[20])
+        self.assertEqual(2, len(h))
+        self.assertEqual(3, h.total)
+        h[150] = 5
+        self.assertEqual(6, h.total)
+        del h[150]
+        self.assertEqual({3400: 1}, h)
+        self.assertFalse(LogLinearHistogram())
+
+    def test_percentile_and_median_match_dict_implementation(self):
+        rng = random.Random(1)
+        h = LogLinearHistogram()
+        d = DictHistogram(bucket_response_time)
+        for _ in range(5000):
+            response_time = rng.expovariate(1 / 300)
+            h.add(response_time)
+            d.add(response_time)
+        self.assertEqual(d.to_dict(), h.to_dict())
+        for percent in [0.0, 0.1, 0.5, 0.9, 0.99, 0.999, 1.0]:
+            self.assertEqual(
+                calculate_response_time_percentile(d.to_dict(), 5000, percent),
+                h.percentile(5000, percent),
+            )
+        self.assertEqual(median_from_dict(5000, d.to_dict()), h.median(5000))
+
+        percents = [0.99, 0.5, 1.0, 0.0, 0.9]
+        self.assertEqual([h.percentile(5000, p) for p in percents], h.percentiles(5000, percents))
+        self.assertEqual(h.percentiles(5000, percents), d.percentiles(5000, percents))
+
+    def test_merge(self):
+        a = LogLinearHistogram()
+        b = LogLinearHistogram()
+        a.add(5)
+        b.add(5)
+        b.add(12345)
+        a.merge(b)
+        self.assertEqual({5: 2, 12000: 1}, a)
+        self.assertEqual(3, a.total)
+
+        # worker reports contain plain dicts
+        a.merge({5: 1, 150: 2})
+        self.assertEqual({5: 3, 150: 2, 12000: 1}, a)
+        self.assertEqual(6, a.total)
+
+    def test_copy_is_independent(self):
+        a = LogLinearHistogram()
+        a.add(10)
+        b = copy(a)
+        b.add(10)
+        self.assertEqual({10: 1}, a)
+        self.assertEqual({10: 2}, b)
+
+
+class TestHighResolutionHistogram(unittest.TestCase):
+    def test_keys_are_microseconds(self):
+        h = HighResolutionHistogram()
+        for response_time in [0.0123, 0.1234, 1.234, 12.34, 147, 3432]:
+            h.add(response_time)
+        self.assertEqual({0.012: 1, 0.12: 1, 1.2: 1, 12: 1, 150: 1, 3400: 1}, h)
+        self.assertEqual([0.12, 3400], h.percentiles(6, [0.2, 1.0]))
+        self.assertEqual(len(HIGH_RESOLUTION_BUCKET_KEYS) - 1, h._bucket_index(10**12))
+        self.assertEqual(
+            list(range(len(HIGH_RESOLUTION_BUCKET_KEYS))),
+            [h._bucket_index(key) for key in HIGH_RESOLUTION_BUCKET_KEYS],
+        )
+
+    def test_merge_with_default_histogram(self):
+        h = HighResolutionHistogram()
+        h.add(0.25)
+        h.add(147)
+        low = LogLinearHistogram()
+        low.merge(h)
+        self.assertEqual({0: 1, 150: 1}, low)
+        h.merge(low)
+        self.assertEqual({0: 1, 0.25: 1, 150: 2}, h)
+
+
+class TestHistogramLayouts(unittest.TestCase):
+    def test_buckets_round_trip(self):
+        for histogram in [LogLinearHistogram(), HighResolutionHistogram(), SketchHistogram(0.01)]:
+            for response_time in [0.25, 5, 147, 3432, 58760]:
+                histogram.add(response_time)
+            copy = histogram_for_layout(histogram.layout)
+            self.assertIs(type(histogram), type(copy))
+            copy.add_buckets(*histogram.buckets())
+            self.assertEqual(histogram, copy)
+            self.assertEqual(histogram.total, copy.total)
+
+    def test_unknown_layout(self):
+        self.assertRaises(ValueError, histogram_for_layout, "unknown")
+
+
+class TestSketchHistogram(unittest.TestCase):
+    def test_percentiles_are_within_relative_accuracy(self):
+        rng = random.Random(2)
+        distributions = {
+            "wide": [rng.lognormvariate(5, 2) for _ in range(20000)],
+            "sub-millisecond": [rng.lognormvariate(-3, 1) for _ in range(20000)],
+            "tens to hundreds of ms": [rng.uniform(10, 300) for _ in range(20000)],
+        }
+        for name, response_times in distributions.items():
+            response_times.sort()
+            for relative_accuracy in [0.05, 0.01, 0.002]:
+                h = SketchHistogram(relative_accuracy)
+                for response_time in response_times:
+                    h.add(response_time)
+                for percent in [0.1, 0.5, 0.9, 0.99, 0.999]:
+                    actual = response_times[int(20000 * percent)]
+                    estimate = h.percentile(20000, percent)
+                    self.assertLessEqual(
+                        abs(estimate - actual) / actual, relative_accuracy, f"{name} a={relative_accuracy} p{percent}"
+                    )
+
+    def test_every_response_time_is_within_relative_accuracy_of_its_key(self):
+        for relative_accuracy in [0.05, 0.01]:
+            h = SketchHistogram(relative_accuracy)
+            response_time = 0.001
+            while response_time < 10**6:
+                key = h._bucket_keys[h._bucket_index(response_time)]
+                # (plus floating point rounding, for response times right at the edge of a bucket)
+                error = abs(key - response_time) / response_time
+                self.assertLessEqual(error, relative_accuracy + 1e-12, response_time)
+                response_time *= 1.003
+            self.assertEqual(0, h._bucket_keys[h._bucket_index(0)])
+
+    def test_keys_are_unique_and_map_back_to_their_bucket(self):
+        for relative_accuracy in [0.5, 0.1, 0.01, 0.001]:
+            h = SketchHistogram(relative_accuracy)
+            keys = h._bucket_keys
+            self.assertEqual(len(keys), len(set(keys)))
+            self.assertEqual(list(range(len(keys))), [h._bucket_index(key) for key in keys])
+
+    def test_invalid_relative_accuracy(self):
+        self.assertRaises(ValueError, SketchHistogram, 0)
+        self.assertRaises(ValueError, SketchHistogram, 1)
+
+    def test_merge(self):
+        a = SketchHistogram(0.01)
+        b = SketchHistogram(0.01)
+        a.add(5)
+        b.add(5)
+        b.add(12345)
+        a.merge(b)
+        self.assertEqual(3, a.total)
+        low, median, high = a.percentiles(3, [0.0, 0.5, 1.0])
+        self.assertEqual(low, median)
+        self.assertAlmostEqual(5, median, delta=5 * 0.01)
+        self.assertEqual(2, a[median])
+        self.assertAlmostEqual(12345, high, delta=12345 * 0.01)
+
+        # histograms with other layouts are re-bucketed
+        c = SketchHistogram(0.05)
+        c.merge(a)
+        c.merge({150: 2})
+        self.assertEqual(5, c.total)
+        self.assertAlmostEqual(150, c.percentile(5, 0.5), delta=150 * 0.05)
+        d = LogLinearHistogram()
+        d.merge(a)
+        self.assertEqual({5: 2, 12000: 1}, d)
+
+    def test_serialize(self):
+        h = SketchHistogram(0.01)
+        for response_time in [150, 151, 160, 3432]:
+            h.add(response_time)
+        data = h.serialize()
+        self.assertEqual(0.01, data[0])
+        # only the buckets from the first non-empty one are included, without keys
+        self.assertEqual(h._bucket_index(150), data[1])
+        self.assertEqual(h._bucket_index(3432) - h._bucket_index(150) + 3, len(data))
+
+        restored = unserialize_histogram(data)
+        self.assertIsInstance(restored, SketchHistogram)
+        self.assertEqual(h, restored)
+        self.assertEqual(4, restored.total)
+        self.assertEqual([0.01, 0], SketchHistogram(0.01).serialize())
+        self.assertEqual({150: 1}, unserialize_histogram({150: 1}))
+
+
+class TestWindowedHistogram(unittest.TestCase):
+    def test_window_sum_follows_the_window(self):
+        window = WindowedHistogram(10, LogLinearHistogram)
+        window.add(100, 5)
+        window.add(101, 7)
+        window.merge(105, {150: 2})
+        self.assertEqual({5: 1, 7: 1, 150: 2}, window.histogram)
+        self.assertEqual([5, 150], window.percentiles(109, [0.0, 1.0]))
+        # second 100 is now outside the window
+        self.assertEqual([7, 150], window.percentiles(110, [0.0, 1.0]))
+        # reusing the slot of second 101 expires it as well
+        window.add(111, 9)
+        self.assertEqual({9: 1, 150: 2}, window.histogram)
+        self.assertEqual(3, window.histogram.total)
+        self.assertEqual(111, window.last_update)
+
+    def test_data_older_than_the_window_is_dropped(self):
+        window = WindowedHistogram(10, lambda: DictHistogram(bucket_response_time))
+        window.add(120, 5)
+        window.add(110, 6)
+        self.assertEqual({5: 1}, window.histogram)
@@ -1426,6 +1426,38 @@ class SecondUser(HttpUser):
                 p.close()
                 proc.not_expect_any("Traceback")
 
+    def test_distributed_with_aggregator(self):
+        LOCUSTFILE_CONTENT = textwrap.dedent(
+            """
+            from locust import User, task, constant
+
+            class User1(User):
+                wait_time = constant(1)
+
+                @task
+                def t(self):
+                    pass
+            """
+        )
+        aggregator_port = get_free_tcp_port()
+        with mock_locustfile(content=LOCUSTFILE_CONTENT) as mocked:
+            proc = TestProcess(
+                f"locust -f {mocked.file_path} --headless --master --expect-workers 1 -u 4 -r 99 -t 2",
+                sigint_on_exit=False,
+            )
+            proc_aggregator = TestProcess(
+                f"locust -f - --aggregator --master-bind-port {aggregator_port}", sigint_on_exit=False
+            )
+            proc_worker = TestProcess(f"locust -f - --worker --master-port {aggregator_port}", sigint_on_exit=False)
+            proc_worker_2 = TestProcess(f"locust -f - --worker --master-port {aggregator_port}", sigint_on_exit=False)
+
+            proc.expect('All users spawned: {"User1": 4} (4 total users)')
+            proc.expect("Shutting down (exit code 0)")
+
+            for p in [proc, proc_aggregator, proc_worker, proc_worker_2]:
+                p.close()
+                p.not_expect_any("Traceback")
+
     def test_locustfile_distribution_with_workers_started_first(self):
         LOCUSTFILE_CONTENT = textwrap.dedent(
             """
@@ -30,6 +30,37 @@ class TestParser(unittest.TestCase):
         opts = self.parser.parse_args(args)
         self.assertEqual(opts.reset_stats, True)
 
+    def test_percentile_sketch(self):
+        self.assertIsNone(self.parser.parse_args([]).percentile_sketch)
+        opts = self.parser.parse_args(["--percentile-sketch", "0.01"])
+        self.assertEqual(0.01, opts.percentile_sketch)
+
+    def test_stats_batch_size(self):
+        self.assertEqual(0, self.parser.parse_args([]).stats_batch_size)
+        self.assertEqual(1000, self.parser.parse_args(["--stats-batch-size", "1000"]).stats_batch_size)
+
+    def test_max_errors(self):
+        self.assertIsNone(self.parser.parse_args([]).max_errors)
+        self.assertEqual(1000, self.parser.parse_args(["--max-errors", "1000"]).max_errors)
+
+    def test_template_errors(self):
+        self.assertFalse(self.parser.parse_args([]).template_errors)
+        self.assertTrue(self.parser.parse_args(["--template-errors"]).template_errors)
+
+    def test_compact_stats_reports(self):
+        self.assertFalse(self.parser.parse_args([]).compact_stats_reports)
+        self.assertTrue(self.parser.parse_args(["--compact-stats-reports"]).compact_stats_reports)
+
+    def test_aggregator(self):
+        options = self.parser.parse_args(["--aggregator", "--master-port", "5557", "--master-bind-port", "5558"])
+        self.assertTrue(options.aggregator)
+        self.assertEqual(5557, options.master_port)
+        self.assertEqual(5558, options.master_bind_port)
+
+    def test_high_resolution(self):
+        self.assertFalse(self.parser.parse_args([]).high_resolution)
+        self.assertTrue(self.parser.parse_args(["--high-resolution"]).high_resolution)
+
     def test_skip_log_setup(self):
         args = ["--skip-log-setup"]
         opts = self.parser.parse_args(args)
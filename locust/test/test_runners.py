@@ -3,19 +3,30 @@ from __future__ import annotations
 import locust
 from locust import LoadTestShape, __version__, constant, runners
 from locust.argument_parser import get_parser
-from locust.dispatch import UsersDispatcher
+from locust.dispatch import CapacityWeightedUsersDispatcher, UsersDispatcher
 from locust.env import Environment
 from locust.exception import RPCError, RPCReceiveError, StopUser
 from locust.log import LogReader
 from locust.main import create_environment
 from locust.rpc import Message
+from locust.rpc.protocol import (
+    COMPRESSION_THRESHOLD,
+    COMPRESSORS,
+    LEGACY_PROTOCOL_VERSION,
+    PROTOCOL_VERSION,
+    CompressionStats,
+)
 from locust.runners import (
+    MASTER_RECEIVE_BATCH_SIZE,
+    MAX_WORKER_REPORT_INTERVAL,
     STATE_INIT,
     STATE_MISSING,
     STATE_RUNNING,
     STATE_SPAWNING,
     STATE_STOPPED,
     STATE_STOPPING,
+    WORKER_REPORT_INTERVAL,
+    AggregatorRunner,
     LocalRunner,
     WorkerNode,
     WorkerRunner,
@@ -23,6 +34,7 @@ from locust.runners import (
 from locust.stats import RequestStats
 from locust.user import TaskSet, User, task
 
+import datetime
 import json
 import logging
 import random
@@ -55,7 +67,8 @@ def mocked_rpc(raise_on_close=True):
         raise_error_on_close = raise_on_close
 
         def __init__(self, *args, **kwargs):
-            pass
+            self.protocol_versions = {}
+            self.compressions = {}
 
         @classmethod
         def mocked_send(cls, message):
@@ -79,6 +92,9 @@ def mocked_rpc(raise_on_close=True):
         def get_messages(cls, message_type=None) -> list:
             return [message for message in cls.outbox if message_type is None or message.type == message_type]
 
+        def poll(self, timeout=0):
+            return not self.queue.empty()
+
         def recv_from_client(self):
             results = self.queue.get()
             msg = Message.unserialize(results)
@@ -101,6 +117,15 @@ def mocked_rpc(raise_on_close=True):
     return MockedRpcServerClient
 
 
+def spawned_user_count(server) -> int:
+    """The number of users the spawn messages in the outbox of a mocked server add up to on the workers"""
+    # spawn messages only contain the user counts that changed since the last one sent to the worker
+    user_classes_count_by_worker: dict[str, dict[str, int]] = defaultdict(dict)
+    for msg in server.get_messages("spawn"):
+        user_classes_count_by_worker[msg.node_id].update(msg.data["user_classes_count"])
+    return sum(sum(user_classes_count.values()) for user_classes_count in user_classes_count_by_worker.values())
+
+
 class mocked_options:
     def __init__(self):
         self.spawn_rate = 5
@@ -217,6 +242,42 @@ class TestLocustRunner(LocustRunnerTestCase):
         self.assertTrue(g2.dead)
         self.assertTrue(triggered[0])
 
+    def test_user_classes_count_follows_spawned_and_exited_users(self):
+        stop_user2 = [False]
+
+        class MyUser1(User):
+            wait_time = constant(1)
+
+            @task
+            def my_task(self):
+                pass
+
+        class MyUser2(User):
+            wait_time = constant(0.01)
+
+            @task
+            def my_task(self):
+                if stop_user2[0]:
+                    raise StopUser()
+
+        runner = Environment(user_classes=[MyUser1, MyUser2]).create_local_runner()
+        users = runner.spawn_users({"MyUser1": 3, "MyUser2": 2})
+        self.assertEqual({"MyUser1": 3, "MyUser2": 2}, runner.user_classes_count)
+
+        runner.stop_users({"MyUser1": 2})
+        self.assertEqual({"MyUser1": 1, "MyUser2": 2}, runner.user_classes_count)
+        # the most recently spawned users are stopped first
+        self.assertFalse(users[0].greenlet.dead)
+        self.assertTrue(users[1].greenlet.dead)
+        self.assertTrue(users[2].greenlet.dead)
+
+        # users that exit by themselves are no longer counted either
+        stop_user2[0] = True
+        sleep(0.1)
+        self.assertEqual({"MyUser1": 1, "MyUser2": 0}, runner.user_classes_count)
+        self.assertEqual(1, runner.user_count)
+        runner.quit()
+
     def test_start_event(self):
         class MyUser(User):
             wait_time = constant(2)
@@ -989,6 +1050,92 @@ class TestMasterWorkerRunners(LocustTestCase):
             "For some reason the master node's stats has not come in",
         )
 
+    def test_distributed_integration_run_with_aggregators(self):
+        """
+        Full integration test with a MasterRunner, two AggregatorRunners and two WorkerRunners per aggregator
+        """
+
+        class TestUser(User):
+            wait_time = constant(0.1)
+
+            @task
+            def incr_stats(self):
+                self.environment.events.request.fire(
+                    request_type="GET",
+                    name="/",
+                    response_time=1337,
+                    response_length=666,
+                    exception=None,
+                    context={},
+                )
+
+        with mock.patch("locust.runners.WORKER_REPORT_INTERVAL", new=0.3):
+            master_env = Environment(user_classes=[TestUser])
+            master = master_env.create_master_runner("*", 0)
+            sleep(0)
+            aggregators: list[AggregatorRunner] = []
+            workers: list[WorkerRunner] = []
+            for i in range(2):
+                aggregator_env = Environment(user_classes=[TestUser])
+                aggregator = aggregator_env.create_aggregator_runner("127.0.0.1", master.server.port, "*", 0)
+                aggregators.append(aggregator)
+                for j in range(2):
+                    worker_env = Environment(user_classes=[TestUser])
+                    workers.append(worker_env.create_worker_runner("127.0.0.1", aggregator.server.port))
+
+            sleep(0.1)
+            # the master only knows about the aggregators
+            self.assertEqual(2, len(master.clients))
+            self.assertEqual({a.client_id for a in aggregators}, set(master.clients))
+            for aggregator in aggregators:
+                self.assertEqual(2, len(aggregator.clients))
+
+            master.start(8, spawn_rate=1000)
+            sleep(0.5)
+            for worker in workers:
+                self.assertEqual(2, worker.user_count)
+            for aggregator in aggregators:
+                self.assertEqual(4, aggregator.user_count)
+                self.assertEqual(STATE_RUNNING, master.clients[aggregator.client_id].state)
+            self.assertEqual(8, master.user_count)
+
+            # give time for users to generate stats, and stats to be sent to master (through the aggregators)
+            sleep(1)
+            master.quit()
+
+            for worker in workers:
+                self.assertEqual(0, worker.user_count)
+
+        self.assertGreater(
+            master_env.runner.stats.total.num_requests,
+            20,
+            "For some reason the master node's stats has not come in",
+        )
+
+    def test_split_user_classes_count(self):
+        split = runners._split_user_classes_count({"A": 5, "B": 1, "C": 3}, ["w1", "w2", "w3"])
+        self.assertEqual(
+            {
+                "w1": {"A": 2, "B": 0, "C": 1},
+                "w2": {"A": 2, "B": 0, "C": 1},
+                "w3": {"A": 1, "B": 1, "C": 1},
+            },
+            split,
+        )
+        split = runners._split_user_classes_count({"A": 1, "B": 1, "C": 1}, ["w1", "w2", "w3"])
+        self.assertEqual([1, 1, 1], [sum(counts.values()) for counts in split.values()])
+
+    def test_ramp_steps(self):
+        self.assertEqual([("A", 1), ("B", -1), ("A", 1)], runners._ramp_steps({"A": 2, "B": -1}))
+        self.assertEqual([], runners._ramp_steps({"A": 0}))
+        steps = runners._ramp_steps({"A": 30, "B": 10, "C": -5})
+        self.assertEqual(45, len(steps))
+        # the classes are spread out over the ramp
+        first_half = steps[: len(steps) // 2]
+        self.assertEqual(15, first_half.count(("A", 1)))
+        self.assertEqual(5, first_half.count(("B", 1)))
+        self.assertEqual(2, first_half.count(("C", -1)))
+
     def test_distributed_rebalanced_integration_run(self):
         """
         Full integration test that starts both a MasterRunner and three WorkerRunner instances
@@ -2140,7 +2287,11 @@ class TestMasterWorkerRunners(LocustTestCase):
             def noop(self) -> None:
                 pass
 
-        with mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=1):
+        # no stats are reported during the test, so that no heartbeat is sent with them and left unanswered
+        with (
+            mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=1),
+            mock.patch("locust.runners.WORKER_REPORT_INTERVAL", new=10),
+        ):
             # start a Master runner
             master_env = Environment(user_classes=[TestUser])
             worker_connect_events = []
@@ -2319,6 +2470,62 @@ class TestMasterRunner(LocustRunnerTestCase):
             self.assertEqual(3, len(master.clients))
             self.assertEqual(1, len(self.mocked_log.warning))
 
+    def test_protocol_version_is_offered_in_ack_and_accepted_in_a_heartbeat(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            for client_id in ["new", "old", "newer"]:
+                server.mocked_send(Message("client_ready", __version__, client_id))
+            self.assertListEqual([PROTOCOL_VERSION] * 3, [msg.data["protocol"] for msg in server.get_messages("ack")])
+            self.assertDictEqual(
+                dict.fromkeys(["new", "old", "newer"], LEGACY_PROTOCOL_VERSION), master.server.protocol_versions
+            )
+
+            heartbeat = {"state": STATE_INIT, "current_cpu_usage": 0, "current_memory_usage": 0}
+            server.mocked_send(Message("heartbeat", {**heartbeat, "protocol": PROTOCOL_VERSION}, "new"))
+            server.mocked_send(Message("heartbeat", heartbeat, "old"))
+            server.mocked_send(Message("heartbeat", {**heartbeat, "protocol": PROTOCOL_VERSION + 1}, "newer"))
+            self.assertDictEqual(
+                {"new": PROTOCOL_VERSION, "old": LEGACY_PROTOCOL_VERSION, "newer": PROTOCOL_VERSION},
+                master.server.protocol_versions,
+            )
+            # the replies tell the workers that accepted it that the master has switched
+            self.assertListEqual(
+                [PROTOCOL_VERSION, None, PROTOCOL_VERSION],
+                [msg.data.get("protocol") for msg in server.get_messages("heartbeat")],
+            )
+
+            # a worker that connects again starts over with the legacy encoding
+            server.mocked_send(Message("client_ready", __version__, "new"))
+            self.assertEqual(LEGACY_PROTOCOL_VERSION, master.server.protocol_versions["new"])
+
+    def test_rpc_compression_is_offered_in_ack_and_accepted_in_a_heartbeat(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            self.environment.parsed_options = get_parser().parse_args(["--rpc-compression"])
+            master = self.get_runner()
+            heartbeat = {"state": STATE_INIT, "current_cpu_usage": 0, "current_memory_usage": 0}
+            for client_id, compression in [("zlib", "zlib"), ("other", None)]:
+                server.mocked_send(Message("client_ready", __version__, client_id))
+                self.assertIsNone(master.server.compressions[client_id])
+                data = {**heartbeat, "protocol": PROTOCOL_VERSION, "compression": compression}
+                server.mocked_send(Message("heartbeat", data, client_id))
+            server.mocked_send(Message("client_ready", __version__, "old"))
+            server.mocked_send(Message("heartbeat", heartbeat, "old"))
+            self.assertDictEqual({"zlib": "zlib", "other": None, "old": None}, master.server.compressions)
+            self.assertListEqual(
+                [list(COMPRESSORS)] * 3, [msg.data["compression"] for msg in server.get_messages("ack")]
+            )
+
+    def test_rpc_compression_is_disabled_by_default(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(Message("client_ready", __version__, "zlib"))
+            self.assertNotIn("compression", server.get_messages("ack")[0].data)
+            heartbeat = {"state": STATE_INIT, "current_cpu_usage": 0, "current_memory_usage": 0}
+            server.mocked_send(
+                Message("heartbeat", {**heartbeat, "protocol": PROTOCOL_VERSION, "compression": "zlib"}, "zlib")
+            )
+            self.assertDictEqual({"zlib": None}, master.server.compressions)
+
     def test_worker_stats_report_median(self):
         with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
             master = self.get_runner()
@@ -2370,6 +2577,104 @@ class TestMasterRunner(LocustRunnerTestCase):
             # print(master.clients['fake_client'].__dict__)
             assert master.clients["fake_client"].state == STATE_MISSING
 
+    def test_master_handles_waiting_messages_together(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(Message("client_ready", __version__, "fake_client1"))
+            server.mocked_send(Message("client_ready", __version__, "fake_client2"))
+            self.assertEqual(2, len(master.clients))
+
+            with mock.patch.object(master, "check_stopped", wraps=master.check_stopped) as check_stopped:
+                # queue the messages without yielding, so that they are all waiting when the master wakes up
+                for cpu_usage in [10, 20, 30]:
+                    for client_id in ["fake_client1", "fake_client2"]:
+                        data = {"state": STATE_RUNNING, "current_cpu_usage": cpu_usage, "current_memory_usage": 200}
+                        server.queue.put(Message("heartbeat", data, client_id).serialize())
+                server.queue.put(Message("spawning", None, "fake_client1").serialize())
+                sleep(0.1)
+
+            self.assertEqual(1, check_stopped.call_count)
+            # only the last heartbeat from each worker is handled (and answered)
+            self.assertEqual(2, len(server.get_messages("heartbeat")))
+            self.assertEqual(30, master.clients["fake_client1"].cpu_usage)
+            self.assertEqual(30, master.clients["fake_client2"].cpu_usage)
+            # messages after the heartbeats are still handled in order
+            self.assertEqual(STATE_SPAWNING, master.clients["fake_client1"].state)
+            self.assertEqual(STATE_RUNNING, master.clients["fake_client2"].state)
+
+    def test_master_handles_waiting_heartbeat_that_accepts_the_encoding(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(Message("client_ready", __version__, "fake_client"))
+
+            # the worker only accepts the encoding once, so that heartbeat must not be skipped for a newer one
+            heartbeat = {"state": STATE_RUNNING, "current_cpu_usage": 10, "current_memory_usage": 200}
+            accepting = {**heartbeat, "protocol": PROTOCOL_VERSION, "compression": None, "capacity": 2.0}
+            server.queue.put(Message("heartbeat", accepting, "fake_client").serialize())
+            server.queue.put(Message("heartbeat", {**heartbeat, "current_cpu_usage": 20}, "fake_client").serialize())
+            sleep(0.1)
+
+            client = master.clients["fake_client"]
+            self.assertTrue(client.negotiated)
+            self.assertEqual(2.0, client.capacity)
+            self.assertEqual(PROTOCOL_VERSION, master.server.protocol_versions["fake_client"])
+            self.assertEqual(20, client.cpu_usage)
+            self.assertListEqual(
+                [PROTOCOL_VERSION, None], [msg.data.get("protocol") for msg in server.get_messages("heartbeat")]
+            )
+
+    def test_master_handles_heartbeat_sent_with_stats(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(Message("client_ready", __version__, "fake_client"))
+            self.assertEqual(WORKER_REPORT_INTERVAL, server.get_messages("ack")[0].data["report_interval"])
+            reports = []
+            master.environment.events.worker_report.add_listener(lambda client_id, data: reports.append(data))
+
+            stats = RequestStats()
+            data = {
+                "stats": stats.serialize_stats(),
+                "stats_total": stats.total.serialize(),
+                "errors": stats.serialize_errors(),
+                "user_classes_count": {},
+                "user_count": 0,
+                "heartbeat": {"state": STATE_RUNNING, "current_cpu_usage": 50, "current_memory_usage": 200},
+            }
+            server.mocked_send(Message("stats", data, "fake_client"))
+
+            self.assertEqual(STATE_RUNNING, master.clients["fake_client"].state)
+            self.assertEqual(50, master.clients["fake_client"].cpu_usage)
+            self.assertNotIn("heartbeat", reports[0])
+            # the worker sends the next heartbeat on its own, which is the one that gets answered
+            self.assertEqual([], server.get_messages("heartbeat"))
+            server.mocked_send(Message("heartbeat", data["heartbeat"], "fake_client"))
+            heartbeats = server.get_messages("heartbeat")
+            self.assertEqual(1, len(heartbeats))
+            self.assertEqual({"report_interval": WORKER_REPORT_INTERVAL}, heartbeats[0].data)
+
+            # unless it accepts the encoding offered in the ack, which the master confirms
+            data["heartbeat"] = {**data["heartbeat"], "protocol": PROTOCOL_VERSION}
+            server.mocked_send(Message("stats", data, "fake_client"))
+            self.assertEqual(PROTOCOL_VERSION, server.get_messages("heartbeat")[-1].data["protocol"])
+
+    def test_report_interval_adapts_to_receive_backlog(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()):
+            master = self.get_runner()
+            self.assertEqual(WORKER_REPORT_INTERVAL, master.report_interval)
+            for _ in range(10):
+                master._largest_received_batch = MASTER_RECEIVE_BATCH_SIZE
+                master.adapt_report_interval()
+            self.assertEqual(MAX_WORKER_REPORT_INTERVAL, master.report_interval)
+            # some backlog, but no full batch
+            master._largest_received_batch = MASTER_RECEIVE_BATCH_SIZE // 2
+            master.adapt_report_interval()
+            self.assertEqual(MAX_WORKER_REPORT_INTERVAL, master.report_interval)
+            master.adapt_report_interval()
+            self.assertLess(master.report_interval, MAX_WORKER_REPORT_INTERVAL)
+            for _ in range(20):
+                master.adapt_report_interval()
+            self.assertEqual(WORKER_REPORT_INTERVAL, master.report_interval)
+
     def test_last_worker_quitting_stops_test(self):
         class TestUser(User):
             @task
@@ -2743,6 +3048,154 @@ class TestMasterRunner(LocustRunnerTestCase):
             self.assertEqual({"TestUser": 50}, spawn_messages[-1].data["user_classes_count"])
             self.assertEqual({"TestUser": 50}, spawn_messages[-2].data["user_classes_count"])
 
+    @mock.patch("locust.runners.CPU_OVERLOADED_HEARTBEATS", new=2)
+    def test_capacity_weighted_dispatch(self):
+        class TestUser(User):
+            @task
+            def my_task(self):
+                pass
+
+        self.environment.dispatcher_class = CapacityWeightedUsersDispatcher
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner(user_classes=[TestUser])
+            server.mocked_send(Message("client_ready", __version__, "small_client"))
+            server.mocked_send(Message("client_ready", __version__, "big_client"))
+            # the capacity comes with every heartbeat, whether or not the worker accepts an encoding in it
+            server.mocked_send(
+                Message("heartbeat", {"state": STATE_INIT, "current_cpu_usage": 0, "capacity": 3}, "big_client")
+            )
+            self.assertEqual(1, master.clients["small_client"].capacity)
+            self.assertEqual(3, master.clients["big_client"].capacity)
+
+            master.start(40, 40)
+            self.assertDictEqual(
+                {"small_client": {"TestUser": 10}, "big_client": {"TestUser": 30}}, master._sent_user_classes_count
+            )
+
+            # the small worker stays overloaded, so some of its users are moved to the big one
+            heartbeat = {"state": STATE_RUNNING, "current_cpu_usage": 95, "current_memory_usage": 0}
+            server.mocked_send(Message("heartbeat", heartbeat, "small_client"))
+            self.assertEqual(10, master._sent_user_classes_count["small_client"]["TestUser"])
+            server.mocked_send(Message("heartbeat", heartbeat, "small_client"))
+            sleep(0.1)
+            self.assertDictEqual(
+                {"small_client": {"TestUser": 8}, "big_client": {"TestUser": 32}}, master._sent_user_classes_count
+            )
+
+    @mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=600)
+    def test_options_are_sent_once_and_spawn_messages_only_carry_changes(self):
+        class MyUser1(User):
+            @task
+            def my_task(self):
+                pass
+
+        class MyUser2(User):
+            @task
+            def my_task(self):
+                pass
+
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner(user_classes=[MyUser1, MyUser2])
+            server.mocked_send(Message("client_ready", __version__, "fake_client"))
+            accepted = {"state": STATE_INIT, "current_cpu_usage": 0, "protocol": PROTOCOL_VERSION}
+            server.mocked_send(Message("heartbeat", accepted, "fake_client"))
+            options = server.get_messages("ack")[0].data["options"]
+            self.assertEqual(1, options["version"])
+            self.assertIn("host", options)
+            self.assertIn("stop_timeout", options)
+            self.assertIn("parsed_options", options)
+
+            master.start(2, 2)
+            spawn_messages = server.get_messages("spawn")
+            self.assertEqual(1, len(spawn_messages))
+            self.assertEqual({"MyUser1": 1, "MyUser2": 1}, spawn_messages[0].data["user_classes_count"])
+            self.assertEqual(1, spawn_messages[0].data["options_version"])
+            self.assertNotIn("parsed_options", spawn_messages[0].data)
+
+            master.start(3, 3)
+            spawn_messages = server.get_messages("spawn")
+            self.assertEqual(2, len(spawn_messages))
+            # only the class that got another user
+            self.assertEqual(1, len(spawn_messages[1].data["user_classes_count"]))
+            self.assertEqual(2, sum(spawn_messages[1].data["user_classes_count"].values()))
+            self.assertEqual([], server.get_messages("options"))
+
+            # a worker that discarded a spawn message gets all the counts again
+            server.mocked_send(Message("spawn_discarded", {"timestamp": time.time() + 10}, "fake_client"))
+            spawn_messages = server.get_messages("spawn")
+            self.assertEqual(3, len(spawn_messages))
+            self.assertEqual({"MyUser1": 2, "MyUser2": 1}, spawn_messages[2].data["user_classes_count"])
+            self.assertGreater(spawn_messages[2].data["timestamp"], spawn_messages[1].data["timestamp"])
+
+            # changed options are sent once, with a new version
+            master.environment.host = "http://localhost:8089"
+            master.start(3, 3)
+            options_messages = server.get_messages("options")
+            self.assertEqual(1, len(options_messages))
+            self.assertEqual("http://localhost:8089", options_messages[0].data["host"])
+            self.assertEqual(2, options_messages[0].data["version"])
+
+    @mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=600)
+    def test_workers_that_do_not_negotiate_get_all_users_and_options_in_spawn_messages(self):
+        class MyUser1(User):
+            @task
+            def my_task(self):
+                pass
+
+        class MyUser2(User):
+            @task
+            def my_task(self):
+                pass
+
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner(user_classes=[MyUser1, MyUser2])
+            # a worker of an older version never accepts the encoding offered in the ack
+            server.mocked_send(Message("client_ready", __version__, "old_client"))
+            master.start(2, 2)
+            master.start(3, 3)
+            spawn_messages = server.get_messages("spawn")
+            self.assertEqual(2, len(spawn_messages))
+            self.assertEqual({"MyUser1": 2, "MyUser2": 1}, spawn_messages[1].data["user_classes_count"])
+            for key in ["host", "stop_timeout", "parsed_options"]:
+                self.assertIn(key, spawn_messages[1].data)
+
+            master.environment.host = "http://localhost:8089"
+            master.start(3, 3)
+            self.assertEqual([], server.get_messages("options"))
+            self.assertEqual("http://localhost:8089", server.get_messages("spawn")[-1].data["host"])
+
+    @mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=600)
+    def test_worker_ramp_sends_one_spawn_message_per_worker(self):
+        class TestUser(User):
+            @task
+            def my_task(self):
+                pass
+
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            self.environment.parsed_options = get_parser().parse_args(["--worker-ramp"])
+            master = self.get_runner(user_classes=[TestUser])
+            server.mocked_send(Message("client_ready", __version__, "fake_client1"))
+            server.mocked_send(Message("client_ready", __version__, "fake_client2"))
+
+            start_greenlet = gevent.spawn(master.start, 10, 2)
+            sleep(0.1)
+            spawn_messages = server.get_messages("spawn")
+            self.assertEqual(2, len(spawn_messages))
+            for msg in spawn_messages:
+                self.assertEqual({"TestUser": 5}, msg.data["user_classes_count"])
+                self.assertEqual(1, msg.data["spawn_rate"])
+
+            # the workers are ramping by themselves, and the master waits for them to get there
+            self.assertFalse(start_greenlet.ready())
+            for msg in spawn_messages:
+                server.mocked_send(
+                    Message("spawning_complete", {"user_classes_count": {"TestUser": 5}, "user_count": 5}, msg.node_id)
+                )
+            start_greenlet.join(timeout=1)
+            self.assertTrue(start_greenlet.ready())
+            self.assertEqual(2, len(server.get_messages("spawn")))
+            self.assertEqual(10, master.user_count)
+
     def test_sends_spawn_data_to_ready_running_spawning_workers(self):
         """Sends spawn job to running, ready, or spawning workers"""
 
@@ -2913,7 +3366,7 @@ class TestMasterRunner(LocustRunnerTestCase):
             master.start(7, 7)
             self.assertEqual(15, len(server.outbox))
 
-            num_users = sum(sum(msg.data["user_classes_count"].values()) for msg in server.get_messages("spawn"))
+            num_users = spawned_user_count(server)
             self.assertEqual(7, num_users)
 
     def test_spawn_fewer_locusts_than_workers(self):
@@ -2931,7 +3384,7 @@ class TestMasterRunner(LocustRunnerTestCase):
             master.start(2, 2)
             self.assertEqual(15, len(server.outbox))
 
-            num_users = sum(sum(msg.data["user_classes_count"].values()) for msg in server.get_messages("spawn"))
+            num_users = spawned_user_count(server)
 
             self.assertEqual(2, num_users, "Total number of locusts that would have been spawned is not 2")
 
@@ -2995,23 +3448,23 @@ class TestMasterRunner(LocustRunnerTestCase):
 
             # Wait for shape_worker to update user_count
             sleep(0.5)
-            num_users = sum(sum(msg.data["user_classes_count"].values()) for msg in server.get_messages("spawn"))
+            num_users = spawned_user_count(server)
             self.assertEqual(
                 1, num_users, "Total number of users in first stage of shape test is not 1: %i" % num_users
             )
 
             # Wait for shape_worker to update user_count again
             sleep(1.5)
-            num_users = sum(sum(msg.data["user_classes_count"].values()) for msg in server.get_messages("spawn"))
+            num_users = spawned_user_count(server)
             self.assertEqual(
                 1, num_users, "Total number of users in second stage of shape test is not 1: %i" % num_users
             )
 
             # Wait for shape_worker to update user_count few times but not reach the end yet
             sleep(2.5)
-            num_users = sum(sum(msg.data["user_classes_count"].values()) for msg in server.get_messages("spawn"))
+            num_users = spawned_user_count(server)
             self.assertEqual(
-                3, num_users, "Total number of users in second stage of shape test is not 3: %i" % num_users
+                2, num_users, "Total number of users in third stage of shape test is not 2: %i" % num_users
             )
 
             # Wait to ensure shape_worker has stopped the test
@@ -3047,16 +3500,16 @@ class TestMasterRunner(LocustRunnerTestCase):
             sleep(0.5)
 
             # Wait for shape_worker to update user_count
-            num_users = sum(sum(msg.data["user_classes_count"].values()) for msg in server.get_messages("spawn"))
+            num_users = spawned_user_count(server)
             self.assertEqual(
                 1, num_users, "Total number of users in first stage of shape test is not 1: %i" % num_users
             )
 
             # Wait for shape_worker to update user_count again
             sleep(2)
-            num_users = sum(sum(msg.data["user_classes_count"].values()) for msg in server.get_messages("spawn"))
+            num_users = spawned_user_count(server)
             self.assertEqual(
-                3, num_users, "Total number of users in second stage of shape test is not 3: %i" % num_users
+                2, num_users, "Total number of users in second stage of shape test is not 2: %i" % num_users
             )
 
             # Wait to ensure shape_worker has stopped the test
@@ -3092,18 +3545,14 @@ class TestMasterRunner(LocustRunnerTestCase):
             sleep(0.5)
 
             # Wait for shape_worker to update user_count
-            num_users = sum(sum(msg.data["user_classes_count"].values()) for msg in server.get_messages("spawn"))
+            num_users = spawned_user_count(server)
             self.assertEqual(
                 5, num_users, "Total number of users in first stage of shape test is not 5: %i" % num_users
             )
 
             # Wait for shape_worker to update user_count again
             sleep(2)
-            msgs = defaultdict(dict)
-            for msg in server.get_messages("spawn"):
-                msgs[msg.node_id][msg.data["timestamp"]] = sum(msg.data["user_classes_count"].values())
-            # Count users for the last received messages
-            num_users = sum(v[max(v.keys())] for v in msgs.values())
+            num_users = spawned_user_count(server)
             self.assertEqual(
                 1, num_users, "Total number of users in second stage of shape test is not 1: %i" % num_users
             )
@@ -3302,30 +3751,31 @@ class TestMasterRunner(LocustRunnerTestCase):
 
     def test_wait_for_workers_report_after_ramp_up(self):
         def assert_cache_hits():
-            self.assertEqual(master._wait_for_workers_report_after_ramp_up.cache_info().hits, 0)
+            self.assertEqual(master._wait_for_workers_report_after_ramp_up_setting.cache_info().hits, 0)
             master._wait_for_workers_report_after_ramp_up()
-            self.assertEqual(master._wait_for_workers_report_after_ramp_up.cache_info().hits, 1)
+            self.assertEqual(master._wait_for_workers_report_after_ramp_up_setting.cache_info().hits, 1)
 
         master = self.get_runner()
 
-        master._wait_for_workers_report_after_ramp_up.cache_clear()
+        master._wait_for_workers_report_after_ramp_up_setting.cache_clear()
         self.assertEqual(master._wait_for_workers_report_after_ramp_up(), 1.0)
         assert_cache_hits()
 
-        master._wait_for_workers_report_after_ramp_up.cache_clear()
+        master._wait_for_workers_report_after_ramp_up_setting.cache_clear()
         with patch_env("LOCUST_WAIT_FOR_WORKERS_REPORT_AFTER_RAMP_UP", "5.7"):
             self.assertEqual(master._wait_for_workers_report_after_ramp_up(), 5.7)
             assert_cache_hits()
 
-        master._wait_for_workers_report_after_ramp_up.cache_clear()
-        with (
-            mock.patch("locust.runners.WORKER_REPORT_INTERVAL", new=1.5),
-            patch_env("LOCUST_WAIT_FOR_WORKERS_REPORT_AFTER_RAMP_UP", "5.7 * WORKER_REPORT_INTERVAL"),
-        ):
+        master._wait_for_workers_report_after_ramp_up_setting.cache_clear()
+        with patch_env("LOCUST_WAIT_FOR_WORKERS_REPORT_AFTER_RAMP_UP", "5.7 * WORKER_REPORT_INTERVAL"):
+            master.report_interval = 1.5
             self.assertEqual(master._wait_for_workers_report_after_ramp_up(), 5.7 * 1.5)
             assert_cache_hits()
+            # the interval the workers are asked to report at, even if it changed after the setting was read
+            master.report_interval = 4.5
+            self.assertEqual(master._wait_for_workers_report_after_ramp_up(), 5.7 * 4.5)
 
-        master._wait_for_workers_report_after_ramp_up.cache_clear()
+        master._wait_for_workers_report_after_ramp_up_setting.cache_clear()
 
     def test_master_discard_first_client_ready(self):
         with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
@@ -3440,6 +3890,83 @@ class TestWorkerRunner(LocustTestCase):
         environment.user_classes = user_classes
         return WorkerRunner(environment, master_host="localhost", master_port=5557)
 
+    def test_encoding_offered_in_ack_is_accepted_in_a_heartbeat(self):
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            environment = Environment(parsed_options=get_parser().parse_args(["--worker-capacity", "3"]))
+            worker = self.get_runner(environment=environment, client=client)
+            # the version is all that masters which don't offer an encoding expect, and they get nothing else
+            self.assertEqual(__version__, client.get_messages("client_ready")[0].data)
+            self.assertEqual(LEGACY_PROTOCOL_VERSION, worker.client.protocol_version)
+            self.assertFalse(any("protocol" in msg.data for msg in client.get_messages("heartbeat")))
+            # masters that don't offer an encoding still get the capacity
+            worker._send_heartbeat()
+            self.assertEqual(3, client.get_messages("heartbeat")[-1].data["capacity"])
+
+            ack = {"index": 0, "protocol": PROTOCOL_VERSION + 1, "compression": ["brotli", "zlib"]}
+            client.mocked_send(Message("ack", ack, "dummy_client_id"))
+            sleep(0.1)
+            accepted = [msg.data for msg in client.get_messages("heartbeat") if "protocol" in msg.data]
+            self.assertEqual(1, len(accepted))
+            self.assertEqual(PROTOCOL_VERSION, accepted[0]["protocol"])
+            self.assertEqual("zlib", accepted[0]["compression"])
+            self.assertEqual(3, accepted[0]["capacity"])
+            self.assertEqual(PROTOCOL_VERSION, worker.client.protocol_version)
+            self.assertEqual("zlib", worker.client.compression)
+            # messages from the master are decoded the legacy way until it says it has switched too
+            self.assertEqual(LEGACY_PROTOCOL_VERSION, worker.client.receive_protocol_version)
+            reply = {"report_interval": WORKER_REPORT_INTERVAL, "protocol": PROTOCOL_VERSION}
+            client.mocked_send(Message("heartbeat", reply, "dummy_client_id"))
+            sleep(0.1)
+            self.assertEqual(PROTOCOL_VERSION, worker.client.receive_protocol_version)
+            worker.quit()
+
+    def test_heartbeat_is_sent_with_stats_at_interval_from_master(self):
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            client.mocked_send(Message("ack", {"index": 0, "report_interval": 4.5}, "dummy_client_id"))
+            worker = self.get_runner(environment=Environment(), client=client, auto_connect=False)
+            self.assertTrue(worker.heartbeats_in_stats)
+            self.assertEqual(4.5, worker.master_report_interval)
+            client.mocked_send(Message("heartbeat", {"report_interval": 6.0}, "dummy_client_id"))
+            sleep(0.1)
+            self.assertEqual(6.0, worker.master_report_interval)
+
+            # a heartbeat was just sent on its own
+            worker._send_stats()
+            self.assertNotIn("heartbeat", client.get_messages("stats")[-1].data)
+            worker._last_heartbeat_sent = 0.0
+            worker._send_stats()
+            self.assertEqual(STATE_INIT, client.get_messages("stats")[-1].data["heartbeat"]["state"])
+            self.assertGreater(worker._last_heartbeat_sent, 0.0)
+
+            # the master doesn't answer heartbeats sent with the stats, so the next one is sent on its own
+            worker._last_heartbeat_sent = 0.0
+            worker._send_stats()
+            self.assertNotIn("heartbeat", client.get_messages("stats")[-1].data)
+            worker._send_heartbeat()
+            worker._last_heartbeat_sent = 0.0
+            worker._send_stats()
+            self.assertIn("heartbeat", client.get_messages("stats")[-1].data)
+            worker.quit()
+
+    def test_aggregator_connects_to_master_like_a_worker(self):
+        with (
+            mock.patch("locust.rpc.rpc.Server", mocked_rpc()),
+            mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client,
+        ):
+            client.mocked_send(Message("ack", {"index": 3, "report_interval": 4.5}, "dummy_client_id"))
+            aggregator = Environment().create_aggregator_runner("localhost", 5557, "*", 0)
+            self.assertEqual(1, len(client.get_messages("client_ready")))
+            self.assertEqual(3, aggregator.worker_index)
+            self.assertTrue(aggregator.heartbeats_in_stats)
+            self.assertEqual(4.5, aggregator.master_report_interval)
+            # its own workers are asked for the interval the aggregator chooses
+            self.assertEqual(WORKER_REPORT_INTERVAL, aggregator.report_interval)
+
+            aggregator._last_heartbeat_sent = 0.0
+            aggregator._send_stats()
+            self.assertEqual(STATE_INIT, client.get_messages("stats")[-1].data["heartbeat"]["state"])
+            aggregator.quit()
+
     def test_worker_stop_timeout(self):
         class MyTestUser(User):
             _test_state = 0
@@ -3853,6 +4380,117 @@ class TestWorkerRunner(LocustTestCase):
 
             worker.quit()
 
+    def test_worker_ramp(self):
+        class MyUser1(User):
+            wait_time = constant(1)
+
+            @task
+            def my_task(self):
+                pass
+
+        class MyUser2(User):
+            wait_time = constant(1)
+
+            @task
+            def my_task(self):
+                pass
+
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            worker = self.get_runner(environment=Environment(), user_classes=[MyUser1, MyUser2], client=client)
+            client.mocked_send(
+                Message(
+                    "spawn",
+                    {"timestamp": 1605538584, "user_classes_count": {"MyUser1": 4, "MyUser2": 2}, "spawn_rate": 20},
+                    "dummy_client_id",
+                )
+            )
+            sleep(0.12)
+            # the users are started at 20/s, so 3 of them (at 0, 50 and 100 ms) so far
+            self.assertEqual(3, worker.user_count)
+            self.assertEqual([], client.get_messages("spawning_complete"))
+            worker.spawning_greenlet.join()
+            self.assertDictEqual({"MyUser1": 4, "MyUser2": 2}, worker.user_classes_count)
+            self.assertEqual(1, len(client.get_messages("spawning_complete")))
+
+            # ramping down works the same way
+            client.mocked_send(
+                Message(
+                    "spawn",
+                    {"timestamp": 1605538585, "user_classes_count": {"MyUser1": 0}, "spawn_rate": 20},
+                    "dummy_client_id",
+                )
+            )
+            sleep(0.02)
+            self.assertEqual(5, worker.user_count)
+            worker.spawning_greenlet.join()
+            self.assertDictEqual({"MyUser1": 0, "MyUser2": 2}, worker.user_classes_count)
+            worker.quit()
+
+    def test_options_from_ack_and_changed_user_counts_from_spawn(self):
+        class MyUser1(User):
+            wait_time = constant(1)
+
+            @task
+            def my_task(self):
+                pass
+
+        class MyUser2(User):
+            wait_time = constant(1)
+
+            @task
+            def my_task(self):
+                pass
+
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            options = {"host": "http://localhost:8089", "stop_timeout": 3, "parsed_options": {"my_arg": 42}}
+            client.mocked_send(Message("ack", {"index": 0, "options": {**options, "version": 1}}, "dummy_client_id"))
+            environment = Environment()
+            worker = self.get_runner(
+                environment=environment, user_classes=[MyUser1, MyUser2], client=client, auto_connect=False
+            )
+            self.assertEqual("http://localhost:8089", environment.host)
+            self.assertEqual(3, environment.stop_timeout)
+            self.assertEqual(42, environment.parsed_options.my_arg)
+            self.assertEqual(1, worker.options_version)
+
+            client.mocked_send(
+                Message(
+                    "spawn",
+                    {"timestamp": 1605538584, "user_classes_count": {"MyUser1": 2, "MyUser2": 1}, "options_version": 1},
+                    "dummy_client_id",
+                )
+            )
+            worker.spawning_greenlet.join()
+            self.assertDictEqual({"MyUser1": 2, "MyUser2": 1}, worker.user_classes_count)
+
+            # counts that are not in the message are left as they are
+            client.mocked_send(
+                Message(
+                    "spawn",
+                    {"timestamp": 1605538585, "user_classes_count": {"MyUser2": 3}, "options_version": 1},
+                    "dummy_client_id",
+                )
+            )
+            worker.spawning_greenlet.join()
+            self.assertDictEqual({"MyUser1": 2, "MyUser2": 3}, worker.user_classes_count)
+
+            # the changes in a discarded spawn message would be lost, so the master is asked to send all counts
+            client.mocked_send(
+                Message(
+                    "spawn",
+                    {"timestamp": 1605538585, "user_classes_count": {"MyUser1": 0}, "options_version": 1},
+                    "dummy_client_id",
+                )
+            )
+            self.assertEqual([{"timestamp": 1605538585}], [m.data for m in client.get_messages("spawn_discarded")])
+            self.assertDictEqual({"MyUser1": 2, "MyUser2": 3}, worker.user_classes_count)
+
+            options = {**options, "host": "http://other:8089", "version": 2}
+            client.mocked_send(Message("options", options, "dummy_client_id"))
+            self.assertEqual("http://other:8089", environment.host)
+            self.assertEqual(2, worker.options_version)
+            worker.quit()
+
     def test_custom_message_send(self):
         class MyUser(User):
             wait_time = constant(1)
@@ -4179,6 +4817,47 @@ class TestWorkerRunner(LocustTestCase):
             logger.removeHandler(log_handler)
 
 
+class TestWorkerNodes(unittest.TestCase):
+    def test_nodes_are_indexed_by_state(self):
+        nodes = runners.WorkerNodes()
+        for i in range(4):
+            nodes[f"w{i}"] = WorkerNode(f"w{i}")
+        self.assertEqual(4, len(nodes.ready))
+        nodes["w1"].state = STATE_RUNNING
+        nodes["w2"].state = STATE_SPAWNING
+        nodes["w3"].state = STATE_MISSING
+        self.assertEqual(["w0"], [node.id for node in nodes.ready])
+        self.assertEqual(["w1"], [node.id for node in nodes.running])
+        self.assertEqual(["w2"], [node.id for node in nodes.spawning])
+        self.assertEqual(["w3"], [node.id for node in nodes.missing])
+        self.assertEqual(3, nodes.count_by_state(STATE_INIT, STATE_SPAWNING, STATE_RUNNING))
+
+        del nodes["w1"]
+        self.assertEqual([], nodes.running)
+        nodes["w0"] = WorkerNode("w0", state=STATE_RUNNING)  # replacing a node removes the old one from the index
+        self.assertEqual([], nodes.ready)
+        self.assertEqual(["w0"], [node.id for node in nodes.running])
+
+    def test_user_counts(self):
+        nodes = runners.WorkerNodes()
+        nodes["w1"] = WorkerNode("w1")
+        nodes["w2"] = WorkerNode("w2")
+        nodes["w1"].user_classes_count = {"A": 2, "B": 1}
+        nodes["w2"].user_classes_count = {"A": 3, "C": 0}
+        self.assertEqual(6, nodes.user_count)
+        self.assertEqual({"A": 5, "B": 1, "C": 0}, nodes.user_classes_count_by_state(STATE_INIT))
+
+        nodes["w2"].state = STATE_RUNNING
+        self.assertEqual({"A": 2, "B": 1}, nodes.user_classes_count_by_state(STATE_INIT))
+        self.assertEqual({"A": 5, "B": 1, "C": 0}, nodes.user_classes_count_by_state(STATE_INIT, STATE_RUNNING))
+
+        nodes["w1"].user_classes_count = {}
+        self.assertEqual({}, nodes.user_classes_count_by_state(STATE_INIT))
+        del nodes["w2"]
+        self.assertEqual(0, nodes.user_count)
+        self.assertEqual({}, nodes.user_classes_count_by_state(STATE_INIT, STATE_RUNNING))
+
+
 class TestMessageSerializing(unittest.TestCase):
     def test_message_serialize(self):
         msg = Message("client_ready", __version__, "my_id")
@@ -4187,6 +4866,34 @@ class TestMessageSerializing(unittest.TestCase):
         self.assertEqual(msg.data, rebuilt.data)
         self.assertEqual(msg.node_id, rebuilt.node_id)
 
+    def test_datetime_serialize(self):
+        when = datetime.datetime(2024, 5, 17, 12, 30, 15, 123456)
+        msg = Message("custom", {"when": when, "nested": [{"when": when}]}, "my_id")
+        for protocol_version in [LEGACY_PROTOCOL_VERSION, PROTOCOL_VERSION]:
+            self.assertEqual(msg.data, Message.unserialize(msg.serialize(protocol_version), protocol_version).data)
+        # extension types are decoded before the version has been negotiated
+        self.assertEqual(msg.data, Message.unserialize(msg.serialize(), LEGACY_PROTOCOL_VERSION).data)
+        # but maps are only checked for the legacy encoding with the legacy version
+        legacy = Message.unserialize(msg.serialize(LEGACY_PROTOCOL_VERSION), PROTOCOL_VERSION)
+        self.assertEqual({"__datetime__": True, "as_str": "20240517T12:30:15.123456"}, legacy.data["when"])
+
+    def test_compressed_message_serialize(self):
+        compression_stats = CompressionStats()
+        small = Message("heartbeat", {"state": "running"}, "my_id")
+        self.assertEqual(small.serialize(), small.serialize(compression="zlib", compression_stats=compression_stats))
+        self.assertEqual(0, compression_stats.sent_messages)
+
+        large = Message("logs", {"logs": ["the same line of log"] * COMPRESSION_THRESHOLD}, "my_id")
+        for compression in COMPRESSORS:
+            data = large.serialize(compression=compression, compression_stats=compression_stats)
+            self.assertLess(len(data), len(large.serialize()))
+            rebuilt = Message.unserialize(data, compression_stats=compression_stats)
+            self.assertEqual(large.data, rebuilt.data)
+        self.assertEqual(len(COMPRESSORS), compression_stats.sent_messages)
+        self.assertEqual(len(COMPRESSORS), compression_stats.received_messages)
+        self.assertGreater(compression_stats.sent_bytes_saved, 0)
+        self.assertEqual(compression_stats.sent_bytes_saved, compression_stats.received_bytes_saved)
+
 
 class TestStopTimeout(LocustTestCase):
     def test_stop_timeout(self):
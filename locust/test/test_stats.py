@@ -1,21 +1,23 @@
 import locust
 from locust import HttpUser, TaskSet, User, __version__, constant, task
 from locust.env import Environment
+from locust.histogram import HighResolutionHistogram, SketchHistogram
 from locust.rpc.protocol import Message
 from locust.stats import (
     PERCENTILES_TO_REPORT,
     STATS_NAME_WIDTH,
     STATS_TYPE_WIDTH,
-    CachedResponseTimes,
     RequestStats,
     StatsCSVFileWriter,
     StatsEntry,
     StatsError,
     bucket_response_time,
+    create_response_time_histogram,
     diff_response_time_dicts,
     setup_distributed_stats_event_listeners,
     stats_history,
 )
+from locust.stats_shm import SharedStats
 from locust.test.test_runners import mocked_rpc
 from locust.test.testcases import LocustTestCase, WebserverTestCase
 from locust.user.inspectuser import _get_task_ratio
@@ -142,6 +144,19 @@ class TestRequestStats(unittest.TestCase):
         self.assertEqual(s.get_response_time_percentile(0.6), 60)
         self.assertEqual(s.get_response_time_percentile(0.95), 95)
 
+    def test_percentiles(self):
+        s = StatsEntry(self.stats, "percentile_test", "GET")
+        for x in range(100):
+            s.log(x, 0)
+        s.log(3432, 0)
+
+        percents = [0.95, 0.5, 1.0, 0.6, 0.0]
+        self.assertEqual(
+            [s.get_response_time_percentile(p) for p in percents], s.get_response_time_percentiles(percents)
+        )
+        self.assertEqual([95, 50, 3400, 60, 0], s.get_response_time_percentiles(percents))
+        self.assertEqual([], s.get_response_time_percentiles([]))
+
     def test_percentile_with_none_response_times(self):
         s = StatsEntry(self.stats, "percentile_test", "GET")
         for x in range(100):
@@ -370,6 +385,55 @@ class TestRequestStats(unittest.TestCase):
         self.stats.log_error("GET", "/", Exception(f"Error caused by {Dummy()!r}"))
         self.assertEqual(1, len(self.stats.errors))
 
+    def test_error_grouping_ignores_ids(self):
+        self.stats = RequestStats()
+        errors = [
+            Exception("Request 1234567 failed"),
+            Exception("Request 7654321 failed"),
+            Exception("Order 550e8400-e29b-41d4-a716-446655440000 not found"),
+            Exception("Order 6fa459ea-ee8a-3ca4-894e-db77e160355e not found"),
+            Exception("Error 500"),
+            Exception("Error 502"),
+        ]
+
+        for error in errors:
+            self.stats.log_error("GET", "/", error)
+        self.assertEqual(6, len(self.stats.errors))
+
+        self.stats = RequestStats()
+        with mock.patch.object(locust.stats, "TEMPLATE_ERRORS", True):
+            for error in errors:
+                self.stats.log_error("GET", "/", error)
+        self.assertEqual([2, 2, 1, 1], [error.occurrences for error in self.stats.errors.values()])
+
+    def test_error_key_is_cached_by_exception_type_and_args(self):
+        class CustomError(Exception):
+            pass
+
+        for error in [Exception("a"), Exception(), Exception("a", 1), CustomError("b"), KeyError("c")]:
+            key = StatsError.create_key("GET", "/", error)
+            self.assertEqual(StatsError.create_key("GET", "/", repr(error)), key)
+        # other arguments are formatted every time instead
+        self.assertEqual(
+            StatsError.create_key("GET", "/", repr(Exception(["x"]))),
+            StatsError.create_key("GET", "/", Exception(["x"])),
+        )
+        # equal arguments with different reprs get different keys
+        self.assertNotEqual(
+            StatsError.create_key("GET", "/", Exception(1)), StatsError.create_key("GET", "/", Exception(True))
+        )
+
+    def test_max_errors(self):
+        self.stats = RequestStats()
+        with mock.patch.object(locust.stats, "MAX_ERRORS", 10):
+            for i in range(25):
+                self.stats.log_error("GET", "/", Exception(f"Exception {chr(ord('a') + i)}"))
+        self.assertLessEqual(len(self.stats.errors), 10)
+        self.assertEqual(25, len(self.stats.errors) + self.stats.evicted_errors)
+        # the most recently seen errors are kept
+        self.assertIn("Exception y", [error.error.args[0] for error in self.stats.errors.values()])
+        self.assertEqual(25, self.stats.num_failures)
+
     def test_error_first_seen_and_last_seen(self):
         self.stats = RequestStats()
 
@@ -428,6 +492,236 @@ class TestRequestStats(unittest.TestCase):
 
         self.assertEqual(20, u1.median_response_time)
 
+    def test_compact_stats_report(self):
+        def worker_report(compact):
+            stats = RequestStats(use_response_times_cache=False)
+            env = Environment()
+            setup_distributed_stats_event_listeners(env.events, stats)
+            for i in range(100):
+                stats.log_request("GET", f"/page{i % 7}", i * 13.7, 10)
+            stats.log_request("POST", "/page1", None, 0)
+            stats.log_error("GET", "/page1", Exception("dummy fail"))
+            data = {}
+            with mock.patch.object(locust.stats, "COMPACT_STATS_REPORTS", compact):
+                env.events.report_to_master.fire(client_id="dummy", data=data)
+            self.assertEqual(0, stats.num_requests)
+            return Message.unserialize(Message("stats", data, "dummy").serialize()).data
+
+        compact = worker_report(True)
+        self.assertNotIn("stats", compact)
+        # 7 names, Aggregated, GET, POST and the empty method of the total are only sent once
+        self.assertEqual(11, len(compact["stats_report"]["strings"]))
+
+        masters = []
+        for data in [compact, worker_report(False)]:
+            master_stats = RequestStats()
+            env = Environment()
+            setup_distributed_stats_event_listeners(env.events, master_stats)
+            env.events.worker_report.fire(client_id="dummy", data=data)
+            masters.append(master_stats)
+
+        from_compact, from_dicts = masters
+        self.assertEqual(set(from_dicts.entries), set(from_compact.entries))
+        for key in list(from_dicts.entries) + [None]:
+            expected = from_dicts.total if key is None else from_dicts.entries[key]
+            actual = from_compact.total if key is None else from_compact.entries[key]
+            for attr in [
+                "num_requests",
+                "num_none_requests",
+                "num_failures",
+                "total_response_time",
+                "min_response_time",
+                "max_response_time",
+            ]:
+                self.assertEqual(getattr(expected, attr), getattr(actual, attr), f"{key} {attr}")
+            self.assertEqual(expected.response_times, actual.response_times)
+            self.assertEqual(expected.num_reqs_per_sec, actual.num_reqs_per_sec)
+            self.assertEqual(expected.num_fail_per_sec, actual.num_fail_per_sec)
+        self.assertEqual(1, len(from_compact.errors))
+
+    def test_shared_stats_report(self):
+        shared_stats = SharedStats(1)
+
+        def worker_report():
+            stats = RequestStats(use_response_times_cache=False)
+            env = Environment()
+            setup_distributed_stats_event_listeners(env.events, stats)
+            for i in range(100):
+                stats.log_request("GET", f"/page{i % 7}", i * 13.7, 10)
+            stats.log_request("POST", "/page1", None, 0)
+            stats.log_error("GET", "/page1", Exception("dummy fail"))
+            data = {}
+            env.events.report_to_master.fire(client_id="dummy", data=data)
+            self.assertEqual(0, stats.num_requests)
+            return Message.unserialize(Message("stats", data, "dummy").serialize()).data
+
+        with (
+            mock.patch.object(locust.stats, "SHARED_STATS", shared_stats),
+            mock.patch.object(locust.stats, "SHARED_STATS_SLOT", 0),
+        ):
+            reports = [worker_report() for _ in range(3)]
+        # there are only two buffers, so the third report is sent in the message
+        self.assertEqual([0, 0], reports[0]["shared_stats"])
+        self.assertEqual([0, 1], reports[1]["shared_stats"])
+        self.assertNotIn("stats", reports[0])
+        self.assertNotIn("shared_stats", reports[2])
+
+        masters = []
+        for data in reports:
+            master_stats = RequestStats()
+            env = Environment()
+            setup_distributed_stats_event_listeners(env.events, master_stats)
+            with mock.patch.object(locust.stats, "SHARED_STATS", shared_stats):
+                env.events.worker_report.fire(client_id="dummy", data=data)
+            masters.append(master_stats)
+
+        from_shared, _, from_dicts = masters
+        self.assertEqual(set(from_dicts.entries), set(from_shared.entries))
+        for key in list(from_dicts.entries) + [None]:
+            expected = from_dicts.total if key is None else from_dicts.entries[key]
+            actual = from_shared.total if key is None else from_shared.entries[key]
+            for attr in [
+                "num_requests",
+                "num_none_requests",
+                "num_failures",
+                "total_response_time",
+                "min_response_time",
+                "max_response_time",
+                "total_content_length",
+            ]:
+                self.assertEqual(getattr(expected, attr), getattr(actual, attr), f"{key} {attr}")
+            self.assertEqual(expected.response_times, actual.response_times)
+            self.assertEqual(expected.num_reqs_per_sec, actual.num_reqs_per_sec)
+            self.assertEqual(expected.num_fail_per_sec, actual.num_fail_per_sec)
+        self.assertEqual(1, len(from_shared.errors))
+
+        # the buffers have been read, so they can be written to again
+        self.assertEqual(0, shared_stats.write_report(0, [], from_dicts.total))
+
+    def test_shared_stats_report_that_does_not_fit(self):
+        stats = RequestStats(use_response_times_cache=False)
+        for i in range(100):
+            stats.log_request("GET", f"/page{i}", i, 10)
+        shared_stats = SharedStats(1, buffer_size=4096)
+        self.assertIsNone(shared_stats.write_report(0, list(stats.entries.values()), stats.total))
+        self.assertEqual(0, shared_stats.write_report(0, [], stats.total))
+        with self.assertRaises(ValueError):
+            shared_stats.read_report(0, 1, create_response_time_histogram)
+
+    def test_log_requests_matches_log_request(self):
+        requests = [
+            ("GET", "/a", 45, 10, None),
+            ("GET", "/b", 135, 20, None),
+            ("POST", "/a", None, 30, None),
+            ("GET", "/a", 601, 40, Exception("dummy fail")),
+            ("GET", "/a", 0.5, 50, None),
+        ]
+        one_by_one = RequestStats()
+        for method, name, response_time, content_length, exception in requests:
+            one_by_one.log_request(method, name, response_time, content_length)
+            if exception:
+                one_by_one.log_error(method, name, exception)
+        batched = RequestStats()
+        batched.log_requests(requests)
+
+        self.assertEqual(set(one_by_one.entries), set(batched.entries))
+        for key in list(one_by_one.entries) + [None]:
+            expected = one_by_one.total if key is None else one_by_one.entries[key]
+            actual = batched.total if key is None else batched.entries[key]
+            for attr in [
+                "num_requests",
+                "num_none_requests",
+                "num_failures",
+                "total_response_time",
+                "min_response_time",
+                "max_response_time",
+                "total_content_length",
+            ]:
+                self.assertEqual(getattr(expected, attr), getattr(actual, attr), f"{key} {attr}")
+            self.assertEqual(expected.response_times, actual.response_times)
+            self.assertEqual(sum(expected.num_reqs_per_sec.values()), sum(actual.num_reqs_per_sec.values()))
+        self.assertEqual(list(one_by_one.errors), list(batched.errors))
+        self.assertEqual(
+            one_by_one.total.get_current_response_time_percentiles([0.5, 1.0]),
+            batched.total.get_current_response_time_percentiles([0.5, 1.0]),
+        )
+
+    def test_buffer_request(self):
+        stats = RequestStats()
+        with mock.patch.object(locust.stats, "REQUEST_STATS_BATCH_SIZE", 3):
+            stats.buffer_request("GET", "/", 10, 0)
+            stats.buffer_request("GET", "/", 20, 0, Exception("dummy fail"))
+            self.assertEqual(0, stats.num_requests)
+            stats.buffer_request("GET", "/", 30, 0)
+            self.assertEqual(3, stats.num_requests)
+            self.assertEqual(1, stats.num_failures)
+
+            stats.buffer_request("GET", "/", 40, 0)
+            stats.flush_requests()
+            self.assertEqual(4, stats.num_requests)
+
+            # buffered requests are flushed before reporting to the master
+            env = Environment()
+            setup_distributed_stats_event_listeners(env.events, stats)
+            stats.buffer_request("GET", "/", 50, 0)
+            data = {}
+            env.events.report_to_master.fire(client_id="dummy", data=data)
+            self.assertEqual(5, data["stats_total"]["num_requests"])
+
+            # and dropped when the stats are reset
+            stats.buffer_request("GET", "/", 60, 0)
+            stats.reset_all()
+            stats.flush_requests()
+            self.assertEqual(0, stats.num_requests)
+
+
+class TestRequestNames(unittest.TestCase):
+    def test_template_request_names(self):
+        stats = RequestStats()
+        with mock.patch.object(locust.stats, "TEMPLATE_REQUEST_NAMES", True):
+            stats.log_request("GET", "/user/1", 10, 0)
+            stats.log_request("GET", "/user/2", 20, 0)
+            stats.log_error("GET", "/user/2", Exception("dummy fail"))
+            stats.log_request("GET", "/about", 30, 0)
+            stats.log_requests([("GET", "/user/3", 40, 0, None), ("GET", "/user/4", 50, 0, None)])
+        self.assertEqual({("/user/[id]", "GET"), ("/about", "GET")}, set(stats.entries))
+        self.assertEqual(4, stats.entries[("/user/[id]", "GET")].num_requests)
+        self.assertEqual(1, stats.entries[("/user/[id]", "GET")].num_failures)
+        self.assertEqual(["/user/[id]"], [error.name for error in stats.errors.values()])
+        self.assertEqual(4, stats.collapsed_names)
+
+    def test_max_request_entries(self):
+        stats = RequestStats()
+        with mock.patch.object(locust.stats, "MAX_REQUEST_ENTRIES", 2):
+            for i in range(10):
+                stats.log_request("GET", f"/page{i}", 10, 0)
+            stats.log_request("GET", "/page0", 10, 0)
+        self.assertEqual({("/page0", "GET"), ("/page1", "GET"), ("Other", "GET")}, set(stats.entries))
+        self.assertEqual(2, stats.entries[("/page0", "GET")].num_requests)
+        self.assertEqual(8, stats.entries[("Other", "GET")].num_requests)
+        self.assertEqual(11, stats.total.num_requests)
+        self.assertEqual(8, stats.collapsed_names)
+
+    def test_max_request_entries_on_master(self):
+        worker_stats = RequestStats()
+        for i in range(5):
+            worker_stats.log_request("GET", f"/page{i}", 10, 0)
+        worker_stats.collapsed_names = 3
+        env = Environment()
+        data = {}
+        setup_distributed_stats_event_listeners(env.events, worker_stats)
+        env.events.report_to_master.fire(client_id="dummy", data=data)
+
+        master_stats = RequestStats()
+        master_env = Environment()
+        setup_distributed_stats_event_listeners(master_env.events, master_stats)
+        with mock.patch.object(locust.stats, "MAX_REQUEST_ENTRIES", 2):
+            master_env.events.worker_report.fire(client_id="dummy", data=data)
+        self.assertEqual(3, len(master_stats.entries))
+        self.assertEqual(3, master_stats.entries[("Other", "GET")].num_requests)
+        self.assertEqual(5, master_stats.total.num_requests)
+        self.assertEqual(6, master_stats.collapsed_names)
+
 
 class TestStatsPrinting(LocustTestCase):
     def setUp(self):
@@ -724,81 +1018,86 @@ class TestStatsEntryResponseTimesCache(unittest.TestCase):
         super().setUp(*args, **kwargs)
         self.stats = RequestStats()
 
-    def test_response_times_cached(self):
+    def test_response_times_window(self):
         s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
-        self.assertEqual(1, len(s.response_times_cache))
         s.log(11, 1337)
-        self.assertEqual(1, len(s.response_times_cache))
-        s.last_request_timestamp -= 1
-        s.log(666, 1337)
-        self.assertEqual(2, len(s.response_times_cache))
-        self.assertEqual(
-            CachedResponseTimes(
-                response_times={11: 1},
-                num_requests=1,
-                num_none_requests=0,
-            ),
-            s.response_times_cache[int(s.last_request_timestamp) - 1],
-        )
+        s.log(None, 1337)
+        self.assertEqual({11: 1}, s.response_times_window.histogram)
 
-    def test_response_times_not_cached_if_not_enabled(self):
+    def test_response_times_window_not_kept_if_not_enabled(self):
         s = StatsEntry(self.stats, "/", "GET")
         s.log(11, 1337)
-        self.assertEqual(None, s.response_times_cache)
-        s.last_request_timestamp -= 1
-        s.log(666, 1337)
-        self.assertEqual(None, s.response_times_cache)
+        self.assertEqual(None, s.response_times_window)
 
-    def test_latest_total_response_times_pruned(self):
-        """
-        Check that RequestStats.latest_total_response_times are pruned when exceeding 20 entries
-        """
-        s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
-        t = int(time.time())
-        for i in reversed(range(2, 30)):
-            s.response_times_cache[t - i] = CachedResponseTimes(response_times={}, num_requests=0, num_none_requests=0)
-        self.assertEqual(29, len(s.response_times_cache))
-        s.log(17, 1337)
-        s.last_request_timestamp -= 1
-        s.log(1, 1)
-        self.assertEqual(20, len(s.response_times_cache))
-        self.assertEqual(
-            CachedResponseTimes(response_times={17: 1}, num_requests=1, num_none_requests=0),
-            s.response_times_cache.popitem(last=True)[1],
-        )
+    def test_response_times_window_expires_old_seconds(self):
+        with mock.patch("time.time") as mocked_time:
+            mocked_time.return_value = 1000.5
+            s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
+            s.log(17, 1337)
+            mocked_time.return_value = 1005.5
+            s.log(1, 1)
+            self.assertEqual({1: 1, 17: 1}, s.response_times_window.histogram)
 
-    def test_get_current_response_time_percentile(self):
-        s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
-        t = int(time.time())
-        s.response_times_cache[t - 10] = CachedResponseTimes(
-            response_times={i: 1 for i in range(100)}, num_requests=200, num_none_requests=0
-        )
-        s.response_times_cache[t - 10].response_times[1] = 201
+            mocked_time.return_value = 1009.5
+            self.assertEqual([1, 17], s.get_current_response_time_percentiles([0.0, 1.0]))
 
-        s.response_times = {i: 2 for i in range(100)}
-        s.response_times[1] = 202
-        s.num_requests = 300
+            mocked_time.return_value = 1010.5
+            self.assertEqual([1, 1], s.get_current_response_time_percentiles([0.0, 1.0]))
+            self.assertEqual({1: 1}, s.response_times_window.histogram)
 
-        self.assertEqual(95, s.get_current_response_time_percentile(0.95))
+            mocked_time.return_value = 1015.5
+            self.assertEqual([0, 0], s.get_current_response_time_percentiles([0.0, 1.0]))
+            self.assertEqual(0, s.response_times_window.histogram.total)
 
-    def test_get_current_response_time_percentile_with_none_response_times(self):
-        s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
-        t = int(time.time())
-        s.response_times_cache[t - 10] = CachedResponseTimes(
-            response_times={i: 1 for i in range(100)}, num_requests=200, num_none_requests=100
-        )
-
-        s.response_times = {i: 2 for i in range(100)}
-        s.num_requests = 400
-        s.num_none_requests = 200
+    def test_get_current_response_time_percentile(self):
+        with mock.patch("time.time") as mocked_time:
+            mocked_time.return_value = 1000.0
+            s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
+            for i in range(100):
+                s.log(1, 0)
+            mocked_time.return_value = 1011.0
+            for i in range(100):
+                s.log(i, 0)
+            mocked_time.return_value = 1012.0
+
+            self.assertEqual(95, s.get_current_response_time_percentile(0.95))
+            self.assertEqual([95, 50], s.get_current_response_time_percentiles([0.95, 0.5]))
 
-        self.assertEqual(95, s.get_current_response_time_percentile(0.95))
+    def test_get_current_response_time_percentile_with_none_response_times(self):
+        with mock.patch("time.time") as mocked_time:
+            mocked_time.return_value = 1000.0
+            s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
+            for i in range(100):
+                s.log(i, 0)
+                s.log(None, 0)
+
+            self.assertEqual(95, s.get_current_response_time_percentile(0.95))
+
+    def test_get_current_response_time_percentile_extend(self):
+        with mock.patch("time.time") as mocked_time:
+            mocked_time.return_value = 1000.0
+            s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
+            other = StatsEntry(self.stats, "/", "GET")
+            other.log(800, 0)
+            s.extend(other)
+            mocked_time.return_value = 1020.0
+            other = StatsEntry(self.stats, "/", "GET")
+            other.log(20, 0)
+            other.log(30, 0)
+            s.extend(other)
+
+            self.assertEqual([20, 30], s.get_current_response_time_percentiles([0.0, 1.0]))
+            self.assertEqual(800, s.get_response_time_percentile(1.0))
 
     def test_get_current_response_time_percentile_outside_cache_window(self):
-        s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
-        # an empty response times cache, current time will not be in this cache
-        s.response_times_cache = {}
-        self.assertEqual(None, s.get_current_response_time_percentile(0.95))
+        with mock.patch("time.time") as mocked_time:
+            mocked_time.return_value = 1000.0
+            s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
+            s.log(10, 0)
+            # nothing has been recorded for a long time
+            mocked_time.return_value = 1030.0
+            self.assertEqual(None, s.get_current_response_time_percentile(0.95))
+            self.assertEqual([None, None], s.get_current_response_time_percentiles([0.5, 0.95]))
 
     def test_diff_response_times_dicts(self):
         self.assertEqual(
@@ -1041,3 +1340,45 @@ class TestBucketResponseTime(unittest.TestCase):
             self.assertNotIn(150, s.response_times)
         finally:
             locust.stats.bucket_response_time = original
+
+    def test_percentile_sketch(self):
+        stats = RequestStats()
+        with mock.patch.object(locust.stats, "RESPONSE_TIME_SKETCH_RELATIVE_ACCURACY", 0.01):
+            s = StatsEntry(stats, "sketch_test", "GET")
+            for response_time in [10, 20, 40, 3432, 58760]:
+                s.log(response_time, 0)
+            self.assertIsInstance(s.response_times, SketchHistogram)
+
+            # sent to the master as a list of bucket counts
+            data = Message.unserialize(Message("dummy", s.serialize(), "none").serialize()).data
+            self.assertIsInstance(data["response_times"], list)
+            u = StatsEntry.unserialize(data, stats)
+            self.assertEqual(s.response_times, u.response_times)
+            self.assertAlmostEqual(40, u.median_response_time, delta=40 * 0.01)
+            self.assertAlmostEqual(58760, u.get_response_time_percentile(1.0), delta=58760 * 0.01)
+
+        # a master without the sketch converts the worker's sketch into its own histogram
+        u = StatsEntry.unserialize(data, stats)
+        self.assertNotIsInstance(u.response_times, SketchHistogram)
+        self.assertEqual(5, u.response_times.total)
+        self.assertEqual(40, u.median_response_time)
+
+    def test_high_resolution(self):
+        stats = RequestStats()
+        with mock.patch.object(locust.stats, "RESPONSE_TIME_HIGH_RESOLUTION", True):
+            s = StatsEntry(stats, "high_resolution_test", "GET")
+            for response_time in [0.1234, 0.25, 0.31, 0.42, 0.9]:
+                s.log(response_time, 0)
+            self.assertIsInstance(s.response_times, HighResolutionHistogram)
+            self.assertEqual(0.31, s.median_response_time)
+            self.assertEqual([0.12, 0.9], s.get_response_time_percentiles([0.1, 1.0]))
+
+            data = Message.unserialize(Message("dummy", s.serialize(), "none").serialize()).data
+            u = StatsEntry.unserialize(data, stats)
+            self.assertEqual(s.response_times, u.response_times)
+            self.assertEqual(0.123, u.to_dict()["min_response_time"])
+            self.assertEqual(0.9, u.to_dict()["response_time_percentile_0.99"])
+
+        # without high resolution, everything below 0.5 ms ends up in the 0 bucket
+        u = StatsEntry.unserialize(data, stats)
+        self.assertEqual({0: 4, 1: 1}, u.response_times)
@@ -1,6 +1,7 @@
+from locust.util.ringbuffer import PerSecondRingBuffer
 from locust.util.rounding import proper_round
 from locust.util.timespan import parse_timespan
-from locust.util.url import is_url
+from locust.util.url import is_url, template_path
 
 import unittest
 
@@ -32,6 +33,18 @@ class TestIsUrl(unittest.TestCase):
         self.assertFalse(is_url("http://"))
 
 
+class TestTemplatePath(unittest.TestCase):
+    def test_template_path(self):
+        self.assertEqual("/user/[id]/orders?page=[id]", template_path("/user/42/orders?page=3"))
+        self.assertEqual("/x/[uuid]", template_path("/x/550e8400-e29b-41d4-a716-446655440000"))
+        self.assertEqual("/obj/[hash]/", template_path("/obj/5f2b9c0e1a2b3c4d5e6f7a8b/"))
+        self.assertEqual("/item?id=[id]&flag&q=abc", template_path("/item?id=5&flag&q=abc"))
+
+    def test_other_names_are_unchanged(self):
+        for name in ["/", "/api/v2/items", "/search?q=", "my custom name", "/cafe"]:
+            self.assertEqual(name, template_path(name))
+
+
 class TestRounding(unittest.TestCase):
     def test_rounding_down(self):
         self.assertEqual(1, proper_round(1.499999999))
@@ -54,3 +67,36 @@ class TestRounding(unittest.TestCase):
         self.assertEqual(1.0, proper_round(1, 2))
         self.assertEqual(5.0, proper_round(5, 2))
         self.assertEqual(9.0, proper_round(9, 2))
+
+
+class TestPerSecondRingBuffer(unittest.TestCase):
+    def test_increment_and_window_sum(self):
+        ring = PerSecondRingBuffer(10)
+        ring.increment(100)
+        ring.increment(100)
+        ring.increment(103, 5)
+        self.assertEqual({100: 2, 103: 5}, ring.to_dict())
+        self.assertEqual(7, ring.window_sum(95, 105))
+        self.assertEqual(2, ring.window_sum(100, 103))
+        self.assertEqual(0, ring.window_sum(104, 104))
+
+    def test_old_seconds_are_discarded(self):
+        ring = PerSecondRingBuffer(10)
+        ring.increment(100)
+        ring.increment(110)  # same slot as 100
+        self.assertEqual(0, ring[100])
+        self.assertEqual(1, ring[110])
+        # increments older than the horizon are dropped
+        ring.increment(100)
+        self.assertEqual({110: 1}, ring.to_dict())
+        self.assertEqual(1, ring.window_sum(0, 200))
+
+    def test_merge(self):
+        a = PerSecondRingBuffer(10)
+        b = PerSecondRingBuffer(10)
+        a.increment(5)
+        b.increment(5, 2)
+        b.increment(6)
+        a.merge(b)
+        a.merge({6: 1, 7: 3})
+        self.assertEqual({5: 3, 6: 2, 7: 3}, a)
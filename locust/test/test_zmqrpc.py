@@ -2,6 +2,9 @@ from locust.exception import RPCError, RPCSendError
 from locust.rpc import Message, zmqrpc
 from locust.test.testcases import LocustTestCase
 
+import os
+import tempfile
+import unittest
 from time import sleep
 
 import zmq
@@ -56,3 +59,26 @@ class ZMQRPC_tests(LocustTestCase):
         server.close()
         with self.assertRaises(RPCSendError):
             server.send_to_client(Message("test", "message", "identity"))
+
+    @unittest.skipIf(os.name == "nt", reason="ipc transport is not available on windows")
+    def test_ipc(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ipc_path = os.path.join(tmpdir, "locust.ipc")
+            server = zmqrpc.Server("*", 0, ipc_path=ipc_path)
+            ipc_client = zmqrpc.Client("localhost", server.port, "ipc_identity", ipc_path=ipc_path)
+            tcp_client = zmqrpc.Client("localhost", server.port, "tcp_identity")
+            try:
+                ipc_client.send(Message("test", "over ipc", "ipc_identity"))
+                tcp_client.send(Message("test", "over tcp", "tcp_identity"))
+                received = dict(server.recv_from_client() for _ in range(2))
+                self.assertEqual("over ipc", received["ipc_identity"].data)
+                self.assertEqual("over tcp", received["tcp_identity"].data)
+
+                server.send_to_client(Message("test", "reply", "ipc_identity"))
+                self.assertEqual("reply", ipc_client.recv().data)
+            finally:
+                ipc_client.close()
+                tcp_client.close()
+                server.close()
+            # the socket file is removed along with the server
+            self.assertFalse(os.path.exists(ipc_path))
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from collections.abc import Iterator, Mapping, MutableMapping
+
+
+class PerSecondRingBuffer(MutableMapping[int, int]):
+    """
+    A {second => count} mapping that only remembers the last `horizon` seconds.
+
+    Counts are stored in a fixed size list indexed by ``second % horizon``, so incrementing is O(1)
+    and memory use stays flat no matter how long the test runs. Counts for seconds that have
+    fallen out of the horizon read as 0, and increments for such seconds are dropped.
+    """
+
+    __slots__ = ("horizon", "_counts", "_seconds")
+
+    def __init__(self, horizon: int) -> None:
+        if horizon < 1:
+            raise ValueError(f"horizon must be at least 1 second (was {horizon})")
+        self.horizon = horizon
+        self._counts: list[int] = [0] * horizon
+        # the second that each slot currently holds the count for
+        self._seconds: list[int] = [-1] * horizon
+
+    def increment(self, second: int, count: int = 1) -> None:
+        slot = second % self.horizon
+        slot_second = self._seconds[slot]
+        if slot_second != second:
+            if slot_second > second:
+                # older than the horizon
+                return
+            self._seconds[slot] = second
+            self._counts[slot] = 0
+        self._counts[slot] += count
+
+    def window_sum(self, start: int, end: int) -> int:
+        """Sum of the counts for the seconds in [start, end)"""
+        counts = self._counts
+        seconds = self._seconds
+        horizon = self.horizon
+        if end - start >= horizon:
+            return sum(count for second, count in zip(seconds, counts) if start <= second < end)
+        total = 0
+        for second in range(start, end):
+            slot = second % horizon
+            if seconds[slot] == second:
+                total += counts[slot]
+        return total
+
+    def merge(self, other: Mapping[int, int]) -> None:
+        """Add the counts from another ring buffer (or {second => count} dict) to this one"""
+        for second, count in other.items():
+            self.increment(second, count)
+
+    def to_dict(self) -> dict[int, int]:
+        return dict(self.items())
+
+    def __getitem__(self, second: int) -> int:
+        slot = second % self.horizon
+        if self._seconds[slot] == second:
+            return self._counts[slot]
+        return 0
+
+    def __setitem__(self, second: int, count: int) -> None:
+        slot = second % self.horizon
+        if self._seconds[slot] > second:
+            return
+        self._seconds[slot] = second
+        self._counts[slot] = count
+
+    def __delitem__(self, second: int) -> None:
+        slot = second % self.horizon
+        if self._seconds[slot] != second or not self._counts[slot]:
+            raise KeyError(second)
+        self._counts[slot] = 0
+
+    def __contains__(self, second: object) -> bool:
+        return bool(self[second]) if isinstance(second, int) else False
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(sorted(second for second, count in zip(self._seconds, self._counts) if count))
+
+    def __len__(self) -> int:
+        return sum(1 for count in self._counts if count)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()!r})"
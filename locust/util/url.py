@@ -1,3 +1,5 @@
+import functools
+import re
 from urllib.parse import urlparse
 
 
@@ -10,3 +12,35 @@ def is_url(url: str) -> bool:
         return result.scheme in ("https", "http") and bool(result.netloc)
     except ValueError:
         return False
+
+
+_NUMBER = re.compile(r"-?\d+")
+_UUID = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+_HASH = re.compile(r"[0-9a-fA-F]{16,}")
+
+
+def _template_value(value: str) -> str:
+    if _NUMBER.fullmatch(value):
+        return "[id]"
+    if _UUID.fullmatch(value):
+        return "[uuid]"
+    if _HASH.fullmatch(value):
+        return "[hash]"
+    return value
+
+
+@functools.lru_cache(maxsize=10000)
+def template_path(path: str) -> str:
+    """
+    Replace the numeric, UUID and hash (16 or more hex digits) segments of a URL path, and query
+    parameter values, with [id], [uuid] and [hash], so that e.g. /user/42/orders?page=3 becomes
+    /user/[id]/orders?page=[id]
+    """
+    path, question_mark, query = path.partition("?")
+    templated = "/".join(_template_value(segment) for segment in path.split("/"))
+    if question_mark:
+        templated += "?" + "&".join(
+            (key + "=" + _template_value(value)) if separator else key
+            for key, separator, value in (parameter.partition("=") for parameter in query.split("&"))
+        )
+    return templated
@@ -490,10 +490,13 @@ class WebUI:
                 report["total_fail_per_sec"] = total_stats["total_fail_per_sec"]
                 report["fail_ratio"] = environment.runner.stats.total.fail_ratio
                 report["current_response_time_percentiles"] = {
-                    f"response_time_percentile_{percentile}": environment.runner.stats.total.get_current_response_time_percentile(
-                        percentile
+                    f"response_time_percentile_{percentile}": value
+                    for percentile, value in zip(
+                        stats.PERCENTILES_TO_CHART,
+                        environment.runner.stats.total.get_current_response_time_percentiles(
+                            stats.PERCENTILES_TO_CHART
+                        ),
                     )
-                    for percentile in stats.PERCENTILES_TO_CHART
                 }
 
             if isinstance(environment.runner, MasterRunner):
@@ -510,6 +513,8 @@ class WebUI:
 
                 report["workers"] = workers
                 report["worker_count"] = environment.runner.worker_count
+                report["rpc_compression"] = environment.runner.server.compression_stats.to_dict()
+                report["report_interval"] = environment.runner.report_interval
 
             report["state"] = environment.runner.state
             report["user_count"] = environment.runner.user_count
@@ -17,7 +17,7 @@ export const baseTableStructure = [
   { key: 'name', title: 'Name' },
   { key: 'numRequests', title: '# Requests' },
   { key: 'numFailures', title: '# Fails' },
-  { key: 'medianResponseTime', title: 'Median (ms)', round: 2 },
+  { key: 'medianResponseTime', title: 'Median (ms)', round: 3 },
   ...percentilesToStatisticsRows,
   { key: 'avgResponseTime', title: 'Average (ms)', round: 2 },
   { key: 'minResponseTime', title: 'Min (ms)' },
@@ -1,3 +1,4 @@
+import { Typography } from '@mui/material';
 import { connect } from 'react-redux';
 
 import Table from 'components/Table/Table';
@@ -13,10 +14,28 @@ const tableStructure = [
   { key: 'memoryUsage', title: 'Memory usage', formatter: formatBytes },
 ];
 
-function WorkersTable({ workers = [] }: { workers?: ISwarmWorker[] }) {
-  return <Table<ISwarmWorker> defaultSortKey='id' rows={workers} structure={tableStructure} />;
+function WorkersTable({
+  workers = [],
+  reportInterval,
+}: {
+  workers?: ISwarmWorker[];
+  reportInterval?: number;
+}) {
+  return (
+    <>
+      {reportInterval !== undefined && (
+        <Typography sx={{ mb: 1 }} variant='body2'>
+          Workers report their statistics every {reportInterval}s
+        </Typography>
+      )}
+      <Table<ISwarmWorker> defaultSortKey='id' rows={workers} structure={tableStructure} />
+    </>
+  );
 }
 
-const storeConnector = ({ ui: { workers } }: IRootState) => ({ workers });
+const storeConnector = ({ ui: { workers, reportInterval } }: IRootState) => ({
+  workers,
+  reportInterval,
+});
 
 export default connect(storeConnector)(WorkersTable);
@@ -40,6 +40,7 @@ export default function useFetchStats() {
       failRatio,
       workers,
       workerCount,
+      reportInterval,
       userCount,
       totalAvgResponseTime,
     } = statsData;
@@ -79,6 +80,7 @@ export default function useFetchStats() {
       currentRps: currentRpsRounded,
       failRatio: totalFailureRatioRounded,
       workers,
+      reportInterval,
       userCount,
     });
     updateCharts(newChartEntry);
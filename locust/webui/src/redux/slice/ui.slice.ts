@@ -21,6 +21,7 @@ export interface IUiState {
   stats: ISwarmStat[];
   errors: ISwarmError[];
   workers?: ISwarmWorker[];
+  reportInterval?: number;
   exceptions: ISwarmException[];
   ratios: ISwarmRatios;
   charts: ICharts;
@@ -93,6 +93,7 @@ export interface IStatsResponse {
   errors: ISwarmError[];
   workers: ISwarmWorker[];
   workerCount: number;
+  reportInterval?: number;
   currentRps: number;
   currentFailPerSec: number;
   totalRps: number;